@@ -0,0 +1,110 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import time
+import threading
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread-safe in-process cache with expiring entries.
+
+    When `maxsize` is set, the least recently used entries are evicted first.
+    """
+
+    def __init__(self, ttl, maxsize=None, timer=time.monotonic):
+        """
+        :param ttl: default time to live of an entry in seconds
+        :param maxsize: maximum number of entries, unbounded if None
+        :param timer: function returning current time in seconds
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._timer = timer
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key, default=None):
+        """
+        Get a cached value.
+
+        :param key: cache key
+        :param default: value returned on a miss
+        :return: cached value or `default`
+        """
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if expires <= self._timer():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """
+        Cache a value.
+
+        :param key: cache key
+        :param value: value to cache
+        :param ttl: time to live in seconds, uses the cache's `ttl` if None
+        """
+        with self._lock:
+            self._data[key] = (self._timer() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Remove an entry and return its value."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def clear(self):
+        """Remove all entries and reset statistics."""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """
+        Get cache statistics.
+
+        :return dict: `hits`, `misses`, `size` and `hit_rate`
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._data),
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[0] > self._timer()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+"""
+Fast parsing of fixed format dates used by ANP APIs.
+
+Strings are sliced at fixed positions instead of being matched by `strptime`,
+strings which don't have the expected layout are parsed by `strptime`.
+"""
+
+from datetime import datetime
+from functools import lru_cache
+
+import pytz
+
+ISO_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+COMPACT_FORMAT = '%Y%m%d %H:%M:%S'
+
+
+def parse_iso(string):
+    """
+    Parse `2019-05-02T12:04:56Z` date
+
+    :param string: date string
+    :return datetime: naive datetime
+    """
+    if (len(string) == 20 and string[4] == '-' and string[7] == '-' and string[10] == 'T'
+            and string[13] == ':' and string[16] == ':' and string[19] == 'Z'):
+        try:
+            return datetime(
+                int(string[0:4]), int(string[5:7]), int(string[8:10]),
+                int(string[11:13]), int(string[14:16]), int(string[17:19])
+            )
+        except ValueError:
+            pass
+    return datetime.strptime(string, ISO_FORMAT)
+
+
+def parse_compact(string):
+    """
+    Parse `20190418 14:16:50` date
+
+    :param string: date string
+    :return datetime: naive datetime
+    """
+    if len(string) == 17 and string[8] == ' ' and string[11] == ':' and string[14] == ':':
+        try:
+            return datetime(
+                int(string[0:4]), int(string[4:6]), int(string[6:8]),
+                int(string[9:11]), int(string[12:14]), int(string[15:17])
+            )
+        except ValueError:
+            pass
+    return datetime.strptime(string, COMPACT_FORMAT)
+
+
+@lru_cache(maxsize=4096)
+def _utc_offset(tz_name, year, month, day, hour):
+    # timezones change their offset at full hours, so it's the same for the whole local hour
+    return pytz.timezone(tz_name).localize(datetime(year, month, day, hour)).utcoffset()
+
+
+def local_to_utc(tz_name, local):
+    """
+    Convert local datetime to utc, same as superdesk's `local_to_utc` with cached utc offsets
+
+    :param tz_name: name of the local timezone
+    :param local: naive local datetime
+    :return datetime: utc datetime
+    :raises OverflowError: if the utc datetime is out of range
+    """
+    offset = _utc_offset(tz_name, local.year, local.month, local.day, local.hour)
+    return (local - offset).replace(tzinfo=pytz.utc)
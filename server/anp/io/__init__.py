@@ -9,4 +9,5 @@
 # at https://www.sourcefabric.org/superdesk/license
 
 from . import feed_parsers  # noqa
-from . import feeding_services # noqa
\ No newline at end of file
+from . import feeding_services # noqa
+from . import commands  # noqa
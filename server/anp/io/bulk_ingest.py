@@ -0,0 +1,313 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+"""
+Bulk persistence of new ingested items.
+
+Superdesk's `ingest_item` looks up and inserts every item on its own. New items of a batch are saved here
+with a single lookup, a single mongo insert and a single elastic bulk request instead,
+items which need the full ingest workflow are left to `ingest_items`.
+
+Core has no helpers for the steps of `ingest_item`, so `_prepare_item`, `_link_association`
+and `_set_ingest_provider_sequence` follow `superdesk.io.commands.update_ingest.ingest_item`
+of superdesk-core release/1.33. Check them when core is upgraded, `bulk_ingest_test` compares
+bulk and single item results.
+"""
+
+import logging
+
+from flask import current_app as app
+from superdesk import config, get_resource_service
+from superdesk.errors import ProviderError
+from superdesk.io.commands.update_ingest import filter_expired_items, process_anpa_category, \
+    process_iptc_codes, derive_category, derive_subject
+from superdesk.media.renditions import transfer_renditions
+from superdesk.metadata.item import GUID_NEWSML, GUID_FIELD, FAMILY_ID, ITEM_TYPE, CONTENT_TYPE, CONTENT_STATE
+from superdesk.metadata.utils import generate_guid
+from superdesk.utc import get_expiry_date
+from superdesk.workflow import set_default_state
+
+logger = logging.getLogger(__name__)
+
+INGEST_COLLECTION = 'ingest'
+
+
+def can_bulk_ingest(provider):
+    """
+    Check if items of the provider can be saved in bulk
+
+    Rule sets and routing schemes are applied per item by superdesk, so such providers use the regular ingest.
+
+    :param provider: Ingest Provider Details
+    :type provider: dict
+    :return bool:
+    """
+    return bool(
+        provider.get(config.ID_FIELD)
+        and (provider.get('config') or {}).get('bulk_ingest')
+        and not provider.get('rule_set')
+        and not provider.get('routing_scheme')
+    )
+
+
+def bulk_ingest_items(items, provider):
+    """
+    Save new items of a batch at once
+
+    Items which already exist, are canceled or have own renditions to download are not saved
+    and are returned to be ingested by `ingest_items`.
+
+    Write errors of mongo and elastic bulk requests are mapped back to items and reported per item.
+    Mongo insert is ordered, so new items after the first failed one are returned for the regular ingest.
+    Items which aren't indexed are stored already, the regular ingest updates them when they are ingested again.
+
+    :param items: parsed items of a batch
+    :type items: list
+    :param provider: Ingest Provider Details
+    :type provider: dict
+    :return tuple: list of saved items, list of items left for the regular ingest and list of failed items
+    """
+    items = filter_expired_items(provider, items)
+    if not items:
+        return [], [], []
+
+    ingest_service = get_resource_service(INGEST_COLLECTION)
+    guids = {item[GUID_FIELD] for item in items}
+    guids.update(
+        assoc[GUID_FIELD] for item in items for assoc in (item.get('associations') or {}).values()
+        if assoc and assoc.get(GUID_FIELD)
+    )
+    stored = {
+        doc[GUID_FIELD]: doc
+        for doc in ingest_service.get_from_mongo(req=None, lookup={GUID_FIELD: {'$in': list(guids)}})
+    }
+
+    saved = []
+    saved_guids = set()
+    remaining = []
+    failed = []
+    docs = []
+    # indexes of docs saved with an item, its new pictures and the item itself
+    item_docs = []
+    # new pictures of the batch by guid, shared by items with the same featuremedia
+    new_pictures = {}
+    for item in items:
+        # repeated items of the batch are updates of the saved one
+        if not _is_bulk_item(item, stored) or item[GUID_FIELD] in saved_guids:
+            remaining.append(item)
+            continue
+
+        pictures = []
+        try:
+            _prepare_item(item, provider)
+            for assoc in (item.get('associations') or {}).values():
+                picture = _link_association(assoc, provider, stored, new_pictures)
+                if picture is not None:
+                    pictures.append(picture)
+        except Exception as ex:
+            logger.exception(ex)
+            ProviderError.ingestItemError(ex, provider, item=item)
+            failed.append(item)
+            continue
+
+        new_pictures.update((picture[GUID_FIELD], picture) for picture in pictures)
+        item_docs.append(range(len(docs), len(docs) + len(pictures) + 1))
+        docs.extend(pictures)
+        docs.append(item)
+        saved.append(item)
+        saved_guids.add(item[GUID_FIELD])
+
+    if not docs:
+        return saved, remaining, failed
+
+    batch = list(zip(saved, item_docs))
+    try:
+        _set_ingest_provider_sequence(docs, provider)
+        ingest_service.post_in_mongo(docs)
+    except Exception as ex:
+        write_errors = _write_errors(ex)
+        if write_errors is None:
+            logger.warning('Bulk ingest of {} items of provider {} failed, items are ingested one by one: {}'.format(
+                len(saved), provider.get('name'), ex
+            ))
+            return [], saved + remaining, failed
+
+        # docs before the first error are inserted, docs after it are not attempted
+        inserted = min(write_errors)
+        not_inserted = []
+        for item, indexes in batch:
+            errors = [write_errors[index] for index in indexes if index in write_errors]
+            if errors:
+                _item_failed(Exception(errors[0].get('errmsg')), provider, item, failed)
+            elif indexes[-1] >= inserted:
+                not_inserted.append(item)
+        batch = [(item, indexes) for item, indexes in batch if indexes[-1] < inserted]
+        saved = [item for item, _indexes in batch]
+        remaining = not_inserted + remaining
+        docs = docs[:inserted]
+        logger.warning('Bulk ingest of provider {} failed at item {}, {} items are ingested one by one'.format(
+            provider.get('name'), inserted, len(not_inserted)
+        ))
+
+    if docs:
+        try:
+            app.data._search_backend(INGEST_COLLECTION).bulk_insert(INGEST_COLLECTION, docs)
+        except Exception as ex:
+            index_errors = _index_errors(ex)
+            indexed = []
+            for item, indexes in batch:
+                if index_errors is None:
+                    error = ex
+                else:
+                    errors = (index_errors.get(docs[index][config.ID_FIELD]) for index in indexes)
+                    error = next((error for error in errors if error is not None), None)
+                if error is None:
+                    indexed.append(item)
+                else:
+                    _item_failed(error, provider, item, failed)
+            saved = indexed
+
+    return saved, remaining, failed
+
+
+def _item_failed(ex, provider, item, failed):
+    logger.error('Bulk ingest of item {} failed: {}'.format(item[GUID_FIELD], ex))
+    ProviderError.ingestItemError(ex, provider, item=item)
+    failed.append(item)
+
+
+def _write_errors(ex):
+    """
+    Get write errors of mongo bulk insert
+
+    Eve turns `BulkWriteError` into an HTTP error, so the exception chain is searched for its `details`.
+
+    :return dict: write errors by index of the doc, None if the exception isn't a bulk write error
+    """
+    while ex is not None:
+        details = getattr(ex, 'details', None)
+        if isinstance(details, dict) and details.get('writeErrors'):
+            return {error['index']: error for error in details['writeErrors']}
+        ex = ex.__cause__ or ex.__context__
+    return None
+
+
+def _index_errors(ex):
+    """
+    Get errors of elastic bulk request
+
+    :return dict: errors by id of the doc, None if the exception isn't a `BulkIndexError`
+    """
+    errors = getattr(ex, 'errors', None)
+    if not isinstance(errors, list):
+        return None
+    index_errors = {}
+    for error in errors:
+        for info in error.values():
+            index_errors[info.get('_id')] = Exception(info.get('error'))
+    return index_errors
+
+
+def _is_bulk_item(item, stored):
+    if item[GUID_FIELD] in stored:
+        # updates are versioned by `ingest_item`
+        return False
+    if item.get(ITEM_TYPE) == CONTENT_TYPE.COMPOSITE or item.get('pubstatus') == 'canceled':
+        return False
+    if any(not rendition.get('media') for rendition in (item.get('renditions') or {}).values()):
+        return False
+    return not any(assoc and assoc.get('residRef') for assoc in (item.get('associations') or {}).values())
+
+
+def _prepare_item(item, provider):
+    """
+    Set ingest metadata of a new item
+
+    Same as `ingest_item` of superdesk-core release/1.33 does before `apply_rule_set`,
+    rule sets aren't used by bulk ingest.
+    """
+    item.setdefault(config.ID_FIELD, generate_guid(type=GUID_NEWSML))
+    item[FAMILY_ID] = item[config.ID_FIELD]
+    item['ingest_provider'] = str(provider[config.ID_FIELD])
+    item.setdefault('source', provider.get('source', ''))
+    item.setdefault('uri', item[GUID_FIELD])
+    set_default_state(item, CONTENT_STATE.INGESTED)
+    item['expiry'] = get_expiry_date(provider.get('content_expiry') or app.config['INGEST_EXPIRY_MINUTES'],
+                                     item.get('versioncreated'))
+
+    if 'anpa_category' in item:
+        process_anpa_category(item, provider)
+
+    if 'subject' in item:
+        if not app.config.get('INGEST_SKIP_IPTC_CODES', False):
+            process_iptc_codes(item, provider)
+        if 'anpa_category' not in item:
+            derive_category(item, provider)
+    elif 'anpa_category' in item:
+        derive_subject(item)
+
+
+def _link_association(assoc, provider, stored, new_pictures):
+    """
+    Wire up the association to the ingested picture
+
+    Same as the associations loop of `ingest_item` of superdesk-core release/1.33,
+    a new picture is prepared here and saved with the batch instead of its own `ingest_item` call.
+
+    :return dict: new picture to save, None if the picture is stored already or saved with another item
+    """
+    set_default_state(assoc, CONTENT_STATE.INGESTED)
+    if assoc.get('renditions'):
+        transfer_renditions(assoc['renditions'])
+
+    guid = assoc.get(GUID_FIELD)
+    if not guid:
+        return None
+
+    picture = stored.get(guid) or new_pictures.get(guid)
+    if picture is not None:
+        assoc[config.ID_FIELD] = picture[config.ID_FIELD]
+        renditions = assoc.setdefault('renditions', {})
+        for name, rendition in (picture.get('renditions') or {}).items():
+            renditions.setdefault(name, rendition)
+        return None
+
+    _prepare_item(assoc, provider)
+    return assoc
+
+
+def _set_ingest_provider_sequence(docs, provider):
+    """
+    Set `ingest_provider_sequence` of new docs using a single sequence update
+
+    Uses the sequence of `IngestService.set_ingest_provider_sequence` of superdesk-core release/1.33,
+    increased once by the number of docs. Superdesk restarts the sequence once it exceeds
+    `MAX_VALUE_OF_INGEST_SEQUENCE`, in such case docs get their numbers one by one.
+    """
+    docs = [doc for doc in docs if doc.get('ingest_provider_sequence') is None]
+    if not docs:
+        return
+
+    last = get_resource_service('sequences').find_and_modify(
+        query={'key': 'ingest_providers_{_id}'.format(_id=provider[config.ID_FIELD])},
+        update={'$inc': {'sequence_number': len(docs)}},
+        upsert=True,
+        new=True
+    ).get('sequence_number')
+
+    max_value = app.config.get('MAX_VALUE_OF_INGEST_SEQUENCE')
+    if max_value and last > max_value:
+        ingest_service = get_resource_service(INGEST_COLLECTION)
+        for doc in docs:
+            ingest_service.set_ingest_provider_sequence(doc, provider)
+        return
+
+    for number, doc in enumerate(docs, start=last - len(docs) + 1):
+        doc['ingest_provider_sequence'] = str(number)
@@ -0,0 +1,145 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import time
+import datetime
+import threading
+
+import pytz
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 60
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker.
+
+    It opens after `failure_threshold` failures in a row and requests fail fast while it's open.
+    After `reset_timeout` seconds it's half open and lets a single probe request through,
+    which closes it on success or opens it again on failure.
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT,
+                 timer=time.time):
+        """
+        :param failure_threshold: number of failures in a row opening the circuit
+        :param reset_timeout: number of seconds before a probe request is allowed
+        :param timer: function returning current timestamp
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._timer = timer
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Check if a request can be made
+
+        :return bool: False if the request must fail fast
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+
+            if self.state == OPEN and self._timer() >= self.opened_at + self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probing = False
+
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+
+            return False
+
+    def record_success(self):
+        """Close the circuit after a successful request."""
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        """Count a failed request and open the circuit when the threshold is reached or the probe failed."""
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = self._timer()
+            self._probing = False
+
+    def to_dict(self):
+        """
+        Get breaker's state
+
+        :return dict: `state`, `failures` and `opened_at` datetime
+        """
+        with self._lock:
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'opened_at': (
+                    datetime.datetime.fromtimestamp(self.opened_at, pytz.utc) if self.opened_at is not None else None
+                ),
+            }
+
+    def restore(self, data):
+        """
+        Restore breaker's state saved by `to_dict`
+
+        :param dict data: saved state
+        """
+        with self._lock:
+            self.state = data.get('state', CLOSED)
+            self.failures = data.get('failures', 0)
+            opened_at = data.get('opened_at')
+            if opened_at is not None and opened_at.tzinfo is None:
+                opened_at = opened_at.replace(tzinfo=pytz.utc)
+            self.opened_at = opened_at.timestamp() if opened_at is not None else None
+            if self.state != CLOSED and self.opened_at is None:
+                self.state = CLOSED
+            self._probing = False
+
+
+def get_circuit_breaker(key, endpoint, saved_state=None, **kwargs):
+    """
+    Get circuit breaker shared by the worker process for `endpoint` of `key`.
+
+    :param key: breaker identifier, ie. ingest provider id
+    :param endpoint: endpoint name
+    :param saved_state: state saved by `CircuitBreaker.to_dict`, used when the breaker is created
+    :param kwargs: `CircuitBreaker` params
+    :return CircuitBreaker: breaker
+    """
+    with _breakers_lock:
+        breaker = _breakers.get((key, endpoint))
+        if breaker is None:
+            breaker = _breakers[(key, endpoint)] = CircuitBreaker(**kwargs)
+            if saved_state:
+                breaker.restore(saved_state)
+        return breaker
+
+
+def reset_circuit_breakers():
+    """Drop all breakers of the worker process."""
+    with _breakers_lock:
+        _breakers.clear()
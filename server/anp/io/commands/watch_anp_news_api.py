@@ -0,0 +1,245 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import time
+import logging
+import threading
+from copy import deepcopy
+
+import superdesk
+from superdesk import config, get_resource_service
+from superdesk.celery_task_utils import get_lock_id
+from superdesk.io.registry import get_feeding_service
+from superdesk.io.commands.update_ingest import ingest_items, update_last_item_updated, get_provider_rule_set, \
+    get_provider_routing_scheme, LAST_ITEM_UPDATE, LAST_UPDATED, UPDATE_TTL
+from superdesk.lock import lock, unlock
+from superdesk.notification import push_notification
+from superdesk.utc import utcnow
+
+from anp.io.feeding_services.anp_news_api import ANPNewsApiFeedingService
+from anp.stats import IngestStats
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveInterval:
+    """
+    Poll interval of a source adapted to its publication rate
+
+    Publication rate is a moving average of new items per second observed by polls. The interval aims
+    to find `target_items` new items per poll, it's kept between `min_interval` and `max_interval`.
+
+    :param min_interval: minimal interval in seconds
+    :param max_interval: maximal interval in seconds
+    :param target_items: expected number of new items per poll
+    :param smoothing: weight of the latest poll in the moving average, 0-1
+    :param timer: clock function
+    """
+
+    def __init__(self, min_interval, max_interval, target_items=1, smoothing=0.3, timer=time.monotonic):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_items = target_items
+        self.smoothing = smoothing
+        self._timer = timer
+        self.interval = min_interval
+        self.rate = None
+        self.last_poll = None
+
+    @property
+    def next_poll(self):
+        """Time of the next poll, the first poll is due right away."""
+        if self.last_poll is None:
+            return self._timer()
+        return self.last_poll + self.interval
+
+    def is_due(self):
+        return self._timer() >= self.next_poll
+
+    def polled(self, items):
+        """
+        Adapt the interval to the number of new items found by a poll
+
+        :param items: number of new items
+        """
+        now = self._timer()
+        if self.last_poll is not None and now > self.last_poll:
+            rate = items / (now - self.last_poll)
+            self.rate = rate if self.rate is None else self.smoothing * rate + (1 - self.smoothing) * self.rate
+        self.last_poll = now
+
+        if self.rate:
+            interval = self.target_items / self.rate
+        elif items:
+            interval = self.min_interval
+        else:
+            interval = self.interval * 2
+        self.interval = min(max(interval, self.min_interval), self.max_interval)
+
+
+class ANPNewsApiWatcher:
+    """
+    Long running poll of ANP News API provider's sources
+
+    Each source is polled with its own adaptive interval using the items listing from the source's cursor,
+    new items are ingested right away. Sources cursors are shared with the scheduled update of the provider,
+    polls take the provider's ingest lock, so they never run along with it.
+
+    :param provider_name: name of the ingest provider
+    :param min_interval: minimal poll interval of a source in seconds
+    :param max_interval: maximal poll interval of a source in seconds
+    :param timer: clock function
+    """
+
+    STATS_NAME = 'ANPNewsApiWatcher'
+    STATS_INTERVAL = 5 * 60
+
+    def __init__(self, provider_name, min_interval=5, max_interval=5 * 60, timer=time.monotonic):
+        self.provider_name = provider_name
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.intervals = {}
+        self.stats = IngestStats(self.STATS_NAME)
+        self.stop = threading.Event()
+        self._timer = timer
+        self._stats_started = timer()
+
+    def run(self):
+        """Poll sources until `stop` is set."""
+        logger.info("Watching ANP News API provider '{}'".format(self.provider_name))
+        while not self.stop.is_set():
+            try:
+                self.poll()
+            except Exception as ex:
+                logger.exception(ex)
+
+            if self._timer() - self._stats_started >= self.STATS_INTERVAL:
+                self._report_stats()
+            self.stop.wait(self.seconds_to_next_poll())
+
+    def seconds_to_next_poll(self):
+        if not self.intervals:
+            return self.min_interval
+        return max(0, min(interval.next_poll for interval in self.intervals.values()) - self._timer())
+
+    def get_interval(self, source_id):
+        if source_id not in self.intervals:
+            self.intervals[source_id] = AdaptiveInterval(self.min_interval, self.max_interval, timer=self._timer)
+        return self.intervals[source_id]
+
+    def poll(self):
+        """
+        Poll sources which are due and ingest their new items
+
+        :return int: number of ingested items
+        """
+        provider = get_resource_service('ingest_providers').find_one(req=None, name=self.provider_name)
+        if not provider or provider.get('is_closed') or \
+                provider.get('feeding_service') != ANPNewsApiFeedingService.NAME:
+            logger.warning("ANP News API provider '{}' not found or closed".format(self.provider_name))
+            return 0
+
+        service = get_feeding_service(provider['feeding_service'])
+        service.provider = provider
+        service.stats = self.stats
+
+        sources = [source['id'] for source in service._fetch_sources()]
+        due = [source_id for source_id in sources if self.get_interval(source_id).is_due()]
+        if not due:
+            return 0
+
+        lock_name = get_lock_id('ingest', provider['name'], provider[config.ID_FIELD])
+        if not lock(lock_name, expire=UPDATE_TTL + 10):
+            # scheduled update is running
+            return 0
+
+        private = deepcopy(provider.get('private'))
+        update = {}
+        try:
+            ingested = sum(self._poll_source(service, provider, update, source_id) for source_id in due)
+        finally:
+            # cursors of polls without ingested items aren't saved by the feeding service
+            if provider.get('private') != private:
+                update['private'] = provider['private']
+            if update:
+                update[LAST_UPDATED] = utcnow()
+                provider_service = get_resource_service('ingest_providers')
+                original = provider_service.find_one(req=None, _id=provider[config.ID_FIELD])
+                provider_service.system_update(provider[config.ID_FIELD], update, original)
+            unlock(lock_name)
+
+        if LAST_ITEM_UPDATE in update:
+            push_notification('ingest:update', provider_id=str(provider[config.ID_FIELD]))
+        return ingested
+
+    def _poll_source(self, service, provider, update, source_id):
+        """
+        Ingest new items of a source and adapt its poll interval
+
+        :return int: number of parsed items
+        """
+        parsed = self.stats.counters['parsed_items']
+        rule_set = get_provider_rule_set(provider)
+        routing_scheme = get_provider_routing_scheme(provider)
+        generator = service._update_sources(provider, update, source_ids=[source_id])
+        failed = None
+        try:
+            while True:
+                try:
+                    items = generator.send(failed)
+                except StopIteration:
+                    break
+                failed = ingest_items(items, provider, service, rule_set, routing_scheme)
+                update_last_item_updated(update, items)
+        finally:
+            # next polls continue from the current cursors
+            if update.get('private'):
+                provider['private'] = update.pop('private')
+            # failed polls are postponed as well
+            items = self.stats.counters['parsed_items'] - parsed
+            self.get_interval(source_id).polled(items)
+
+        return items
+
+    def _report_stats(self):
+        self.stats.log()
+        self.stats.report()
+        self.stats = IngestStats(self.STATS_NAME)
+        self._stats_started = self._timer()
+
+
+class WatchANPNewsApi(superdesk.Command):
+    """Watch sources of ANP News API provider and ingest new items right away.
+
+    Sources are polled with intervals adapted to their publication rate.
+
+    Example:
+    ::
+
+        $ python manage.py ingest:anp_watch --provider=ANP
+        $ python manage.py ingest:anp_watch --provider=ANP --min-interval=2 --max-interval=120
+
+    """
+
+    option_list = (
+        superdesk.Option('--provider', '-p', dest='provider_name', required=True),
+        superdesk.Option('--min-interval', dest='min_interval', type=float, default=5),
+        superdesk.Option('--max-interval', dest='max_interval', type=float, default=5 * 60),
+    )
+
+    def run(self, provider_name, min_interval=5, max_interval=5 * 60):
+        watcher = ANPNewsApiWatcher(provider_name, min_interval=min_interval, max_interval=max_interval)
+        try:
+            watcher.run()
+        except KeyboardInterrupt:
+            watcher.stop.set()
+
+
+superdesk.command('ingest:anp_watch', WatchANPNewsApi())
@@ -8,19 +8,115 @@
 # AUTHORS and LICENSE files distributed with this source code, or
 # at https://www.sourcefabric.org/superdesk/license
 
-import json
 import logging
-import datetime
+from copy import deepcopy
 
-from eve.utils import ParsedRequest
 import superdesk
 from superdesk.io.registry import register_feed_parser
 from superdesk.io.feed_parsers import FeedParser
-from superdesk.media.renditions import update_renditions
 from superdesk.metadata.item import ITEM_TYPE, CONTENT_TYPE, GUID_FIELD
 
+from anp.cache import TTLCache
+from anp.dates import parse_iso
+from anp.stats import current_stats
+from anp.media.renditions import update_renditions_many
+from anp.vocabularies import get_subjects_map
+
 logger = logging.getLogger(__name__)
 
+# fields set by `update_renditions_many`
+RENDITION_FIELDS = ('renditions', 'mimetype', 'filemeta', 'filemeta_json')
+
+# renditions of stored pictures by ANP media id
+media_index = TTLCache(ttl=60 * 60, maxsize=5000)
+
+
+def get_request_kwargs(provider):
+    """
+    Get parameters of requests downloading provider's media
+
+    :param provider: Ingest Provider Details
+    :type provider: dict
+    :return dict: requests parameters
+    """
+    config = provider.get('config') or {}
+    return {
+        'auth': (
+            config.get('username', '').strip(),
+            config.get('password', '').strip()
+        )
+    }
+
+
+def update_featuremedia_renditions(association, href, provider, request_kwargs=None):
+    """
+    Add renditions of featuremedia picture to the association
+
+    See `update_featuremedia_renditions_many`.
+
+    :param association: featuremedia association
+    :type association: dict
+    :param href: link to the picture
+    :param provider: Ingest Provider Details
+    :type provider: dict
+    :param request_kwargs: parameters of the download request, defaults to `get_request_kwargs(provider)`
+    """
+    update_featuremedia_renditions_many([(association, href)], provider, request_kwargs)
+
+
+def update_featuremedia_renditions_many(pictures, provider, request_kwargs=None):
+    """
+    Add renditions of featuremedia pictures to the associations
+
+    ANP media id (`guid` of the association) identifies the picture, so renditions stored for a previous
+    attachment of the same picture are reused. Pictures without stored renditions are downloaded once
+    and resized together.
+
+    :param pictures: list of `(association, href)` tuples
+    :param provider: Ingest Provider Details
+    :type provider: dict
+    :param request_kwargs: parameters of the download requests, defaults to `get_request_kwargs(provider)`
+    """
+    missing = {}
+    for association, href in pictures:
+        media_id = association[GUID_FIELD]
+        stored = media_index.get(media_id) or _find_stored_media(media_id)
+        if stored:
+            association.update(deepcopy(stored))
+        else:
+            missing.setdefault(media_id, []).append((association, href))
+
+    if not missing:
+        return
+
+    with current_stats().timer('renditions'):
+        update_renditions_many(
+            [associations[0] for associations in missing.values()],
+            request_kwargs=request_kwargs or get_request_kwargs(provider)
+        )
+    for media_id, associations in missing.items():
+        stored = {field: associations[0][0][field] for field in RENDITION_FIELDS if field in associations[0][0]}
+        media_index.set(media_id, deepcopy(stored))
+        # the same picture attached to several items of the batch
+        for association, _href in associations[1:]:
+            association.update(deepcopy(stored))
+
+
+def _find_stored_media(media_id):
+    """
+    Find renditions of an ingested picture
+
+    :param media_id: ANP media id
+    :return dict: rendition fields, None if the picture wasn't ingested with renditions
+    """
+    picture = superdesk.get_resource_service('ingest').find_one(req=None, guid=media_id)
+    if not picture or not (picture.get('renditions') or {}).get('original', {}).get('media'):
+        return None
+
+    stored = {field: picture[field] for field in RENDITION_FIELDS if field in picture}
+    media_index.set(media_id, stored)
+    return stored
+
 
 class ANPNewsApiFeedParser(FeedParser):
     """
@@ -30,57 +126,28 @@ class ANPNewsApiFeedParser(FeedParser):
     NAME = 'anp_news_api'
     label = 'ANP News API Feed Parser'
 
-    def __init__(self):
-        super().__init__()
-        self._vocabularies = None
-
-    def _prefetch_vocabularies(self):
-        """
-        Prefetch items from vocabularies.
-        """
-
-        # this method is called from `parse`, but it must be executed only once
-        if self._vocabularies is not None:
-            return
-
-        self._vocabularies = {}
-        req = ParsedRequest()
-        req.projection = json.dumps({'items': 1})
-        # prefetch vocabularies -> anp_genres
-        self._vocabularies['anp_genres'] = superdesk.get_resource_service(
-            'vocabularies'
-        ).find_one(
-            req=req, _id='anp_genres'
-        ).get('items', [])
-        # use qcode as a key to speed up work with it in the future methods
-        self._vocabularies['anp_genres'] = {s['qcode']: s for s in self._vocabularies['anp_genres']}
-
     def can_parse(self, article):
         # this parser works only with "anp_news_api" feeding service
         return True
 
-    def _add_featuremedia(self, provider, item, href):
+    def _add_featuremedia(self, item, href, provider, media_options):
         associations = item.setdefault('associations', {})
         association = {
             ITEM_TYPE: CONTENT_TYPE.PICTURE,
             GUID_FIELD: href.rsplit('/', 1)[-1],
-            'ingest_provider': provider['feeding_service'],
+            'ingest_provider': media_options['ingest_provider'],
             'headline': item['headline'],
             'description_text': item['headline'],
             'copyrightnotice': item['copyrightholder']
         }
 
-        update_renditions(
-            item=association,
-            href=href,
-            old_item=None,
-            request_kwargs={
-                'auth': (
-                    provider['config'].get('username', '').strip(),
-                    provider['config'].get('password', '').strip()
-                )
-            }
-        )
+        # with `async_featuremedia` renditions are added by `fetch_featuremedia` task once the item is ingested,
+        # ingest fills them right away if the picture was ingested before
+        if media_options['async']:
+            association['renditions'] = {}
+        else:
+            # renditions of the batch are generated together by `parse_many`
+            media_options['pictures'].append((association, href))
         associations['featuremedia'] = association
 
     def parse(self, article, provider=None):
@@ -94,9 +161,41 @@ class ANPNewsApiFeedParser(FeedParser):
                         :py:class: `superdesk.io.ingest_provider_model.IngestProviderResource`
         :return:
         """
+        return self.parse_many([article], provider)[0]
+
+    def parse_many(self, articles, provider=None):
+        """
+        Parse a batch of ANP News API articles
+
+        Subjects of the whole batch are resolved at once and provider's settings are read once per batch,
+        featuremedia pictures of the batch are resized together.
+
+        :param articles: anp news items json
+        :type articles: list
+        :param provider: Ingest Provider Details, defaults to None
+        :type provider: dict having properties defined in
+                        :py:class: `superdesk.io.ingest_provider_model.IngestProviderResource`
+        :return list: parsed items in order of `articles`
+        """
+        subjects = get_subjects_map(
+            'anp_genres', {qcode for article in articles for qcode in article.get('categories') or ()}
+        )
+
+        media_options = None
+        if any(article.get('media_link') for article in articles):
+            media_options = {
+                'ingest_provider': provider['feeding_service'],
+                'async': bool(provider['config'].get('async_featuremedia')),
+                'request_kwargs': get_request_kwargs(provider),
+                'pictures': [],
+            }
 
-        self._prefetch_vocabularies()
+        items = [self._parse_article(article, provider, subjects, media_options) for article in articles]
+        if media_options and media_options['pictures']:
+            update_featuremedia_renditions_many(media_options['pictures'], provider, media_options['request_kwargs'])
+        return items
 
+    def _parse_article(self, article, provider, subjects, media_options):
         item = {}
         item[ITEM_TYPE] = CONTENT_TYPE.TEXT
         item[GUID_FIELD] = article['id']
@@ -110,26 +209,21 @@ class ANPNewsApiFeedParser(FeedParser):
         item['priority'] = item['urgency']
         item['byline'] = ', '.join(article.get('authors', []))
 
-        for category_qcode in [
-            c for c in article.get('categories', []) if c in self._vocabularies['anp_genres']
-        ]:
-            item.setdefault('subject', []).append({
-                'name': self._vocabularies['anp_genres'][category_qcode]['name'],
-                'qcode': category_qcode,
-                'scheme': 'anp_genres'
-            })
+        item_subjects = [dict(subjects[qcode]) for qcode in article.get('categories') or () if qcode in subjects]
+        if item_subjects:
+            item['subject'] = item_subjects
 
-        for keyword in article.get('keywords', []):
-            item.setdefault('keywords', []).append(keyword)
+        if article.get('keywords'):
+            item['keywords'] = list(article['keywords'])
 
         # fetch media if item contains a media_link
         if article.get('media_link'):
-            self._add_featuremedia(provider, item, article['media_link'])
+            self._add_featuremedia(item, article['media_link'], provider, media_options)
 
         return item
 
     def _parse_date(self, string):
-        return datetime.datetime.strptime(string, '%Y-%m-%dT%H:%M:%SZ')
+        return parse_iso(string)
 
 
 register_feed_parser(ANPNewsApiFeedParser.NAME, ANPNewsApiFeedParser())
@@ -8,14 +8,55 @@
 # AUTHORS and LICENSE files distributed with this source code, or
 # at https://www.sourcefabric.org/superdesk/license
 
+import time
 import logging
-
-from superdesk.errors import IngestApiError
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from copy import deepcopy
+from datetime import timedelta
+
+import requests
+from flask import current_app as app, has_app_context
+from superdesk import config, get_resource_service
+from superdesk.errors import IngestApiError, SuperdeskIngestError
+from superdesk.utc import utcnow
+from superdesk.metadata.item import GUID_FIELD
 from superdesk.io.registry import register_feeding_service, register_feeding_service_parser
+from superdesk.io.commands.update_ingest import update_last_item_updated
 from superdesk.io.feeding_services.http_base_service import HTTPFeedingServiceBase
 
+from anp.cache import TTLCache
+from anp.io.bulk_ingest import can_bulk_ingest, bulk_ingest_items
+from anp.io.circuit_breaker import get_circuit_breaker
+from anp.io.filters import ItemFilter
+from anp.io.response_cache import get_response_cache
+from anp.io.tasks import fetch_featuremedia
+from anp.io.sessions import get_session, connection_stats, DEFAULT_POOL_SIZE
+from anp.stats import IngestStats, NULL_STATS
+from anp.io.throttling import get_rate_limiter, backoff_delays, DEFAULT_RATE, DEFAULT_BURST
+
 logger = logging.getLogger(__name__)
 
+# marker of a finished source poll
+POLL_DONE = object()
+
+
+def _put_result(results, result, stop):
+    """
+    Put `result` to `results` queue unless the consumer stopped waiting for results.
+
+    :return bool: True if the result was put to the queue
+    """
+    while not stop.is_set():
+        try:
+            results.put(result, timeout=0.5)
+            return True
+        except queue.Full:
+            pass
+    return False
+
 
 class ANPNewsApiFeedingService(HTTPFeedingServiceBase):
     """
@@ -31,9 +72,105 @@ class ANPNewsApiFeedingService(HTTPFeedingServiceBase):
             'label': 'Source titles',
             'placeholder': 'Use coma separated source titles. Example: AFN, ANP 101, Medianet BIN',
             'required': True
+        },
+        {
+            'id': 'max_workers',
+            'type': 'text',
+            'label': 'Concurrent requests',
+            'placeholder': 'Maximum number of item details fetched in parallel. Default: 4',
+            'required': False
+        },
+        {
+            'id': 'pool_size',
+            'type': 'text',
+            'label': 'HTTP connection pool size',
+            'placeholder': 'Maximum number of keep-alive connections. Default: {}'.format(DEFAULT_POOL_SIZE),
+            'required': False
+        },
+        {
+            'id': 'batch_size',
+            'type': 'text',
+            'label': 'Batch size',
+            'placeholder': 'Number of items saved at once. Default: 50',
+            'required': False
+        },
+        {
+            'id': 'item_kinds',
+            'type': 'text',
+            'label': 'Item kinds',
+            'placeholder': 'Use coma separated item kinds. Default: TEXTARTICLE',
+            'required': False
+        },
+        {
+            'id': 'categories',
+            'type': 'text',
+            'label': 'Categories',
+            'placeholder': 'Use coma separated categories to ingest only matching items. Example: ANP/BIN, FIN',
+            'required': False
+        },
+        {
+            'id': 'urgency_threshold',
+            'type': 'text',
+            'label': 'Urgency threshold',
+            'placeholder': 'Ingest only items with urgency up to this value. Example: 3',
+            'required': False
+        },
+        {
+            'id': 'denied_keywords',
+            'type': 'text',
+            'label': 'Denied keywords',
+            'placeholder': 'Use coma separated keywords to skip matching items. Example: ALERT, TEST',
+            'required': False
+        },
+        {
+            'id': 'rate_limit',
+            'type': 'text',
+            'label': 'Rate limit',
+            'placeholder': 'Maximum number of requests per second. Default: {}'.format(DEFAULT_RATE),
+            'required': False
+        },
+        {
+            'id': 'rate_burst',
+            'type': 'text',
+            'label': 'Rate burst',
+            'placeholder': 'Maximum number of requests sent at once. Default: {}'.format(DEFAULT_BURST),
+            'required': False
+        },
+        {
+            'id': 'max_retries',
+            'type': 'text',
+            'label': 'Max retries',
+            'placeholder': 'Number of retries of throttled or failed requests. Default: 3',
+            'required': False
+        },
+        {
+            'id': 'async_featuremedia',
+            'type': 'boolean',
+            'label': 'Download pictures in background',
+            'required': False
+        },
+        {
+            'id': 'bulk_ingest',
+            'type': 'boolean',
+            'label': 'Save new items in bulk',
+            'required': False
         }
     ]
     HTTP_TIMEOUT = 60
+    HTTP_MAX_WORKERS = 4
+    BATCH_SIZE = 50
+    SOURCE_BACKOFF_SECONDS = 60
+    SOURCE_MAX_BACKOFF_SECONDS = 60 * 60
+    SOURCES_CACHE_TTL = 60 * 60
+    MAX_RETRIES = 3
+    RETRY_BACKOFF_SECONDS = 1
+    RETRY_MAX_BACKOFF_SECONDS = 30
+    RETRY_ERROR_CODES = ('429', '500', '502', '503', '504')
+    CIRCUIT_FAILURE_THRESHOLD = 5
+    CIRCUIT_RESET_TIMEOUT = 60
+    ENDPOINTS = ('sources', 'items', 'item_details', 'item_media')
+
+    sources_cache = TTLCache(ttl=SOURCES_CACHE_TTL)
     HTTP_AUTH = True
     HTTP_SOURCES_URL = 'https://newsapi.anp.nl/services/sources'
     HTTP_ITEMS_URL = 'https://newsapi.anp.nl/services/sources/{source_id}/items'
@@ -43,17 +180,60 @@ class ANPNewsApiFeedingService(HTTPFeedingServiceBase):
     ALLOWED_ITEM_KINDS = ('TEXTARTICLE',)
     ALLOWED_MEDIA_KINDS = ('imgMid', )
     ALLOWED_MEDIA_MIMETYPES = ('image/jpeg', )
+    STATS_NAME = 'ANPNewsApi'
+
+    # stats of the running update
+    stats = NULL_STATS
 
-    def get_url(self, url=None, **kwargs):
+    def get_url(self, url=None, endpoint=None, **kwargs):
         """Do an HTTP Get on URL and validate response.
 
         :param string url: url to use (None to use self.HTTP_URL)
+        :param string endpoint: name of the endpoint, its circuit breaker guards the request
         :param **kwargs: extra parameter for requests
         :return dict: response content data
         """
-        response = super().get_url(url=url, **kwargs)
-        content = response.json()
+        response, content = self._request(url=url, endpoint=endpoint, **kwargs)
+        return self._get_content_data(url, content)
 
+    def get_cached_url(self, url, endpoint=None, version=None):
+        """Do an HTTP Get on URL using worker's response cache.
+
+        Cached data are served without a request while they are fresh,
+        stale data are revalidated using ETag/If-Modified-Since when the API supports it.
+        Data cached for another `version` are requested again.
+
+        :param string url: url to use
+        :param string endpoint: name of the endpoint, its circuit breaker guards the request
+        :param string version: version of the resource, ie. `modified` of the listed item
+        :return dict: response content data
+        """
+        cache = get_response_cache()
+        data = cache.get(url, version)
+        if data is not None:
+            return data
+
+        response, content = self._request(
+            url=url, endpoint=endpoint, headers=cache.conditional_headers(url, version)
+        )
+        if response.status_code == 304:
+            data = cache.revalidated(url)
+            if data is not None:
+                return data
+            # evicted meanwhile
+            response, content = self._request(url=url, endpoint=endpoint)
+
+        data = self._get_content_data(url, content)
+        cache.set(url, data, response.headers, version)
+        return data
+
+    def _get_content_data(self, url, content):
+        """Validate API response content and return its data.
+
+        :param string url: requested url
+        :param dict content: decoded response content
+        :return dict: response content data
+        """
         if content['hasError']:
             msg = "Error in GET: '{}'. ErrorCode: '{}'. Description: '{}'".format(
                 url,
@@ -65,111 +245,758 @@ class ANPNewsApiFeedingService(HTTPFeedingServiceBase):
 
         return content['data']
 
+    def _request(self, url=None, endpoint=None, **kwargs):
+        """Do an HTTP Get on URL using provider's pooled session.
+
+        Requests are rate limited per provider. Throttled requests and server errors are retried
+        with exponential back-off and the provider's rate decreases until the API accepts requests again.
+
+        Requests to an `endpoint` fail fast while its circuit breaker is open. Connection errors, timeouts
+        and server errors remaining after all retries count as the endpoint's failures.
+
+        :param string url: url to use (None to use self.HTTP_URL)
+        :param string endpoint: name of the endpoint, its circuit breaker guards the request
+        :param **kwargs: extra parameter for requests
+        :return tuple: response and its decoded content, content is None for 304 response
+        """
+        if url is None:
+            url = self.HTTP_URL
+        kwargs.setdefault('timeout', self.HTTP_TIMEOUT)
+
+        breaker = self.get_circuit_breaker(endpoint) if endpoint else None
+        if breaker is not None and not breaker.allow():
+            raise IngestApiError.apiConnectionError(
+                Exception("Circuit breaker of ANP News API '{}' endpoint is open".format(endpoint)), self.provider
+            )
+
+        try:
+            with self.stats.timer(endpoint or 'request'):
+                response, content = self._request_with_retries(url, **kwargs)
+        except IngestApiError:
+            if breaker is not None:
+                breaker.record_failure()
+            raise
+
+        if breaker is not None:
+            if self._is_throttled(response, content):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+        if not response.ok:
+            self.stats.incr('http_errors.{}'.format(response.status_code))
+            exception = Exception(response.reason)
+            if response.status_code in (401, 403):
+                raise IngestApiError.apiAuthError(exception, self.provider)
+            elif response.status_code == 404:
+                raise IngestApiError.apiNotFoundError(exception, self.provider)
+            else:
+                raise IngestApiError.apiGeneralError(exception, self.provider)
+
+        return response, content
+
+    def _request_with_retries(self, url, **kwargs):
+        """Send HTTP Get and retry it with exponential back-off while it's throttled.
+
+        :param string url: url to use
+        :param **kwargs: extra parameter for requests
+        :return tuple: the last response and its decoded content
+        """
+        rate_limiter = self.rate_limiter
+        delays = backoff_delays(self.max_retries, self.RETRY_BACKOFF_SECONDS, self.RETRY_MAX_BACKOFF_SECONDS)
+
+        while True:
+            rate_limiter.acquire()
+            response = self._send(url, **kwargs)
+            self.stats.incr('bytes', len(response.content or b''))
+            content = None
+            if response.ok and response.status_code != 304:
+                try:
+                    content = response.json()
+                except ValueError as error:
+                    raise IngestApiError.apiGeneralError(error, self.provider)
+                if content.get('hasError'):
+                    self.stats.error((content.get('data') or {}).get('errorCode'))
+
+            if not self._is_throttled(response, content):
+                rate_limiter.succeeded()
+                break
+
+            rate_limiter.throttled()
+            delay = next(delays, None)
+            if delay is None:
+                break
+            try:
+                retry_after = float(response.headers.get('Retry-After') or 0)
+            except ValueError:
+                retry_after = 0
+            if retry_after > self.RETRY_MAX_BACKOFF_SECONDS:
+                # don't block the worker, the source backs off instead
+                logger.warning("ANP News API throttled GET '{}' with status {}, Retry-After {:.0f}s is too long".format(
+                    url, response.status_code, retry_after
+                ))
+                break
+            delay = max(delay, retry_after)
+            logger.warning("ANP News API throttled GET '{}' with status {}, retrying in {:.1f}s".format(
+                url, response.status_code, delay
+            ))
+            time.sleep(delay)
+
+        return response, content
+
+    def _send(self, url, **kwargs):
+        """Send HTTP Get using provider's pooled session.
+
+        :param string url: url to use
+        :param **kwargs: extra parameter for requests
+        :return requests.Response: response
+        """
+        session = self.session
+        try:
+            return session.get(url, **kwargs)
+        except requests.exceptions.Timeout as exception:
+            raise IngestApiError.apiTimeoutError(exception, self.provider)
+        except requests.exceptions.ConnectionError as exception:
+            raise IngestApiError.apiConnectionError(exception, self.provider)
+        except requests.exceptions.RequestException as exception:
+            raise IngestApiError.apiRequestError(exception, self.provider)
+        except Exception as error:
+            raise IngestApiError.apiGeneralError(error, self.provider)
+
+    def _is_throttled(self, response, content):
+        """Check if the request was throttled or failed because of a server error and can be retried.
+
+        :param requests.Response response: response
+        :param dict content: decoded response content
+        :return bool: True if the request should be retried
+        """
+        if response.status_code == 429 or response.status_code >= 500:
+            return True
+        return bool(
+            content and content.get('hasError')
+            and str(content.get('data', {}).get('errorCode')) in self.RETRY_ERROR_CODES
+        )
+
+    def get_circuit_breaker(self, endpoint):
+        """
+        Get circuit breaker of provider's `endpoint` shared within the worker process
+
+        A new breaker is restored from the state saved in provider's `private.circuit_breakers`.
+
+        :param endpoint: name of the endpoint
+        :return CircuitBreaker: breaker
+        """
+        saved_state = ((self.provider.get('private') or {}).get('circuit_breakers') or {}).get(endpoint)
+        return get_circuit_breaker(
+            key=self.provider_key,
+            endpoint=endpoint,
+            saved_state=saved_state,
+            failure_threshold=self.CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=self.CIRCUIT_RESET_TIMEOUT
+        )
+
+    @property
+    def rate_limiter(self):
+        """Rate limiter shared by all requests of the provider within the worker process."""
+        return get_rate_limiter(
+            key=self.provider_key,
+            max_rate=self._get_int_config('rate_limit', DEFAULT_RATE),
+            burst=self._get_int_config('rate_burst', DEFAULT_BURST)
+        )
+
+    @property
+    def max_retries(self):
+        """Number of retries of throttled requests configured for the provider."""
+        return self._get_int_config('max_retries', self.MAX_RETRIES, minimum=0)
+
+    @property
+    def provider_key(self):
+        """Identifier of the provider used for worker process wide state."""
+        return str(self.provider.get('_id') or self.provider.get('name'))
+
+    @property
+    def session(self):
+        """Keep-alive session shared by all requests of the provider within the worker process."""
+        auth = None
+        if self.HTTP_AUTH:
+            auth = (self.config.get('username', '').strip(), self.config.get('password', '').strip())
+            if not all(auth):
+                raise SuperdeskIngestError.notConfiguredError(Exception('username and password are needed'))
+        return get_session(
+            key=self.provider_key,
+            auth=auth,
+            pool_size=self.pool_size
+        )
+
+    @property
+    def pool_size(self):
+        """Size of HTTP connection pool configured for the provider."""
+        return self._get_int_config('pool_size', DEFAULT_POOL_SIZE)
+
+    def _get_int_config(self, key, default, minimum=1):
+        """
+        Get integer value of provider's config `key`
+
+        :param key: config key
+        :param default: value used when config is not set or invalid
+        :param minimum: minimum value
+        :return int: config value
+        """
+        value = self.config.get(key)
+        if value is None or str(value).strip() == '':
+            return default
+        try:
+            return max(minimum, int(value))
+        except (TypeError, ValueError):
+            return default
+
+    @property
+    def max_workers(self):
+        """Maximum number of parallel requests for item details configured for the provider."""
+        return self._get_int_config('max_workers', self.HTTP_MAX_WORKERS)
+
+    @property
+    def batch_size(self):
+        """Number of items ingested at once configured for the provider."""
+        return self._get_int_config('batch_size', self.BATCH_SIZE)
+
+    def _in_app_context(self, func):
+        """
+        Wrap `func` so it runs within the current app context when it's called from a worker thread.
+
+        :param func: callable to wrap
+        :return: wrapped callable
+        """
+        if not has_app_context():
+            return func
+
+        flask_app = app._get_current_object()
+
+        def wrapper(*args, **kwargs):
+            with flask_app.app_context():
+                return func(*args, **kwargs)
+
+        return wrapper
+
     def _update(self, provider, update):
         """
         Fetch news items from ANP News http API
 
+        Sources are polled concurrently and every source keeps its own cursor, error count and back-off
+        in `private.sources.<source_id>`, so a failing source doesn't block or roll back the others.
+        Items are ingested as soon as any source has them, a slow source doesn't hold back the others.
+
+        Items are parsed and yielded in batches of `batch_size` items. Cursors are saved once a batch was ingested,
+        so a crash during the update doesn't discard the work done for previous batches.
+
+        State of endpoints circuit breakers is kept in `private.circuit_breakers.<endpoint>`.
+
+        With `async_featuremedia` config items are ingested without featuremedia renditions,
+        they are added by `fetch_featuremedia` tasks scheduled once a batch was ingested.
+
+        With `bulk_ingest` config new items of a batch are saved by a single write, see `anp.io.bulk_ingest`.
+
+        Timings of requests per endpoint, parsing, renditions and saving and counters of the update,
+        response cache hits, revalidations and misses included, are logged and reported to New Relic
+        once the update is done.
+
         :param provider: Ingest Provider Details.
         :type provider: dict
         :param update: Any update that is required on provider.
         :type update: dict
-        :return: a list of news items which can be saved.
+        :return: a generator of news items batches which can be saved.
+        """
+        self.stats = IngestStats(self.STATS_NAME)
+        connections = connection_stats(self.session)
+        cache_stats = get_response_cache().stats()
+        try:
+            yield from self._update_sources(provider, update)
+        finally:
+            self._count_cache_stats(cache_stats)
+            self.stats.log()
+            self.stats.report()
+            self._log_connection_stats(connections)
+            # keep the cache for the next worker
+            get_response_cache().save()
+
+    def _update_sources(self, provider, update, source_ids=None):
         """
+        Poll provider's sources and yield batches of news items, see `_update`
 
+        :param provider: Ingest Provider Details.
+        :type provider: dict
+        :param update: Any update that is required on provider.
+        :type update: dict
+        :param source_ids: ids of sources to poll, all sources are polled if None
+        :type source_ids: list
+        :return: a generator of news items batches which can be saved.
+        """
         parser = self.get_feed_parser(provider)
+        # keep the state of all sources, `private` is saved as a whole
+        update['private'] = deepcopy(provider.get('private') or {})
+        sources_state = update['private'].setdefault('sources', {})
         # http fetch sources
-        sources = self._fetch_sources()
-        parsed_items = []
+        try:
+            sources = [
+                src for src in self._fetch_sources()
+                if (source_ids is None or src['id'] in source_ids)
+                and not self._is_source_backing_off(sources_state.get(src['id'], {}))
+            ]
+        except IngestApiError:
+            # failed update isn't saved, keep the breakers state anyway
+            self._checkpoint(provider, update)
+            raise
+        # items details of the current batch
+        articles = []
+        # source and previous cursor of items of the current batch
+        cursors = {}
+
+        if not sources:
+            self._save_circuit_breakers(update)
+            return
+
+        # results of all sources in one queue, so a slow source doesn't hold back the others
+        results = queue.Queue(maxsize=self.max_workers * len(sources))
+        # sources whose results are consumed, by id
+        polling = {}
+        stops = {}
+
+        with ThreadPoolExecutor(max_workers=len(sources)) as sources_executor, \
+                ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            poll_source = self._in_app_context(self._poll_source)
+            for source in sources:
+                state = sources_state.setdefault(source['id'], {})
+                state['title'] = source['title']
+                polling[source['id']] = source
+                stops[source['id']] = threading.Event()
+                sources_executor.submit(
+                    poll_source,
+                    source=source,
+                    to_item=state.get('last_item_id'),
+                    executor=executor,
+                    results=results,
+                    stop=stops[source['id']]
+                )
 
-        for source in sources:
-            # http fetch items ids
-            source['items'] = self._fetch_items(
-                source_id=source['id'],
-                to_item=provider.get('private', {}).get('sources', {}).get(source['id'], {}).get('last_item_id')
+            try:
+                for source, item_id, item_details in self._iter_results(results, polling, sources_state):
+                    state = sources_state[source['id']]
+                    cursors[item_id] = (source['id'], state.get('last_item_id'))
+                    state['last_item_id'] = item_id
+                    if item_details is None:
+                        # filtered out
+                        continue
+
+                    articles.append(item_details)
+                    if len(articles) >= self.batch_size:
+                        rewound = yield from self._ingest_batch(parser, provider, update, articles, cursors)
+                        articles = []
+                        cursors = {}
+                        for source_id in rewound:
+                            # the source continues from the failed item during the next update
+                            polling.pop(source_id, None)
+                            stops[source_id].set()
+            finally:
+                # release pollers waiting for the consumer
+                for stop in stops.values():
+                    stop.set()
+
+        if articles:
+            yield from self._ingest_batch(parser, provider, update, articles, cursors)
+
+        self._save_circuit_breakers(update)
+
+    def _ingest_batch(self, parser, provider, update, articles, cursors):
+        """
+        Parse a batch of items details and yield items to ingest
+
+        With `bulk_ingest` config new items are saved at once, only items which need the regular ingest are yielded.
+
+        Ids of items which failed to save are sent back to the generator. Cursor of a source with a failed item
+        is rewound before the first failed item, so the next update retries it.
+
+        :param parser: feed parser
+        :param provider: Ingest Provider Details.
+        :type provider: dict
+        :param update: Any update that is required on provider.
+        :type update: dict
+        :param articles: details of items of the batch
+        :type articles: list
+        :param cursors: source id and previous cursor by item id
+        :type cursors: dict
+        :return set: ids of sources whose cursor was rewound
+        """
+        with self.stats.timer('parse'), self.stats.activate():
+            items = parser.parse_many(articles, provider)
+        self.stats.incr('parsed_items', len(items))
+
+        # time of the regular ingest is measured while the batch is yielded
+        with self.stats.timer('save'):
+            bulk_failed = []
+            if can_bulk_ingest(provider):
+                saved, items, bulk_failed = bulk_ingest_items(items, provider)
+                update_last_item_updated(update, saved)
+                self.stats.incr('bulk_items', len(saved))
+                logger.info("ANP News API provider '{}' saved {} items in bulk, {} left to ingest".format(
+                    provider.get('name'), len(saved), len(items)
+                ))
+
+            failed = None
+            if items:
+                failed = yield items
+
+        failed_guids = {
+            item[GUID_FIELD] for item in items
+            if failed and (item[GUID_FIELD] in failed or item.get(config.ID_FIELD) in failed)
+        }
+        failed_guids.update(item[GUID_FIELD] for item in bulk_failed)
+        rewound = self._rewind_cursors(update, articles, cursors, failed_guids)
+        self._checkpoint(provider, update)
+        self._schedule_featuremedia(provider, [article for article in articles if article['id'] not in failed_guids])
+        return rewound
+
+    def _rewind_cursors(self, update, articles, cursors, failed_guids):
+        """
+        Set cursors of sources with failed items before their first failed item
+
+        :param update: Any update that is required on provider.
+        :type update: dict
+        :param articles: details of items of the batch in the order they were listed
+        :type articles: list
+        :param cursors: source id and previous cursor by item id
+        :type cursors: dict
+        :param failed_guids: guids of items which failed to save
+        :type failed_guids: set
+        :return set: ids of sources whose cursor was rewound
+        """
+        sources_state = update['private']['sources']
+        rewound = set()
+        for article in articles:
+            if article['id'] not in failed_guids:
+                continue
+            source_id, previous = cursors[article['id']]
+            if source_id in rewound:
+                continue
+            rewound.add(source_id)
+            if previous is None:
+                sources_state[source_id].pop('last_item_id', None)
+            else:
+                sources_state[source_id]['last_item_id'] = previous
+            logger.warning("ANP News API item '{}' failed to save, source '{}' continues from it next update".format(
+                article['id'], sources_state[source_id].get('title')
+            ))
+        return rewound
+
+    def _checkpoint(self, provider, update):
+        """
+        Save sources cursors of ingested items and circuit breakers state
+
+        :param provider: Ingest Provider Details.
+        :type provider: dict
+        :param update: Any update that is required on provider.
+        :type update: dict
+        """
+        self._save_circuit_breakers(update)
+        if not provider.get(config.ID_FIELD):
+            return
+
+        get_resource_service('ingest_providers').system_update(
+            provider[config.ID_FIELD], {'private': update['private']}, provider
+        )
+
+    def _schedule_featuremedia(self, provider, articles):
+        """
+        Schedule featuremedia renditions of ingested items when `async_featuremedia` is set
+
+        :param provider: Ingest Provider Details.
+        :type provider: dict
+        :param articles: details of ingested items
+        :type articles: list
+        """
+        if not provider.get(config.ID_FIELD) or not self.config.get('async_featuremedia'):
+            return
+
+        for article in articles:
+            if article.get('media_link'):
+                fetch_featuremedia.delay(provider[config.ID_FIELD], article['id'], article['media_link'])
+
+    def _save_circuit_breakers(self, update):
+        """
+        Set current state of endpoints circuit breakers to provider's `private` data
+
+        :param update: Any update that is required on provider.
+        :type update: dict
+        """
+        update['private']['circuit_breakers'] = {
+            endpoint: self.get_circuit_breaker(endpoint).to_dict() for endpoint in self.ENDPOINTS
+        }
+
+    def _count_cache_stats(self, started):
+        """
+        Add response cache hits, revalidations and misses of the update to update's stats
+
+        :param started: stats of worker's response cache when the update started
+        :type started: dict
+        """
+        stats = get_response_cache().stats()
+        for name in ('hits', 'revalidations', 'misses'):
+            # cache is recreated when it's reset
+            self.stats.incr('cache_{}'.format(name), max(stats[name] - started[name], 0))
+        self.stats.incr('cache_size', stats['size'])
+
+    def _log_connection_stats(self, started):
+        """
+        Log connections opened and reused by the update
+
+        :param started: connection stats of provider's session when the update started
+        :type started: dict
+        """
+        stats = connection_stats(self.session)
+        # session is recreated when its pool size changes
+        logger.info("ANP News API connections of provider '{}': {} new, {} reused".format(
+            self.provider.get('name'),
+            max(stats['new'] - started['new'], 0),
+            max(stats['reused'] - started['reused'], 0)
+        ))
+
+    def _poll_source(self, source, to_item, executor, results, stop):
+        """
+        Fetch items of given source and put their details to `results` in the source's order
+
+        Items details are fetched in parallel, at most `max_workers` items ahead of the consumer.
+        Results are `(source_id, (item_id, item_details))` tuples, details are None for items skipped
+        by provider's filter. The poll ends with `POLL_DONE` marker or with the raised exception.
+
+        :param source: news source
+        :type source: dict
+        :param to_item: id of the last ingested item of the source
+        :type to_item: str
+        :param executor: executor used to fetch items details
+        :type executor: concurrent.futures.Executor
+        :param results: queue for items details, shared by all sources
+        :type results: queue.Queue
+        :param stop: event set when the consumer doesn't wait for results of the source anymore
+        :type stop: threading.Event
+        """
+        fetch_item_details = self._in_app_context(self._fetch_item_details)
+
+        def put(result):
+            return _put_result(results, (source['id'], result), stop)
+
+        item_filter = ItemFilter.from_config(self.config, self.ALLOWED_ITEM_KINDS)
+        pending = deque()
+
+        def fetch(item):
+            return item['id'], fetch_item_details(
+                source_id=source['id'], item_id=item['id'], item_filter=item_filter, version=item.get('modified')
             )
 
-            for item in [i for i in source['items'] if i['kind'] in self.ALLOWED_ITEM_KINDS]:
-                # http fetch item detail
-                item_details = self._fetch_item_details(source_id=source['id'], item_id=item['id'])
+        try:
+            # http fetch items ids
+            for item in self._fetch_items(source_id=source['id'], to_item=to_item):
+                if item_filter.accepts_listing(item):
+                    # http fetch item details
+                    pending.append(executor.submit(fetch, item))
+                else:
+                    # keep the item in the results, so the cursor advances past it
+                    skipped = Future()
+                    skipped.set_result((item['id'], None))
+                    pending.append(skipped)
+
+                if len(pending) >= self.max_workers and not put(pending.popleft().result()):
+                    return
+
+            while pending:
+                if not put(pending.popleft().result()):
+                    return
+        except Exception as e:
+            put(e)
+            return
+        finally:
+            for future in pending:
+                future.cancel()
+
+        put(POLL_DONE)
+
+    def _iter_results(self, results, polling, sources_state):
+        """
+        Yield `(source, item_id, item_details)` tuples as soon as any source has them.
+
+        Items of each source are yielded in the order they were listed. A source's results stop at the first
+        error of its poll, so the source's `last_item_id` never advances past an item which wasn't fetched.
+        Remaining items are fetched again during the next update.
 
-                update.setdefault('private', {}).setdefault('sources', {})[source['id']] = {
-                    'title': source['title'],
-                    'last_item_id': item_details['id']
-                }
+        :param results: queue filled by `_poll_source` of all sources
+        :param polling: sources by id whose results are consumed, a source removed by the caller is skipped
+        :param sources_state: sources state in provider's `private` data
+        """
+        while polling:
+            source_id, result = results.get()
+            source = polling.get(source_id)
+            if source is None:
+                # results of a stopped source are dropped
+                continue
+
+            state = sources_state[source_id]
+            if result is POLL_DONE:
+                del polling[source_id]
+                # source was polled successfully, reset back-off
+                state.pop('error_count', None)
+                state.pop('retry_after', None)
+            elif isinstance(result, Exception):
+                del polling[source_id]
+                self._source_failed(source, state, result)
+            else:
+                yield (source,) + tuple(result)
+
+    def _source_failed(self, source, state, error):
+        """
+        Increase source's error count and postpone its next poll using exponential back-off
 
-                # parse item
-                parsed_items.append(
-                    parser.parse(article=item_details, provider=provider)
-                )
+        :param source: news source
+        :param state: source's state in provider's `private` data
+        :param error: raised exception
+        """
+        state['error_count'] = state.get('error_count', 0) + 1
+        backoff = min(
+            self.SOURCE_BACKOFF_SECONDS * 2 ** (state['error_count'] - 1),
+            self.SOURCE_MAX_BACKOFF_SECONDS
+        )
+        state['retry_after'] = utcnow() + timedelta(seconds=backoff)
+        # API errors are expected, anything else is logged with its traceback
+        logger.error("Fetching items of source '{}' failed ({} in a row), next attempt after {}: {}".format(
+            source['title'], state['error_count'], state['retry_after'], error
+        ), exc_info=None if isinstance(error, IngestApiError) else error)
 
-        return [parsed_items]
+    def _is_source_backing_off(self, state):
+        """
+        Check if source's poll is postponed because of previous errors
+
+        :param state: source's state in provider's `private` data
+        :return bool: True if the source must be skipped during this update
+        """
+        retry_after = state.get('retry_after')
+        return bool(retry_after) and retry_after > utcnow()
 
     def _fetch_sources(self):
         """
         Fetch available sources and retrieves ids for `source_titles`
 
+        Matching sources are cached per provider for `SOURCES_CACHE_TTL` seconds,
+        the cache is invalidated when `source_titles` config changes.
+
         :return: a list of news sources.
         """
 
-        sources = self.get_url(url=self.HTTP_SOURCES_URL)
+        titles = frozenset(
+            title.lower().strip() for title in self.config['source_titles'].split(',') if title.strip()
+        )
+        cached = self.sources_cache.get(self.provider_key)
 
-        return [
-            src for src in sources if src['title'].lower() in [
-                title.lower().strip() for title in [
-                    title_conf.lower().strip() for title_conf in self.config['source_titles'].split(',')
-                ]
+        if cached is None or cached[0] != titles:
+            sources = [
+                src for src in self.get_url(url=self.HTTP_SOURCES_URL, endpoint='sources')
+                if src['title'].lower() in titles
             ]
-        ]
+            cached = (titles, sources)
+            self.sources_cache.set(self.provider_key, cached)
+
+        # sources are modified during update
+        return [dict(src) for src in cached[1]]
 
     def _fetch_items(self, source_id, to_item=None):
         """
-        Fetch items ids for given source id
+        Fetch items ids for given source id, oldest first
+
+        API lists items newest first. When it reports more items between the returned page
+        and `to_item`, older pages are requested until `to_item` is reached, so no item is skipped.
+        There is no limit of pages, the cursor moves to the newest item, so a gap left in the listing
+        would never be ingested. Paging stops only when the API has no more items or a page doesn't advance.
+        Items listed more than once are yielded once.
+        Only the compact listing entries are kept, a page's document is released once it's read.
+
         :param source_id:
         :type provider: int
-        :return: a list of items ids.
+        :param to_item: id of the last ingested item
+        :type to_item: str
+        :return: a generator of items ids.
         """
-        payload = {}
+        params = {}
         if to_item:
-            payload['params'] = {'toItem': to_item}
-        items = self.get_url(
-            url=self.HTTP_ITEMS_URL.format(source_id=source_id), **payload
-        )
-        items['items'].reverse()
-
-        return items['items']
-
-    def _fetch_item_details(self, source_id, item_id):
+            params['toItem'] = to_item
+        pages = []
+        seen = set()
+
+        while True:
+            payload = {'params': dict(params)} if params else {}
+            page = self.get_url(
+                url=self.HTTP_ITEMS_URL.format(source_id=source_id), endpoint='items', **payload
+            )
+            # paging stops when the page doesn't advance, ie. the API ignores `fromItem`
+            repeated = bool(page['items']) and page['items'][-1]['id'] in seen
+            reached = False
+            items = []
+            for item in page['items']:
+                if item['id'] == to_item:
+                    reached = True
+                    break
+                if item['id'] not in seen:
+                    seen.add(item['id'])
+                    items.append({'id': item['id'], 'kind': item['kind'], 'modified': item.get('modified')})
+            pages.append(items)
+
+            # without a cursor only the latest page is ingested
+            if not to_item or reached or repeated or not page.get('hasMore') or not items:
+                break
+            params['fromItem'] = items[-1]['id']
+
+        for items in reversed(pages):
+            yield from reversed(items)
+
+    def _fetch_item_details(self, source_id, item_id, item_filter=None, version=None):
         """
         Fetch item's details for given source id and item id
         :param source_id:
         :type provider: int
         :param item_id:
         :type provider: int
-        :return: a dict with item's details
+        :param item_filter: filter applied before item's media are fetched
+        :type item_filter: ItemFilter
+        :param version: `modified` of the listed item, cached details of other versions aren't used
+        :type version: str
+        :return: a dict with item's details, None if the item doesn't pass `item_filter`
         """
 
-        item_details = self.get_url(
-            url=self.HTTP_ITEM_DETAILS_URL.format(source_id=source_id, item_id=item_id)
+        item_details = self.get_cached_url(
+            url=self.HTTP_ITEM_DETAILS_URL.format(source_id=source_id, item_id=item_id),
+            endpoint='item_details',
+            version=version
         )
 
+        if item_filter is not None and not item_filter.accepts(item_details):
+            return None
+
         if item_details.get('hasMedia'):
-            media_link = self._fetch_media_link(source_id, item_id)
+            media_link = self._fetch_media_link(source_id, item_id, version)
             if media_link:
                 item_details['media_link'] = media_link
 
         return item_details
 
-    def _fetch_media_link(self, source_id, item_id):
+    def _fetch_media_link(self, source_id, item_id, version=None):
         """
         Fetch a list of all available renditions for an item and return a link to file
 
         :param source_id:
         :param item_id:
+        :param version: `modified` of the listed item
         :return str or None: link to the image or None
         """
         # fetch media renditions
-        media_renditions = self.get_url(
-            url=self.HTTP_ITEM_MEDIA_LIST_URL.format(source_id=source_id, item_id=item_id)
+        media_renditions = self.get_cached_url(
+            url=self.HTTP_ITEM_MEDIA_LIST_URL.format(source_id=source_id, item_id=item_id),
+            endpoint='item_media',
+            version=version
         )
         for rend in media_renditions:
             if rend.get('kind') in self.ALLOWED_MEDIA_KINDS and rend.get('mimeType') in self.ALLOWED_MEDIA_MIMETYPES:
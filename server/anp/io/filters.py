@@ -0,0 +1,106 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+from functools import lru_cache
+
+
+def _split(value):
+    """Split comma separated config value into a set of lowercased values."""
+    return frozenset(v.strip().lower() for v in (value or '').split(',') if v.strip())
+
+
+class ItemFilter:
+    """
+    ANP News API item filter compiled from provider's config.
+
+    Items listing only contains `id` and `kind` of an item, so kinds are checked before item's details are fetched.
+    Categories, urgency and keywords are checked on item's details, before its media are fetched and it's parsed.
+    """
+
+    def __init__(self, kinds, categories=None, urgency_threshold=None, denied_keywords=None):
+        """
+        :param kinds: allowed item kinds
+        :param categories: allowed categories, an item must have at least one of them, all are allowed if empty
+        :param urgency_threshold: maximum accepted urgency, 1 is the most urgent
+        :param denied_keywords: items with any of these keywords are skipped
+        """
+        self.kinds = frozenset(kind.upper() for kind in kinds)
+        self.categories = frozenset(category.lower() for category in categories or ())
+        self.urgency_threshold = urgency_threshold
+        self.denied_keywords = frozenset(keyword.lower() for keyword in denied_keywords or ())
+
+    @classmethod
+    def from_config(cls, config, default_kinds):
+        """
+        Get filter for provider's config
+
+        Filters are compiled once for the same config values.
+
+        :param config: provider's config
+        :type config: dict
+        :param default_kinds: kinds allowed when `item_kinds` is not configured
+        :return ItemFilter: filter
+        """
+        urgency_threshold = config.get('urgency_threshold')
+        return _compile(
+            config.get('item_kinds') or ','.join(default_kinds),
+            config.get('categories') or '',
+            '' if urgency_threshold is None else str(urgency_threshold).strip(),
+            config.get('denied_keywords') or ''
+        )
+
+    def accepts_listing(self, item):
+        """
+        Check items listing entry
+
+        :param item: listing entry
+        :return bool: True if item's details must be fetched
+        """
+        return item.get('kind', '').upper() in self.kinds
+
+    def accepts(self, article):
+        """
+        Check item details
+
+        :param article: item details
+        :return bool: True if item must be ingested
+        """
+        if not self.accepts_listing(article):
+            return False
+
+        if self.categories and not any(c.lower() in self.categories for c in article.get('categories') or ()):
+            return False
+
+        if self.urgency_threshold is not None:
+            try:
+                if int(article.get('urgency')) > self.urgency_threshold:
+                    return False
+            except (TypeError, ValueError):
+                pass
+
+        if self.denied_keywords and any(k.lower() in self.denied_keywords for k in article.get('keywords') or ()):
+            return False
+
+        return True
+
+
+@lru_cache(maxsize=32)
+def _compile(kinds, categories, urgency_threshold, denied_keywords):
+    try:
+        urgency_threshold = int(urgency_threshold)
+    except ValueError:
+        urgency_threshold = None
+
+    return ItemFilter(
+        kinds=_split(kinds),
+        categories=_split(categories),
+        urgency_threshold=urgency_threshold,
+        denied_keywords=_split(denied_keywords),
+    )
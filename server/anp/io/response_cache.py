@@ -0,0 +1,215 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import os
+import time
+import json
+import logging
+import tempfile
+import threading
+from copy import deepcopy
+from collections import OrderedDict
+
+from flask import current_app as app
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZE = 2000
+DEFAULT_MAX_AGE = 300
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class ResponseCache:
+    """
+    LRU cache of API responses data keyed by url.
+
+    An entry is served without a request for `max_age` seconds. Afterwards it's revalidated
+    using `ETag`/`Last-Modified` validators, if the API sent them, so an unchanged response costs a 304.
+    An entry cached for another `version` of the resource, ie. its modification time, is never used.
+    """
+
+    def __init__(self, maxsize=DEFAULT_SIZE, max_age=DEFAULT_MAX_AGE, path=None, timer=time.time):
+        """
+        :param maxsize: maximum number of cached responses
+        :param max_age: number of seconds a response is used without revalidation
+        :param path: file used to keep the cache between worker restarts
+        :param timer: function returning current time in seconds
+        """
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self.path = path
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self._timer = timer
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _entry(self, url, version):
+        entry = self._entries.get(url)
+        if entry is None or (version is not None and entry.get('version') != version):
+            return None
+        return entry
+
+    def get(self, url, version=None):
+        """
+        Get data of a fresh cached response
+
+        :param url: request url
+        :param version: version of the resource, entries of other versions are ignored
+        :return: a copy of cached data, None if there is no fresh response
+        """
+        with self._lock:
+            entry = self._entry(url, version)
+            if entry is None or entry['expires'] <= self._timer():
+                return None
+            self._entries.move_to_end(url)
+            self.hits += 1
+            return deepcopy(entry['data'])
+
+    def conditional_headers(self, url, version=None):
+        """
+        Get request headers revalidating a stale cached response
+
+        :param url: request url
+        :param version: version of the resource, entries of other versions are ignored
+        :return dict: `If-None-Match` and `If-Modified-Since` headers if the cached response has validators
+        """
+        with self._lock:
+            entry = self._entry(url, version)
+            headers = {}
+            if entry is not None:
+                if entry['etag']:
+                    headers['If-None-Match'] = entry['etag']
+                if entry['last_modified']:
+                    headers['If-Modified-Since'] = entry['last_modified']
+            return headers
+
+    def revalidated(self, url):
+        """
+        Mark cached response as still valid after a 304 response
+
+        :param url: request url
+        :return: a copy of cached data, None if the response isn't cached anymore
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None
+            entry['expires'] = self._timer() + self.max_age
+            self._entries.move_to_end(url)
+            self.revalidations += 1
+            return deepcopy(entry['data'])
+
+    def set(self, url, data, headers=None, version=None):
+        """
+        Cache response data
+
+        :param url: request url
+        :param data: response data
+        :param headers: response headers
+        :param version: version of the resource
+        """
+        headers = headers or {}
+        with self._lock:
+            self.misses += 1
+            self._entries[url] = {
+                'data': deepcopy(data),
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified'),
+                'expires': self._timer() + self.max_age,
+                'version': version,
+            }
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remove all responses and reset statistics."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.revalidations = self.misses = 0
+
+    def stats(self):
+        """
+        Get cache statistics
+
+        :return dict: `hits`, `revalidations`, `misses` and `size`
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'revalidations': self.revalidations,
+                'misses': self.misses,
+                'size': len(self._entries),
+            }
+
+    def load(self):
+        """Load responses saved in `path`, entries are stored as JSON."""
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, 'r') as f:
+                entries = [(url, entry) for url, entry in json.load(f) if isinstance(entry, dict)]
+        except Exception as e:
+            logger.warning("Loading ANP News API response cache from '{}' failed: {}".format(self.path, e))
+            return
+
+        with self._lock:
+            self._entries = OrderedDict(entries)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def save(self):
+        """Save responses to `path` as JSON."""
+        if not self.path:
+            return
+
+        with self._lock:
+            entries = list(self._entries.items())
+
+        dirname = os.path.dirname(os.path.abspath(self.path))
+        try:
+            with tempfile.NamedTemporaryFile('w', dir=dirname, delete=False) as f:
+                json.dump(entries, f)
+            os.replace(f.name, self.path)
+        except Exception as e:
+            logger.warning("Saving ANP News API response cache to '{}' failed: {}".format(self.path, e))
+
+
+def get_response_cache():
+    """
+    Get response cache shared by the worker process
+
+    Cache is configured using `ANP_NEWS_API_CACHE_SIZE`, `ANP_NEWS_API_CACHE_MAX_AGE`
+    and `ANP_NEWS_API_CACHE_PATH` settings.
+
+    :return ResponseCache: cache
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(
+                maxsize=app.config.get('ANP_NEWS_API_CACHE_SIZE', DEFAULT_SIZE),
+                max_age=app.config.get('ANP_NEWS_API_CACHE_MAX_AGE', DEFAULT_MAX_AGE),
+                path=app.config.get('ANP_NEWS_API_CACHE_PATH'),
+            )
+            _cache.load()
+        return _cache
+
+
+def reset_response_cache():
+    """Drop the worker process cache, it's created again with current settings."""
+    global _cache
+    with _cache_lock:
+        _cache = None
@@ -0,0 +1,83 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 10
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(key, auth=None, pool_size=DEFAULT_POOL_SIZE):
+    """
+    Get a pooled keep-alive session for `key`.
+
+    Sessions live in the worker process, so connections are reused across ingest cycles.
+    A session is recreated when its pool size changes.
+
+    :param key: session identifier, ie. ingest provider id
+    :param auth: auth tuple used by all requests of the session
+    :param int pool_size: maximum number of connections kept alive per host
+    :return requests.Session: session
+    """
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None or session.pool_size != pool_size:
+            if session is not None:
+                session.close()
+            session = _sessions[key] = _create_session(pool_size)
+        session.auth = auth
+        return session
+
+
+def close_sessions():
+    """Close all pooled sessions."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def connection_stats(session):
+    """
+    Get the number of new and reused connections of `session`.
+
+    Every new https connection costs a TLS handshake, a reused one doesn't.
+
+    :param requests.Session session: session
+    :return dict: `new` and `reused` connections count
+    """
+    new = total = 0
+    # the same adapter is mounted for several prefixes
+    adapters = {id(adapter): adapter for adapter in session.adapters.values()}
+    for adapter in adapters.values():
+        pools = adapter.poolmanager.pools
+        for pool_key in pools.keys():
+            try:
+                pool = pools[pool_key]
+            except KeyError:
+                # pool was discarded meanwhile
+                continue
+            new += pool.num_connections
+            total += pool.num_requests
+    return {'new': new, 'reused': max(total - new, 0)}
+
+
+def _create_session(pool_size):
+    session = requests.Session()
+    session.pool_size = pool_size
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
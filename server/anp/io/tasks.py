@@ -0,0 +1,83 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import logging
+from copy import deepcopy
+
+from superdesk import config, get_resource_service
+from superdesk.celery_app import celery
+from superdesk.metadata.item import GUID_FIELD
+
+from anp.io.feed_parsers.anp_news_api import update_featuremedia_renditions, RENDITION_FIELDS
+
+logger = logging.getLogger(__name__)
+
+
+def _patch_pictures(service, pictures, association):
+    for picture in pictures:
+        if not picture.get('renditions'):
+            service.system_update(
+                picture[config.ID_FIELD],
+                {field: association[field] for field in RENDITION_FIELDS if field in association},
+                picture
+            )
+
+
+@celery.task(soft_time_limit=600)
+def fetch_featuremedia(provider_id, guid, href):
+    """
+    Generate renditions of ingested item's featuremedia and patch the item
+
+    Ingested picture item of the featuremedia, if there is any, is patched as well.
+    So are archive copies of both items, which could be fetched or routed before the task runs.
+
+    :param provider_id: ingest provider id
+    :param guid: guid of the ingested text item
+    :param href: link to the featuremedia picture
+    """
+    provider = get_resource_service('ingest_providers').find_one(req=None, _id=provider_id)
+    if not provider:
+        logger.warning("Ingest provider '{}' of item '{}' not found, featuremedia is skipped".format(provider_id, guid))
+        return
+
+    ingest_service = get_resource_service('ingest')
+    item = ingest_service.find_one(req=None, guid=guid)
+    media_guid = href.rsplit('/', 1)[-1]
+    association = ((item or {}).get('associations') or {}).get('featuremedia')
+    if not association or association.get(GUID_FIELD) != media_guid:
+        logger.warning("Featuremedia '{}' of ingested item '{}' not found".format(media_guid, guid))
+        return
+
+    if not association.get('renditions'):
+        association = deepcopy(association)
+        update_featuremedia_renditions(association, href, provider)
+        associations = dict(item['associations'], featuremedia=association)
+        ingest_service.system_update(item[config.ID_FIELD], {'associations': associations}, item)
+
+    picture = ingest_service.find_one(req=None, guid=media_guid)
+    if picture:
+        _patch_pictures(ingest_service, [picture], association)
+
+    # archive copies refer to ingested items by `ingest_id`
+    archive_service = get_resource_service('archive')
+    for archived in archive_service.get_from_mongo(req=None, lookup={
+        'ingest_id': {'$in': list({guid, item[config.ID_FIELD]})},
+    }):
+        featuremedia = (archived.get('associations') or {}).get('featuremedia')
+        if featuremedia and featuremedia.get(GUID_FIELD) == media_guid and not featuremedia.get('renditions'):
+            featuremedia = dict(featuremedia, **{field: association[field] for field in RENDITION_FIELDS
+                                                 if field in association})
+            associations = dict(archived['associations'], featuremedia=featuremedia)
+            archive_service.system_update(archived[config.ID_FIELD], {'associations': associations}, archived)
+
+    picture_ids = {media_guid} | ({picture[config.ID_FIELD]} if picture else set())
+    _patch_pictures(archive_service, archive_service.get_from_mongo(req=None, lookup={
+        'ingest_id': {'$in': list(picture_ids)},
+    }), association)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import time
+import random
+import threading
+
+DEFAULT_RATE = 10
+DEFAULT_BURST = 10
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket with adaptive rate.
+
+    The rate is halved every time the API throttles requests and grows back by a twentieth
+    of `max_rate` with every successful request, so it stays close to the highest rate the API tolerates.
+    """
+
+    def __init__(self, max_rate=DEFAULT_RATE, burst=DEFAULT_BURST, min_rate=0.5, timer=time.monotonic,
+                 sleep=time.sleep):
+        """
+        :param max_rate: maximum number of requests per second
+        :param burst: maximum number of requests made at once
+        :param min_rate: rate never decreases under this value
+        :param timer: function returning current time in seconds
+        :param sleep: function used to wait for a token
+        """
+        self.max_rate = float(max_rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.burst = burst
+        self.rate = self.max_rate
+        self._tokens = float(burst)
+        self._timer = timer
+        self._sleep = sleep
+        self._updated = timer()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until a request can be made."""
+        while True:
+            with self._lock:
+                now = self._timer()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+    def throttled(self):
+        """Decrease the rate after the API throttled a request."""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def succeeded(self):
+        """Increase the rate after a successful request."""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+def get_rate_limiter(key, max_rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+    """
+    Get rate limiter shared by the worker process for `key`.
+
+    A limiter is recreated when its limits change.
+
+    :param key: limiter identifier, ie. ingest provider id
+    :param max_rate: maximum number of requests per second
+    :param burst: maximum number of requests made at once
+    :return RateLimiter: limiter
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None or limiter.max_rate != max_rate or limiter.burst != burst:
+            limiter = _limiters[key] = RateLimiter(max_rate=max_rate, burst=burst)
+        return limiter
+
+
+def backoff_delays(retries, base, cap):
+    """
+    Generate exponential back-off delays with full jitter.
+
+    :param retries: number of delays
+    :param base: delay of the first retry in seconds
+    :param cap: maximum delay in seconds
+    :return: a generator of delays in seconds
+    """
+    for attempt in range(retries):
+        yield random.uniform(0, min(cap, base * 2 ** attempt))
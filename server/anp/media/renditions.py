@@ -0,0 +1,114 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import logging
+from io import BytesIO
+
+from flask import current_app as app
+from superdesk.filemeta import set_filemeta
+from superdesk.media import renditions
+from superdesk.media.media_operations import process_file, process_file_from_stream
+
+from anp.stats import current_stats
+from anp.media.resize import resize_many
+
+logger = logging.getLogger(__name__)
+
+
+def _image_format(content_type):
+    """Get format of renditions for `content_type`, same as superdesk's `generate_renditions`."""
+    ext = content_type.split('/')[1].lower()
+    if ext == 'jpg':
+        return 'jpeg'
+    return ext if ext in ('jpeg', 'gif', 'tiff', 'png') else 'png'
+
+
+def update_renditions(item, href, request_kwargs=None):
+    """
+    Download a picture and add its renditions to the item
+
+    Works like superdesk's `update_renditions`, see `update_renditions_many`.
+
+    :param item: item to update
+    :type item: dict
+    :param href: link to the picture
+    :param request_kwargs: extra parameters for the download request
+    """
+    update_renditions_many([(item, href)], request_kwargs)
+
+
+def update_renditions_many(pictures, request_kwargs=None):
+    """
+    Download pictures and add their renditions to the items
+
+    Works like superdesk's `update_renditions`, but system renditions defined in `RENDITIONS.picture`
+    are generated by `resize_many`: each picture is decoded once and renditions are resized from each other.
+    Pictures are resized together, in a pool of `ANP_RENDITIONS_PROCESSES` processes when the setting is set
+    and the process can start children, ie. it's not a process of celery's prefork pool.
+    Custom crops are still generated by superdesk.
+
+    :param pictures: list of `(item, href)` tuples, item to update and link to its picture
+    :param request_kwargs: extra parameters for the download requests
+    """
+    inserted = []
+    try:
+        rendition_spec = renditions.get_renditions_spec()
+        system_spec = {
+            name: rendition_spec.pop(name) for name in list(rendition_spec)
+            if name in app.config['RENDITIONS']['picture']
+            and (rendition_spec[name].get('width') or rendition_spec[name].get('height'))
+        }
+
+        images = []
+        for item, href in pictures:
+            content, filename, content_type = renditions.download_file_from_url(href, request_kwargs)
+            current_stats().incr('bytes', len(content.getvalue()))
+            file_type = content_type.split('/')[0]
+            metadata = process_file(content, file_type)
+            file_guid = app.media.put(content, filename, content_type, metadata)
+            inserted.append(file_guid)
+
+            # original and custom crops
+            item['renditions'] = renditions.generate_renditions(
+                content, file_guid, inserted, file_type, content_type, rendition_spec, app.media.url_for_media
+            )
+            item['mimetype'] = content_type
+            set_filemeta(item, metadata)
+            if file_type == 'image' and system_spec:
+                content.seek(0)
+                images.append((item, content.read(), _image_format(content_type)))
+
+        for image_format in {image_format for _, _, image_format in images}:
+            batch = [(item, content) for item, content, _format in images if _format == image_format]
+            resized = resize_many(
+                [content for _, content in batch], system_spec, image_format=image_format,
+                processes=app.config.get('ANP_RENDITIONS_PROCESSES', 0)
+            )
+            for (item, _), item_renditions in zip(batch, resized):
+                for name, (data, width, height) in item_renditions.items():
+                    file_name, rend_content_type, rend_metadata = process_file_from_stream(
+                        BytesIO(data), content_type='image/{}'.format(image_format)
+                    )
+                    media_id = app.media.put(
+                        BytesIO(data), filename=file_name, content_type=rend_content_type, metadata=rend_metadata
+                    )
+                    inserted.append(media_id)
+                    item['renditions'][name] = {
+                        'href': app.media.url_for_media(media_id, rend_content_type),
+                        'media': media_id,
+                        'mimetype': 'image/{}'.format(image_format),
+                        'width': width,
+                        'height': height,
+                    }
+    except Exception as e:
+        logger.exception(e)
+        for file_id in inserted:
+            app.media.delete(file_id)
+        raise
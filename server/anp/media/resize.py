@@ -0,0 +1,192 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import threading
+import multiprocessing
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+try:
+    from billiard import process as billiard_process
+except ImportError:
+    billiard_process = None
+
+QUALITY = 85
+EXIF_ORIENTATION_TAG = 274
+# transpositions turning an image to its EXIF orientation, `ImageOps.exif_transpose` needs Pillow 6
+ORIENTATION_TRANSPOSE = {
+    2: (Image.FLIP_LEFT_RIGHT,),
+    3: (Image.ROTATE_180,),
+    4: (Image.FLIP_TOP_BOTTOM,),
+    5: (Image.ROTATE_90, Image.FLIP_TOP_BOTTOM),
+    6: (Image.ROTATE_270,),
+    7: (Image.ROTATE_90, Image.FLIP_LEFT_RIGHT),
+    8: (Image.ROTATE_90,),
+}
+# orientations of images stored rotated by 90 degrees
+SWAPPED_ORIENTATIONS = (5, 6, 7, 8)
+LANCZOS = getattr(Image, 'LANCZOS', None) or Image.ANTIALIAS
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def target_size(width, height, spec):
+    """
+    Get size of a rendition keeping image proportions, same as superdesk's `_resize_image`
+
+    :param width: image width
+    :param height: image height
+    :param spec: rendition spec with `width` and/or `height`
+    :return tuple: rendition width and height
+    """
+    new_width = int(spec['width']) if spec.get('width') else None
+    new_height = int(spec['height']) if spec.get('height') else None
+    if new_width is None and new_height is None:
+        raise ValueError('size parameter requires at least width or height value')
+
+    if new_width is not None and new_height is not None:
+        x_ratio = width / new_width
+        y_ratio = height / new_height
+        if x_ratio > y_ratio:
+            new_height = int(height / x_ratio)
+        else:
+            new_width = int(width / y_ratio)
+    elif new_width is not None:
+        new_height = int(new_width / (width / height))
+    else:
+        new_width = int(new_height * (width / height))
+
+    return max(1, new_width), max(1, new_height)
+
+
+def _orientation(img):
+    try:
+        exif = img._getexif() or {}
+    except Exception:
+        return None
+    return exif.get(EXIF_ORIENTATION_TAG)
+
+
+def resize_all(content, specs, image_format='jpeg', quality=QUALITY):
+    """
+    Generate resized renditions of an image
+
+    The image is decoded once. JPEG images are decoded in draft mode, scaled down by the decoder
+    as much as the largest rendition allows. Renditions are then resized largest to smallest,
+    each one from the previous rendition, so every resize works on the smallest possible input.
+
+    :param bytes content: original image
+    :param dict specs: rendition specs by rendition name, each with `width` and/or `height`
+    :param image_format: format of renditions
+    :param quality: quality of JPEG renditions
+    :return dict: `(content, width, height)` tuples by rendition name
+    """
+    img = Image.open(BytesIO(content))
+    orientation = _orientation(img)
+    width, height = img.size
+    if orientation in SWAPPED_ORIENTATIONS:
+        width, height = height, width
+
+    sizes = sorted(
+        ((name, target_size(width, height, spec)) for name, spec in specs.items()),
+        key=lambda rendition: rendition[1][0] * rendition[1][1],
+        reverse=True
+    )
+    if not sizes:
+        return {}
+
+    # decoder scales by 1/2, 1/4 or 1/8 while the result is still larger than requested
+    draft_size = max(size[0] for _, size in sizes), max(size[1] for _, size in sizes)
+    if orientation in SWAPPED_ORIENTATIONS:
+        draft_size = draft_size[1], draft_size[0]
+    img.draft('RGB', draft_size)
+    img.load()
+    for transpose in ORIENTATION_TRANSPOSE.get(orientation, ()):
+        img = img.transpose(transpose)
+    if image_format == 'jpeg' and img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+
+    renditions = {}
+    base = img
+    for name, size in sizes:
+        if base.size[0] < size[0] or base.size[1] < size[1]:
+            # upscaled rendition of a small image
+            base = img
+        resized = base.resize(size, LANCZOS) if base.size != size else base
+        out = BytesIO()
+        try:
+            resized.save(out, image_format, quality=quality)
+        except IOError:
+            out = BytesIO()
+            resized.convert('RGB').save(out, image_format, quality=quality)
+        renditions[name] = (out.getvalue(), size[0], size[1])
+        base = resized
+
+    return renditions
+
+
+def _can_start_children():
+    """
+    Check if the process can start a process pool
+
+    Processes of celery's prefork pool are daemonic billiard processes, `multiprocessing` doesn't know them,
+    so both are checked.
+    """
+    if multiprocessing.current_process().daemon:
+        return False
+    return billiard_process is None or not billiard_process.current_process().daemon
+
+
+def get_executor(processes):
+    """
+    Get process pool shared by the process for renditions
+
+    :param processes: number of processes
+    :return ProcessPoolExecutor: executor, None when the process can't start children, ie. it's a celery worker
+    """
+    global _executor
+    if not _can_start_children():
+        return None
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=processes)
+        return _executor
+
+
+def shutdown_executor():
+    """Stop the process pool."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+
+
+def resize_many(images, specs, image_format='jpeg', quality=QUALITY, processes=0):
+    """
+    Generate renditions of several images, across a process pool when `processes` is set
+
+    :param images: list of original images contents
+    :param dict specs: rendition specs by rendition name
+    :param image_format: format of renditions
+    :param quality: quality of JPEG renditions
+    :param processes: size of the process pool when it's created, images are resized in the current process if 0
+    :return list: renditions of images as returned by `resize_all`, in order of `images`
+    """
+    executor = get_executor(processes) if processes else None
+    if executor is None:
+        return [resize_all(content, specs, image_format, quality) for content in images]
+
+    futures = [executor.submit(resize_all, content, specs, image_format, quality) for content in images]
+    return [future.result() for future in futures]
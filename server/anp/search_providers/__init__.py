@@ -13,5 +13,15 @@ from .talpa_video import TalpaVideoSearchProvider
 
 
 def init_app(app):
+    from apps.search_providers.proxy import PROXY_ENDPOINT, SearchProviderProxyResource
+    from .proxy import FetchManySearchProviderProxyService
+
     superdesk.register_search_provider('anp', provider_class=PhotoSearchProvider)
     superdesk.register_search_provider('talpa_video', provider_class=TalpaVideoSearchProvider)
+    # replaces superdesk's proxy service, so items of a fetch request are fetched at once
+    superdesk.register_resource(
+        name=PROXY_ENDPOINT,
+        resource=SearchProviderProxyResource,
+        service=FetchManySearchProviderProxyService,
+        _app=app
+    )
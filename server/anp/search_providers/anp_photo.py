@@ -1,19 +1,58 @@
 
 import math
 import enum
+import threading
 import superdesk
 import requests
 
-from flask import json, request, current_app as app
-from datetime import datetime
-from xmlrpc.client import ServerProxy
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from flask import json, request, g, current_app as app, has_app_context, has_request_context
 from superdesk.utils import ListCursor
-from superdesk.utc import local_to_utc
 from superdesk.media.renditions import update_renditions
 
+from anp.cache import TTLCache
+from anp.dates import parse_compact, local_to_utc
+from anp.search_providers.search_cache import get_search_cache
+from anp.search_providers.prefetch import get_prefetcher
+from anp.search_providers.transport import get_proxy
+from anp.search_providers.tasks import fetch_photo_renditions
+
 
 TZ = 'Europe/Amsterdam'
 
+# prefetch depth is bounded, pages further away are rarely requested
+MAX_PREFETCH_PAGES = 2
+# searches are served within the 30s gunicorn worker timeout, the search itself must fit after the wait
+PREFETCH_WAIT_SECONDS = 3
+
+RPC_WORKERS = 8
+RENDITION_WORKERS = 4
+
+# search results of recent searches by photo id, fetched photos don't need another search
+photo_index = TTLCache(ttl=10 * 60, maxsize=5000)
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def _get_executor(name, max_workers):
+    with _executors_lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(max_workers=max_workers)
+        return _executors[name]
+
+
+def get_rpc_executor():
+    """Get thread pool running concurrent XML-RPC calls of the process."""
+    return _get_executor('rpc', RPC_WORKERS)
+
+
+def get_renditions_executor():
+    """Get thread pool generating renditions of fetched photos, sized by `ANP_PHOTO_FETCH_WORKERS`."""
+    config = app.config if has_app_context() else {}
+    return _get_executor('renditions', config.get('ANP_PHOTO_FETCH_WORKERS', RENDITION_WORKERS))
+
 
 class Fields(enum.IntEnum):
     thumbnail = 1
@@ -59,8 +98,9 @@ class PhotoSearchProvider(superdesk.SearchProvider):
 
     @property
     def proxy(self):
+        """Keep-alive proxy shared by all searches of the process."""
         if not hasattr(self, '_proxy'):
-            self._proxy = ServerProxy(self.url)
+            self._proxy = get_proxy(self.url, name='ANPPhotoSearch')
         return self._proxy
 
     def find(self, query, params=None):
@@ -99,7 +139,8 @@ class PhotoSearchProvider(superdesk.SearchProvider):
         except KeyError:
             pass
 
-        data = self.proxy.search(_params)
+        data = self._search(_params)
+        self._prefetch(_params, data['totalresults'])
         items = []
         for i in range(0, _params['pagesize']):
             item = self._parse_item(data.get(str(i + 1)))
@@ -107,6 +148,75 @@ class PhotoSearchProvider(superdesk.SearchProvider):
                 items.append(item)
         return PhotoListCursor(items, data['totalresults'])
 
+    def _search(self, params):
+        """
+        Search using the search cache shared by the newsroom
+
+        :param params: search parameters
+        :return dict: search response
+        """
+        cache = get_search_cache()
+        key = cache.key(self.url, params)
+        data = cache.get(key)
+        if data is None:
+            # page could be on its way already
+            data = get_prefetcher().wait(key, timeout=PREFETCH_WAIT_SECONDS)
+        if data is None:
+            data = self.proxy.search(params)
+            cache.set(key, data)
+        self._index(data)
+        return data
+
+    def _index(self, data):
+        """Keep results of the search for photo fetches."""
+        for name, result in data.items():
+            if name != 'totalresults' and isinstance(result, dict) and result.get('id'):
+                photo_index.set(str(result['id']), result)
+
+    def _prefetch(self, params, total):
+        """
+        Fetch following pages of the search in the background
+
+        Next pages are stored in the search cache, so paging through results doesn't wait for ANP.
+        Prefetches of a user's previous query are cancelled once the user searches for something else.
+
+        :param params: search parameters of the served page
+        :param total: total number of results
+        """
+        pages = min(self._prefetch_pages(), MAX_PREFETCH_PAGES)
+        cache = get_search_cache()
+        if pages <= 0 or cache.ttl <= 0:
+            return
+
+        prefetches = []
+        for page in range(params['page'] + 1, params['page'] + pages + 1):
+            if (page - 1) * params['pagesize'] >= total:
+                break
+            page_params = dict(params, page=page)
+            key = cache.key(self.url, page_params)
+            if key not in cache.local:
+                prefetches.append((key, self._prefetch_page(cache, key, page_params)))
+
+        query_key = cache.key(self.url, dict(params, page=None))
+        get_prefetcher().prefetch(self._prefetch_owner(), query_key, prefetches)
+
+    def _prefetch_page(self, cache, key, params):
+        def prefetch():
+            data = self.proxy.search(params)
+            cache.set(key, data)
+            self._index(data)
+            return data
+        return prefetch
+
+    def _prefetch_pages(self):
+        config = app.config if has_app_context() else {}
+        return config.get('ANP_PHOTO_SEARCH_PREFETCH_PAGES', 0)
+
+    def _prefetch_owner(self):
+        if has_request_context() and g.get('user'):
+            return str(g.user.get('_id'))
+        return str(self.provider.get('_id'))
+
     def _parse_item(self, data):
         if not data:
             return
@@ -134,30 +244,114 @@ class PhotoSearchProvider(superdesk.SearchProvider):
         }
 
     def _parse_date(self, string):
-        local = datetime.strptime(string, '%Y%m%d %H:%M:%S')
-        return local_to_utc(TZ, local)
+        return local_to_utc(TZ, parse_compact(string))
 
     def fetch(self, guid):
-        _id = int(guid.split(':')[-1])
-        base_params = {
+        """
+        Fetch photo with its renditions
+
+        :param guid: guid of the photo
+        :return dict: item
+        """
+        for _guid, item, error in self.fetch_many([guid]):
+            if error is not None:
+                raise error
+            return item
+
+    def fetch_many(self, guids):
+        """
+        Fetch photos with their renditions, results are yielded as soon as every photo is done
+
+        Metadata of photos found by recent searches is taken from their results, other photos are
+        searched by reference. ANP search takes a single reference, so these searches run concurrently
+        along with media location lookups. Renditions are generated by a pool of `ANP_PHOTO_FETCH_WORKERS`
+        threads, or in the background when `ANP_PHOTO_FETCH_ASYNC_RENDITIONS` is set and photos
+        are returned with their preview renditions meanwhile.
+
+        :param guids: list of photos guids
+        :return: generator of `(guid, item, error)` tuples, `error` is an exception if the fetch failed
+        """
+        proxy = self.proxy
+        executor = get_rpc_executor()
+        async_renditions = self._async_renditions()
+
+        metadata = {}
+        locations = {}
+        # future -> (stage, guid)
+        pending = {}
+        for guid in dict.fromkeys(guids):
+            _id = int(guid.split(':')[-1])
+            result = photo_index.get(str(_id))
+            if result is not None:
+                metadata[guid] = result
+            else:
+                pending[executor.submit(self._search_photo, _id)] = ('search', guid)
+            pending[executor.submit(proxy.getmedialocation, self._location_params(_id))] = ('location', guid)
+
+        failed = set()
+        while pending:
+            done, _not_done = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, guid = pending.pop(future)
+                if guid in failed:
+                    continue
+                try:
+                    result = future.result()
+                except Exception as ex:
+                    failed.add(guid)
+                    yield guid, None, ex
+                    continue
+
+                if stage == 'renditions':
+                    yield guid, result, None
+                    continue
+
+                if stage == 'search':
+                    metadata[guid] = result
+                else:
+                    locations[guid] = result['url']
+                if guid not in metadata or guid not in locations:
+                    continue
+
+                item = self._parse_item(metadata[guid])
+                if async_renditions:
+                    fetch_photo_renditions.delay(item['guid'], locations[guid])
+                    yield guid, item, None
+                else:
+                    job = self._renditions_job(item, locations[guid])
+                    pending[get_renditions_executor().submit(job)] = ('renditions', guid)
+
+    def _search_photo(self, _id):
+        params = {
             'api_key': self.provider.get('config', {}).get('password', ''),
-        }
-        search_params = base_params.copy()
-        search_params.update({
             'pagesize': 1,
             'reference': str(_id),
             'returnfields': Fields.search(),
-        })
-
-        search = self.proxy.search(search_params)
-        item = self._parse_item(search['1'])
+        }
+        return self.proxy.search(params)['1']
 
-        location_params = base_params.copy()
-        location_params.update({'id': _id})
-        location = self.proxy.getmedialocation(location_params)
-        update_renditions(item, location['url'], None)
+    def _location_params(self, _id):
+        return {
+            'api_key': self.provider.get('config', {}).get('password', ''),
+            'id': _id,
+        }
 
-        return item
+    def _renditions_job(self, item, href):
+        """Get function generating renditions of the item in a worker thread."""
+        flask_app = app._get_current_object() if has_app_context() else None
+
+        def generate():
+            if flask_app is None:
+                update_renditions(item, href, None)
+            else:
+                with flask_app.app_context():
+                    update_renditions(item, href, None)
+            return item
+        return generate
+
+    def _async_renditions(self):
+        config = app.config if has_app_context() else {}
+        return config.get('ANP_PHOTO_FETCH_ASYNC_RENDITIONS', False)
 
     def fetch_file(self, href, rendition, item, **kwargs):
         if rendition.get('media'):
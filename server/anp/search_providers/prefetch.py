@@ -0,0 +1,123 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+class Prefetcher:
+    """
+    Background fetch of search pages a user is likely to request next
+
+    Prefetches belong to an owner (usually a user). When the owner's query changes,
+    prefetches of the previous query which didn't start yet are cancelled.
+
+    :param max_workers: maximum number of prefetches running at once
+    """
+
+    def __init__(self, max_workers=DEFAULT_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        # owner -> (query key, [(cache key, future)])
+        self._queries = {}
+        # cache key -> future
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def prefetch(self, owner, query_key, pages):
+        """
+        Start prefetches of `pages`
+
+        :param owner: owner of the prefetches
+        :param query_key: identifier of the query without paging
+        :param pages: list of `(cache_key, func)` tuples, `func` fetches and caches the page
+        """
+        with self._lock:
+            futures = []
+            previous = self._queries.get(owner)
+            if previous is not None and previous[0] != query_key:
+                for cache_key, future in previous[1]:
+                    if future.cancel():
+                        self._in_flight.pop(cache_key, None)
+            elif previous is not None:
+                futures = [(cache_key, future) for cache_key, future in previous[1] if not future.done()]
+
+            for cache_key, func in pages:
+                if cache_key in self._in_flight:
+                    continue
+                future = self._executor.submit(self._run, cache_key, func)
+                self._in_flight[cache_key] = future
+                futures.append((cache_key, future))
+            self._queries[owner] = (query_key, futures)
+
+    def wait(self, cache_key, timeout=None):
+        """
+        Wait for a prefetch of `cache_key` running at the moment
+
+        A prefetch still queued behind others isn't waited for, it's cancelled and the caller fetches the page.
+
+        :param cache_key: cache key of the page
+        :param timeout: maximum number of seconds to wait
+        :return: page data, None if the page isn't being prefetched or the prefetch failed
+        """
+        with self._lock:
+            future = self._in_flight.get(cache_key)
+            if future is not None and future.cancel():
+                self._in_flight.pop(cache_key, None)
+                return None
+        if future is None or future.cancelled():
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except Exception:
+            # timed out, cancelled or failed, failures are logged by the prefetch
+            return None
+
+    def _run(self, cache_key, func):
+        try:
+            return func()
+        except Exception as ex:
+            logger.warning('Search prefetch failed: {}'.format(ex))
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(cache_key, None)
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait)
+
+
+def get_prefetcher():
+    """
+    Get prefetcher shared by the process
+
+    :return Prefetcher: prefetcher
+    """
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = Prefetcher()
+        return _prefetcher
+
+
+def reset_prefetcher():
+    """Drop the process prefetcher, pending prefetches are cancelled."""
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is not None:
+            _prefetcher.shutdown()
+        _prefetcher = None
@@ -0,0 +1,50 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2019 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+from flask import g
+from apps.search_providers.proxy import SearchProviderProxyService
+
+
+class FetchManySearchProviderProxyService(SearchProviderProxyService):
+    """Search Provider Proxy fetching all items of a request at once.
+
+    Providers with `fetch_many` get guids of all posted items in one call, so they can fetch them
+    concurrently. Items are then archived one by one by superdesk, as with a single fetch.
+
+    Written against superdesk-core release/1.33, it relies on `SearchProviderProxyService._get_service`
+    and `_set_item_defaults`, and on `SearchIngestService.create` getting every item by `self.fetch`.
+    Check `tests.search_providers.proxy_tests` when upgrading superdesk-core.
+    """
+
+    def create(self, docs, **kwargs):
+        provider = self.get_provider()
+        service = self._get_service(provider)
+        if isinstance(service, str) or not hasattr(service, 'fetch_many') or len(docs) < 2 \
+                or not all(doc.get('desk') for doc in docs):
+            # missing desk is reported by superdesk before anything is fetched
+            return super().create(docs, **kwargs)
+
+        g.fetched_items = {guid: (item, error) for guid, item, error in
+                           service.fetch_many([doc['guid'] for doc in docs])}
+        try:
+            return super().create(docs, **kwargs)
+        finally:
+            g.pop('fetched_items', None)
+
+    def fetch(self, guid):
+        fetched = g.get('fetched_items') or {}
+        if guid not in fetched:
+            return super().fetch(guid)
+
+        item, error = fetched[guid]
+        if error is not None:
+            raise error
+        self._set_item_defaults(item, self.get_provider())
+        return item
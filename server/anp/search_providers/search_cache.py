@@ -0,0 +1,176 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import json
+import hashlib
+import logging
+import threading
+
+from flask import current_app as app, has_app_context
+
+from anp.cache import TTLCache
+from anp.stats import record_metric
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 60
+DEFAULT_SIZE = 500
+
+# search parameters which don't change results
+IGNORED_PARAMS = ('api_key', )
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class SearchCache:
+    """
+    Cache of search responses shared by the newsroom
+
+    Responses are kept in redis shared by all processes, the in-process LRU in front of it
+    serves repeated searches of the process without a round-trip to redis.
+    Redis is optional, the cache works in-process only when it's not available.
+
+    :param name: name of the cache used for keys and metrics
+    :param ttl: time to live of a response in seconds
+    :param maxsize: maximum number of responses kept in the process
+    :param redis: redis client
+    """
+
+    def __init__(self, name, ttl=DEFAULT_TTL, maxsize=DEFAULT_SIZE, redis=None):
+        self.name = name
+        self.ttl = ttl
+        self.redis = redis
+        self.local = TTLCache(ttl=ttl, maxsize=maxsize)
+        self.redis_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key(self, url, params):
+        """
+        Get cache key of a search
+
+        Keywords are normalised and credentials are left out, so the same search of different users
+        shares the key.
+
+        :param url: url of the search API
+        :param params: search parameters
+        :return str: key
+        """
+        params = {name: value for name, value in params.items() if name not in IGNORED_PARAMS}
+        if isinstance(params.get('keywords'), str):
+            params['keywords'] = ' '.join(params['keywords'].lower().split())
+        digest = hashlib.sha1(json.dumps([url, params], sort_keys=True).encode('utf-8')).hexdigest()
+        return '{}:{}'.format(self.name, digest)
+
+    def get(self, key):
+        """
+        Get cached response
+
+        :param key: cache key
+        :return: response, None if it's not cached
+        """
+        data = self.local.get(key)
+        if data is not None:
+            record_metric('{}/hit'.format(self.name), 1)
+            return data
+
+        data = self._redis_get(key)
+        if data is not None:
+            with self._lock:
+                self.redis_hits += 1
+            self.local.set(key, data)
+            record_metric('{}/hit'.format(self.name), 1)
+            return data
+
+        with self._lock:
+            self.misses += 1
+        record_metric('{}/miss'.format(self.name), 1)
+        return None
+
+    def set(self, key, data):
+        """
+        Cache a response
+
+        :param key: cache key
+        :param data: json serializable response
+        """
+        self.local.set(key, data)
+        if self.redis is None or self.ttl <= 0:
+            return
+        try:
+            self.redis.setex(key, self.ttl, json.dumps(data))
+        except Exception as ex:
+            logger.warning('Saving {} response to redis failed: {}'.format(self.name, ex))
+
+    def _redis_get(self, key):
+        if self.redis is None:
+            return None
+        try:
+            value = self.redis.get(key)
+        except Exception as ex:
+            logger.warning('Reading {} response from redis failed: {}'.format(self.name, ex))
+            return None
+        if value is None:
+            return None
+        return json.loads(value.decode('utf-8') if isinstance(value, bytes) else value)
+
+    def clear(self):
+        """Remove responses of the process and reset statistics, responses in redis expire on their own."""
+        self.local.clear()
+        with self._lock:
+            self.redis_hits = self.misses = 0
+
+    def stats(self):
+        """
+        Get cache statistics
+
+        :return dict: `local_hits`, `redis_hits`, `misses`, `size` and `hit_rate`
+        """
+        local = self.local.stats()
+        with self._lock:
+            hits = local['hits'] + self.redis_hits
+            total = hits + self.misses
+            return {
+                'local_hits': local['hits'],
+                'redis_hits': self.redis_hits,
+                'misses': self.misses,
+                'size': local['size'],
+                'hit_rate': hits / total if total else 0.0,
+            }
+
+
+def get_search_cache():
+    """
+    Get ANP photo search cache shared by the process
+
+    Cache is configured using `ANP_PHOTO_SEARCH_CACHE_TTL` and `ANP_PHOTO_SEARCH_CACHE_SIZE` settings,
+    redis is used when the app has a redis client.
+
+    :return SearchCache: cache
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            config = app.config if has_app_context() else {}
+            _cache = SearchCache(
+                name='ANPPhotoSearch',
+                ttl=config.get('ANP_PHOTO_SEARCH_CACHE_TTL', DEFAULT_TTL),
+                maxsize=config.get('ANP_PHOTO_SEARCH_CACHE_SIZE', DEFAULT_SIZE),
+                redis=getattr(app, 'redis', None) if has_app_context() else None,
+            )
+        return _cache
+
+
+def reset_search_cache():
+    """Drop the process cache, it's created again with current settings."""
+    global _cache
+    with _cache_lock:
+        _cache = None
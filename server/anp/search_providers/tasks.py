@@ -0,0 +1,62 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import logging
+
+from superdesk import config, get_resource_service
+from superdesk.celery_app import celery
+from superdesk.metadata.item import GUID_FIELD
+
+from anp.io.feed_parsers.anp_news_api import RENDITION_FIELDS
+from anp.media.renditions import update_renditions
+
+logger = logging.getLogger(__name__)
+
+
+def _has_renditions(item):
+    return bool(((item.get('renditions') or {}).get('original') or {}).get('media'))
+
+
+@celery.task(bind=True, soft_time_limit=600, max_retries=10)
+def fetch_photo_renditions(self, guid, href):
+    """
+    Generate renditions of a fetched ANP photo and patch archive items of the photo
+
+    Photo is fetched with preview renditions only, the task runs once it's saved to archive,
+    so it's retried with exponential back-off until the fetched item is found. Saving to archive
+    can lag behind under load, retries span about 17 minutes.
+
+    :param guid: guid of the photo from ANP search
+    :param href: link to the original picture
+    """
+    archive_service = get_resource_service('archive')
+    fetched = list(archive_service.get_from_mongo(req=None, lookup={
+        '$or': [{GUID_FIELD: guid}, {'ingest_id': guid}],
+    }))
+    if not fetched:
+        if self.request.retries >= self.max_retries:
+            logger.error("Renditions of ANP photo '{}' not generated, photo wasn't found in archive".format(guid))
+            return
+        raise self.retry(countdown=2 ** self.request.retries)
+
+    items = [item for item in fetched if not _has_renditions(item)]
+    if not items:
+        # already done
+        return
+
+    picture = {}
+    update_renditions(picture, href)
+    for item in items:
+        archive_service.system_update(
+            item[config.ID_FIELD],
+            {field: picture[field] for field in RENDITION_FIELDS if field in picture},
+            item
+        )
+    logger.info("Renditions of ANP photo '{}' added to {} items".format(guid, len(items)))
@@ -0,0 +1,134 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+"""
+Keep-alive XML-RPC transport.
+
+`xmlrpc.client.ServerProxy` opens a new connection for every proxy and its transport can't be used
+by more threads at once. Proxies here send requests using pooled keep-alive sessions shared by the process,
+so a search reuses the connection (and TLS session) of previous searches.
+"""
+
+import threading
+from urllib.parse import urlsplit
+from xmlrpc.client import ServerProxy, Transport, ProtocolError
+
+from flask import current_app as app, has_app_context
+
+from anp.io.sessions import get_session, connection_stats, DEFAULT_POOL_SIZE
+from anp.stats import record_metric
+
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 25
+
+_proxies = {}
+_proxies_lock = threading.Lock()
+
+
+class SessionTransport(Transport):
+    """
+    XML-RPC transport using a pooled `requests` session
+
+    Session connection pools are thread safe, so the transport and its proxy can be shared by threads.
+
+    :param scheme: url scheme, `http` or `https`
+    :param session: session sending requests
+    :param timeout: `(connect, read)` timeout in seconds
+    :param name: name used for metrics
+    """
+
+    def __init__(self, scheme, session, timeout, name='XMLRPC'):
+        super().__init__()
+        self.scheme = scheme
+        self.session = session
+        self.timeout = timeout
+        self.name = name
+        self._stats = {'new': 0, 'reused': 0}
+        self._stats_lock = threading.Lock()
+
+    def request(self, host, handler, request_body, verbose=False):
+        url = '{}://{}{}'.format(self.scheme, host, handler)
+        try:
+            response = self.session.post(url, data=request_body, timeout=self.timeout, headers={
+                'Content-Type': 'text/xml',
+                'User-Agent': self.user_agent,
+            })
+        finally:
+            self._record_connections()
+
+        if response.status_code != 200:
+            raise ProtocolError(url, response.status_code, response.reason, response.headers)
+
+        parser, unmarshaller = self.getparser()
+        parser.feed(response.content)
+        parser.close()
+        return unmarshaller.close()
+
+    def stats(self):
+        """
+        Get connection reuse statistics
+
+        :return dict: `new` and `reused` connections count
+        """
+        return connection_stats(self.session)
+
+    def _record_connections(self):
+        """Report connections opened and reused since the last request."""
+        with self._stats_lock:
+            stats = self.stats()
+            for name in ('new', 'reused'):
+                delta = stats[name] - self._stats[name]
+                if delta > 0:
+                    record_metric('{}/connections/{}'.format(self.name, name), delta)
+            self._stats = stats
+
+
+def get_proxy(url, name='XMLRPC'):
+    """
+    Get XML-RPC proxy of `url` shared by the process
+
+    Timeouts and pool size are configured using `ANP_PHOTO_SEARCH_CONNECT_TIMEOUT`,
+    `ANP_PHOTO_SEARCH_READ_TIMEOUT` and `ANP_PHOTO_SEARCH_POOL_SIZE` settings.
+
+    :param url: url of XML-RPC server
+    :param name: name used for metrics
+    :return ServerProxy: proxy
+    """
+    config = app.config if has_app_context() else {}
+    timeout = (
+        config.get('ANP_PHOTO_SEARCH_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT),
+        config.get('ANP_PHOTO_SEARCH_READ_TIMEOUT', DEFAULT_READ_TIMEOUT),
+    )
+    pool_size = config.get('ANP_PHOTO_SEARCH_POOL_SIZE', DEFAULT_POOL_SIZE)
+    key = (url, timeout, pool_size)
+    with _proxies_lock:
+        if key not in _proxies:
+            session = get_session('xmlrpc:{}'.format(url), pool_size=pool_size)
+            transport = SessionTransport(urlsplit(url).scheme, session, timeout, name=name)
+            _proxies[key] = ServerProxy(url, transport=transport)
+        return _proxies[key]
+
+
+def transport_stats():
+    """
+    Get connection reuse statistics of shared proxies
+
+    :return dict: `new` and `reused` connections count by url
+    """
+    with _proxies_lock:
+        proxies = list(_proxies.items())
+    # the transport is private to the proxy
+    return {key[0]: proxy('transport').stats() for key, proxy in proxies}
+
+
+def reset_proxies():
+    """Drop shared proxies, their sessions are kept by `anp.io.sessions`."""
+    with _proxies_lock:
+        _proxies.clear()
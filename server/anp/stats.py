@@ -0,0 +1,221 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+"""
+Timings and counters of ingest update cycles.
+
+Stats of a cycle are logged once the cycle is done and reported as New Relic custom metrics
+when the agent is installed.
+"""
+
+import math
+import time
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+try:
+    import newrelic.agent
+except ImportError:
+    newrelic = None
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class Histogram:
+    """
+    Durations of a stage
+    """
+
+    def __init__(self):
+        self.values = []
+
+    def observe(self, value):
+        self.values.append(value)
+
+    @property
+    def count(self):
+        return len(self.values)
+
+    @property
+    def total(self):
+        return sum(self.values)
+
+    def percentile(self, percent):
+        """
+        Get nearest-rank percentile
+
+        :param percent: percentile, 0-100
+        :return float: value, 0 if nothing was observed
+        """
+        if not self.values:
+            return 0
+        values = sorted(self.values)
+        return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'max': max(self.values, default=0),
+        }
+
+    def to_metric(self):
+        """Get value of New Relic custom metric."""
+        return {
+            'count': self.count,
+            'total': self.total,
+            'min': min(self.values, default=0),
+            'max': max(self.values, default=0),
+            'sum_of_squares': sum(value * value for value in self.values),
+        }
+
+
+class IngestStats:
+    """
+    Stats of an ingest update cycle, shared by threads of the cycle
+
+    :param name: name used in the log line and as a prefix of custom metrics
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.timings = {}
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timer(self, stage):
+        """
+        Measure duration of the `with` block as a `stage` timing
+
+        :param stage: name of the stage
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def observe(self, stage, seconds):
+        """
+        Add duration of a stage
+
+        :param stage: name of the stage
+        :param seconds: duration
+        """
+        with self._lock:
+            self.timings.setdefault(stage, Histogram()).observe(seconds)
+
+    def incr(self, counter, value=1):
+        """
+        Increase a counter
+
+        :param counter: name of the counter
+        :param value: increment
+        """
+        with self._lock:
+            self.counters[counter] += value
+
+    def error(self, code):
+        """
+        Count an API error
+
+        :param code: error code reported by the API
+        """
+        self.incr('errors.{}'.format(code))
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'timings': {stage: histogram.to_dict() for stage, histogram in self.timings.items()},
+                'counters': dict(self.counters),
+            }
+
+    def log(self):
+        """Log stats as a single line."""
+        stats = self.to_dict()
+        timings = ' '.join(
+            '{}={count}/{total:.3f}s(p50={p50:.3f}s,p99={p99:.3f}s)'.format(stage, **timing)
+            for stage, timing in sorted(stats['timings'].items())
+        )
+        counters = ' '.join('{}={}'.format(name, value) for name, value in sorted(stats['counters'].items()))
+        logger.info('{} stats: {} {}'.format(self.name, timings, counters).strip())
+
+    def report(self):
+        """Record stats as New Relic custom metrics."""
+        if newrelic is None:
+            return
+
+        with self._lock:
+            metrics = [
+                ('Custom/{}/time/{}'.format(self.name, stage), histogram.to_metric())
+                for stage, histogram in self.timings.items()
+            ]
+            metrics.extend(
+                ('Custom/{}/{}'.format(self.name, name), value) for name, value in self.counters.items()
+            )
+
+        try:
+            newrelic.agent.record_custom_metrics(metrics, application=newrelic.agent.application())
+        except Exception as ex:
+            logger.warning('Failed to report {} stats to New Relic: {}'.format(self.name, ex))
+
+    @contextmanager
+    def activate(self):
+        """Make stats available to code running in the current thread by `current_stats`."""
+        previous = getattr(_local, 'stats', None)
+        _local.stats = self
+        try:
+            yield self
+        finally:
+            _local.stats = previous
+
+
+class _NullStats(IngestStats):
+    """Stats used outside of an ingest cycle, nothing is kept."""
+
+    def observe(self, stage, seconds):
+        pass
+
+    def incr(self, counter, value=1):
+        pass
+
+
+NULL_STATS = _NullStats('null')
+
+
+def record_metric(name, value):
+    """
+    Record a New Relic custom metric when the agent is installed
+
+    :param name: name of the metric without `Custom/` prefix
+    :param value: value of the metric
+    """
+    if newrelic is None:
+        return
+    try:
+        newrelic.agent.record_custom_metric('Custom/{}'.format(name), value, application=newrelic.agent.application())
+    except Exception as ex:
+        logger.warning('Failed to record {} metric: {}'.format(name, ex))
+
+
+def current_stats():
+    """
+    Get stats activated in the current thread
+
+    :return IngestStats: active stats, stats which keep nothing if there are none
+    """
+    return getattr(_local, 'stats', None) or NULL_STATS
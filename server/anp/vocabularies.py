@@ -0,0 +1,83 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import json
+
+from eve.utils import ParsedRequest
+from superdesk import get_resource_service
+
+from anp.cache import TTLCache
+
+VOCABULARIES_TTL = 5 * 60
+
+# vocabulary items by qcode, shared by all parsers of the worker process
+_vocabularies = TTLCache(ttl=VOCABULARIES_TTL)
+
+
+def get_vocabulary(vocabulary_id):
+    """
+    Get vocabulary items by qcode
+
+    Items are loaded once per `VOCABULARIES_TTL` seconds, vocabularies edited within the process
+    are reloaded right away.
+
+    :param vocabulary_id: vocabulary id, it's the scheme of subjects
+    :return dict: vocabulary items by qcode, empty if the vocabulary doesn't exist
+    """
+    items = _vocabularies.get(vocabulary_id)
+    if items is None:
+        req = ParsedRequest()
+        req.projection = json.dumps({'items': 1})
+        vocabulary = get_resource_service('vocabularies').find_one(req=req, _id=vocabulary_id) or {}
+        # use qcode as a key to speed up work with it
+        items = {item['qcode']: item for item in vocabulary.get('items') or [] if item.get('qcode')}
+        _vocabularies.set(vocabulary_id, items)
+    return items
+
+
+def get_subjects_map(scheme, qcodes):
+    """
+    Get subjects of `scheme` for `qcodes` in a single sweep, unknown qcodes are skipped
+
+    :param scheme: vocabulary id
+    :param qcodes: iterable of qcodes
+    :return dict: subjects with `name`, `qcode` and `scheme` by qcode
+    """
+    items = get_vocabulary(scheme)
+    return {
+        qcode: {'name': items[qcode]['name'], 'qcode': qcode, 'scheme': scheme}
+        for qcode in qcodes if qcode in items
+    }
+
+
+def invalidate(vocabulary_id=None):
+    """
+    Drop cached vocabulary
+
+    :param vocabulary_id: vocabulary id, all vocabularies are dropped if None
+    """
+    if vocabulary_id is None:
+        _vocabularies.clear()
+    else:
+        _vocabularies.pop(vocabulary_id)
+
+
+def _on_vocabulary_updated(updates, original):
+    invalidate(original.get('_id'))
+
+
+def _on_vocabulary_deleted(doc):
+    invalidate(doc.get('_id'))
+
+
+def init_app(app):
+    app.on_updated_vocabularies += _on_vocabulary_updated
+    app.on_replaced_vocabularies += _on_vocabulary_updated
+    app.on_deleted_item_vocabularies += _on_vocabulary_deleted
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+"""
+Micro-benchmark of ANP dates parsing.
+
+Compares `strptime` and superdesk's `local_to_utc` with `anp.dates`.
+
+Usage (from server directory)::
+
+    python -m benchmarks.dates --number 100000
+"""
+
+import argparse
+import timeit
+from datetime import datetime, timedelta
+
+import pytz
+
+from anp.dates import ISO_FORMAT, COMPACT_FORMAT, parse_iso, parse_compact, local_to_utc
+
+TZ = 'Europe/Amsterdam'
+
+
+def superdesk_local_to_utc(tz_name, local):
+    """Same as superdesk's `local_to_utc`."""
+    return pytz.utc.normalize(pytz.timezone(tz_name).localize(local.replace(tzinfo=None)))
+
+
+def run(name, func, count):
+    seconds = min(timeit.repeat(func, number=1, repeat=3))
+    print('{:<28} {:>10.0f} dates/s'.format(name, count / seconds))
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--number', type=int, default=100000, help='number of parsed dates')
+    args = parser.parse_args()
+
+    # dates of a backlog, a few per hour
+    start = datetime(2019, 1, 1)
+    dates = [start + timedelta(minutes=17 * i) for i in range(args.number)]
+    iso = [date.strftime(ISO_FORMAT) for date in dates]
+    compact = [date.strftime(COMPACT_FORMAT) for date in dates]
+
+    def compare(name, slow, fast, values):
+        slow_seconds = run('{} strptime'.format(name), lambda: [slow(value) for value in values], len(values))
+        fast_seconds = run('{} anp.dates'.format(name), lambda: [fast(value) for value in values], len(values))
+        print('{:<28} {:>10.1f}x'.format('speed-up', slow_seconds / fast_seconds))
+
+    compare('news api', lambda value: datetime.strptime(value, ISO_FORMAT), parse_iso, iso)
+    compare(
+        'photo',
+        lambda value: superdesk_local_to_utc(TZ, datetime.strptime(value, COMPACT_FORMAT)),
+        lambda value: local_to_utc(TZ, parse_compact(value)),
+        compact
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+"""
+Replay benchmark of ANP News API ingest.
+
+Recorded ANP responses (`tests/io/fixtures`) are served by a local stand-in of the API with configurable
+latency and error rate. `ANPNewsApiFeedingService` fetches and parses a backlog of items end to end,
+the benchmark reports items/s, p50/p99 latency of update cycles and peak RSS for every backlog size.
+
+Every backlog runs in its own process with a superdesk app, so mongo and elastic configured in `settings.py`
+must be available. Pictures and parsed items are not saved, so storage isn't measured.
+
+Usage (from server directory)::
+
+    python -m benchmarks.ingest --backlogs 100 1000 10000 --latency 20 --error-rate 0.01 --media-ratio 0.1
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+import resource
+import threading
+import multiprocessing
+from copy import deepcopy
+from uuid import uuid4
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'io', 'fixtures')
+DETAILS_FIXTURES = (
+    'ac3dc857e87ea0a0b98635b314941d12',
+    'bd34da5aa71ea490639e5601f98b238a',
+    'ac47563d3fe56f62972f0f7e55d323cd',
+    '7404db79e88ae6483f56941204943a4a',
+    '38bdbbbdae1320f77049b5a32538e09c',
+    'c4b893fec041a87ee340b513e8b11860',
+)
+MEDIA_FIXTURE = '38bdbbbdae1320f77049b5a32538e09c'
+
+
+def load_fixture(name, mode='r'):
+    with open(os.path.join(FIXTURES, name), mode) as f:
+        return json.load(f) if mode == 'r' else f.read()
+
+
+class ReplayAPI:
+    """
+    Stand-in of ANP News API serving a backlog of items built from recorded responses
+
+    :param backlog: number of items
+    :param sources: number of sources items are spread across
+    :param page_size: number of items of a listing page
+    :param media_ratio: ratio of items with a picture
+    """
+
+    def __init__(self, backlog, sources, page_size, media_ratio):
+        self.page_size = page_size
+        self.details = [load_fixture('anp_news_api-item-detail-{}.json'.format(item_id))['data']
+                        for item_id in DETAILS_FIXTURES]
+        self.media = load_fixture('anp_news_api-media-{}.json'.format(MEDIA_FIXTURE))['data']
+        self.image = load_fixture('image-{}.jpeg'.format(MEDIA_FIXTURE), 'rb')
+        self.sources = [
+            {'id': 'source-{}'.format(index), 'kind': 'NEWSFEED', 'title': 'Replay {}'.format(index)}
+            for index in range(sources)
+        ]
+
+        # ids of items by source, newest first, the oldest item is the cursor of the previous update
+        self.items = {source['id']: [] for source in self.sources}
+        self.item_details = {}
+        for index in range(backlog + sources):
+            source = self.sources[index % sources]
+            details = deepcopy(self.details[index % len(self.details)])
+            details['id'] = uuid4().hex
+            details['source'] = source['id']
+            details['sourceTitle'] = source['title']
+            details['hasMedia'] = random.random() < media_ratio
+            self.items[source['id']].insert(0, details['id'])
+            self.item_details[details['id']] = details
+
+    @property
+    def cursors(self):
+        """`private` data of a provider which ingested all items up to the backlog"""
+        return {
+            'sources': {source_id: {'last_item_id': items[-1]} for source_id, items in self.items.items()}
+        }
+
+    def listing(self, source_id, params):
+        items = self.items[source_id]
+        start = items.index(params['fromItem']) + 1 if params.get('fromItem') in items else 0
+        end = items.index(params['toItem']) if params.get('toItem') in items else len(items)
+        page = items[start:min(start + self.page_size, end)]
+        return {
+            'items': [{'id': item_id, 'kind': self.item_details[item_id]['kind']} for item_id in page],
+            'hasMore': start + self.page_size < end,
+        }
+
+    def media_list(self, item_id):
+        media = deepcopy(self.media)
+        for rendition in media:
+            # every item has its own picture
+            rendition['id'] = '{}-{}'.format(item_id, rendition['kind'])
+        return media
+
+    def route(self, path, params):
+        """
+        Get response for a request
+
+        :return tuple: status, content type and body
+        """
+        parts = path.strip('/').split('/')[1:]  # skip `services`
+        if parts == ['sources']:
+            data = self.sources
+        elif len(parts) == 3 and parts[2] == 'items':
+            data = self.listing(parts[1], params)
+        elif len(parts) == 4:
+            data = self.item_details[parts[3]]
+        elif len(parts) == 5:
+            data = self.media_list(parts[3])
+        elif len(parts) == 6:
+            return 200, 'image/jpeg', self.image
+        else:
+            return 404, 'text/plain', b'Not found'
+        return 200, 'application/json', json.dumps({'hasError': False, 'data': data}).encode('utf-8')
+
+
+class ReplayRequestHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+
+        url = urlsplit(self.path)
+        if random.random() < server.error_rate:
+            status, content_type, body = 503, 'text/plain', b'Service unavailable'
+        else:
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            status, content_type, body = server.api.route(url.path, params)
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplayServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, api, latency, error_rate):
+        super().__init__(('127.0.0.1', 0), ReplayRequestHandler)
+        self.api = api
+        self.latency = latency
+        self.error_rate = error_rate
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/services'.format(self.server_address[1])
+
+
+class NullMediaStorage:
+    """Media storage dropping files, so neither storage nor kept files are measured."""
+
+    def put(self, content, filename=None, content_type=None, metadata=None, **kwargs):
+        return uuid4().hex
+
+    def url_for_media(self, media_id, content_type=None):
+        return 'null://{}'.format(media_id)
+
+    def delete(self, media_id, resource=None):
+        pass
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[max(0, -(-len(values) * percent // 100) - 1)]
+
+
+def get_service_class(url):
+    from anp.io.feeding_services.anp_news_api import ANPNewsApiFeedingService
+
+    class ReplayFeedingService(ANPNewsApiFeedingService):
+        HTTP_SOURCES_URL = url + '/sources'
+        HTTP_ITEMS_URL = url + '/sources/{source_id}/items'
+        HTTP_ITEM_DETAILS_URL = url + '/sources/{source_id}/items/{item_id}'
+        HTTP_ITEM_MEDIA_LIST_URL = url + '/sources/{source_id}/items/{item_id}/media'
+        HTTP_ITEM_MEDIA_DETAILS_URL = url + '/sources/{source_id}/items/{item_id}/media/{media_id}'
+        RETRY_BACKOFF_SECONDS = 0.05
+
+    return ReplayFeedingService
+
+
+def run_backlog(args, url, sources, cursors):
+    """
+    Run update cycles of a backlog, it runs in a separate process
+
+    :return dict: results
+    """
+    from app import get_app
+    from anp.io.feed_parsers.anp_news_api import media_index
+    from anp.io.response_cache import reset_response_cache
+    from anp.io.circuit_breaker import reset_circuit_breakers
+
+    service_class = get_service_class(url)
+    app = get_app()
+    app.media = NullMediaStorage()
+    provider_config = {
+        'username': 'benchmark',
+        'password': 'benchmark',
+        'source_titles': ', '.join(source['title'] for source in sources),
+        'max_workers': str(args.max_workers),
+        'rate_limit': str(args.rate_limit),
+        'rate_burst': str(args.rate_limit),
+        'async_featuremedia': args.async_featuremedia,
+    }
+
+    latencies = []
+    items = 0
+    with app.app_context():
+        for _ in range(args.cycles):
+            service_class.sources_cache.clear()
+            reset_response_cache()
+            reset_circuit_breakers()
+            media_index.clear()
+            provider = {
+                'name': 'ANP replay',
+                'feeding_service': 'anp_news_api',
+                'feed_parser': 'anp_news_api',
+                'content_types': ['text'],
+                'config': provider_config,
+                'private': deepcopy(cursors),
+            }
+            service = service_class()
+            service.provider = provider
+
+            started = time.perf_counter()
+            items += sum(len(batch) for batch in service._update(provider, {}))
+            latencies.append(time.perf_counter() - started)
+
+    return {
+        'items': items,
+        'seconds': sum(latencies),
+        'p50': percentile(latencies, 50),
+        'p99': percentile(latencies, 99),
+        # kilobytes on linux
+        'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--backlogs', type=int, nargs='+', default=[100, 1000, 10000], help='backlog sizes')
+    parser.add_argument('--cycles', type=int, default=3, help='number of update cycles per backlog')
+    parser.add_argument('--sources', type=int, default=4, help='number of sources')
+    parser.add_argument('--page-size', type=int, default=100, help='number of items of a listing page')
+    parser.add_argument('--media-ratio', type=float, default=0.1, help='ratio of items with a picture')
+    parser.add_argument('--latency', type=float, default=20, help='latency of responses in milliseconds')
+    parser.add_argument('--error-rate', type=float, default=0, help='ratio of failed (503) responses')
+    parser.add_argument('--max-workers', type=int, default=4, help='concurrent item details requests')
+    parser.add_argument('--rate-limit', type=int, default=1000, help='requests per second')
+    parser.add_argument('--async-featuremedia', action='store_true', help='skip pictures during ingest')
+    args = parser.parse_args()
+
+    print('{:>8} {:>8} {:>10} {:>10} {:>10} {:>10}'.format('backlog', 'items', 'items/s', 'p50', 'p99', 'rss'))
+    for backlog in args.backlogs:
+        api = ReplayAPI(backlog, args.sources, args.page_size, args.media_ratio)
+        server = ReplayServer(api, args.latency / 1000, args.error_rate)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            with multiprocessing.Pool(1) as pool:
+                result = pool.apply(run_backlog, (args, server.url, api.sources, api.cursors))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        print('{:>8} {:>8} {:>10.1f} {:>9.2f}s {:>9.2f}s {:>8.0f}MB'.format(
+            backlog, result['items'], result['items'] / result['seconds'], result['p50'], result['p99'], result['rss']
+        ))
+
+
+if __name__ == '__main__':
+    main()
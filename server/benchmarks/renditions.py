@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+"""
+Benchmark of picture renditions generation.
+
+Compares superdesk's way of generating `RENDITIONS.picture` (every rendition resized from a fully decoded original)
+with `anp.media.resize` pipeline in a single process and across a process pool.
+
+Usage (from server directory)::
+
+    python -m benchmarks.renditions --images 50 --width 4000 --height 3000 --processes 4
+"""
+
+import os
+import time
+import argparse
+from io import BytesIO
+
+from PIL import Image
+
+from anp.media.resize import LANCZOS, QUALITY, target_size, resize_many, shutdown_executor
+from settings import RENDITIONS
+
+
+def make_image(width, height):
+    """Generate a JPEG photo-like image, noise keeps it from compressing too well."""
+    img = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    noise = Image.effect_noise((width, height), 40).convert('RGB')
+    out = BytesIO()
+    Image.blend(img, noise, 0.3).save(out, 'jpeg', quality=90)
+    return out.getvalue()
+
+
+def superdesk_renditions(content, specs):
+    """Renditions generated like superdesk's `generate_renditions`: full decode per rendition."""
+    renditions = {}
+    for name, spec in specs.items():
+        img = Image.open(BytesIO(content))
+        size = target_size(img.size[0], img.size[1], spec)
+        out = BytesIO()
+        img.resize(size, LANCZOS).save(out, 'jpeg', quality=QUALITY)
+        renditions[name] = out.getvalue()
+    return renditions
+
+
+def run(name, func, images, cores):
+    started = time.perf_counter()
+    func(images)
+    elapsed = time.perf_counter() - started
+    rate = len(images) / elapsed
+    print('{:<20} {:>8.2f} images/s {:>8.2f} images/s per core'.format(name, rate, rate / cores))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--images', type=int, default=20, help='number of images')
+    parser.add_argument('--width', type=int, default=4000, help='width of images')
+    parser.add_argument('--height', type=int, default=3000, help='height of images')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='size of the process pool')
+    args = parser.parse_args()
+
+    specs = RENDITIONS['picture']
+    images = [make_image(args.width, args.height)] * args.images
+    print('{} images {}x{}, renditions: {}'.format(
+        args.images, args.width, args.height, ', '.join(sorted(specs))
+    ))
+
+    run('superdesk', lambda imgs: [superdesk_renditions(img, specs) for img in imgs], images, 1)
+    run('pipeline', lambda imgs: resize_many(imgs, specs), images, 1)
+    # warm up the pool, so process start isn't measured
+    resize_many(images[:args.processes], specs, processes=args.processes)
+    run('pipeline pool', lambda imgs: resize_many(imgs, specs, processes=args.processes), images, args.processes)
+    shutdown_executor()
+
+
+if __name__ == '__main__':
+    main()
@@ -34,6 +34,7 @@ INSTALLED_APPS = [
     'apps.languages',
     'planning',
     'anp.io',
+    'anp.vocabularies',
     'anp.search_providers',
     'anp.formatters',
     'anp.validate'
@@ -126,6 +127,32 @@ ORGANIZATION_NAME_ABBREVIATION = env('ORGANIZATION_NAME_ABBREVIATION', 'ANP')
 
 PUBLISH_QUEUE_EXPIRY_MINUTES = 60 * 24 * 10  # 10d
 
+# ANP News API responses cache, set path to keep it between worker restarts
+ANP_NEWS_API_CACHE_SIZE = int(env('ANP_NEWS_API_CACHE_SIZE', 2000))
+ANP_NEWS_API_CACHE_MAX_AGE = int(env('ANP_NEWS_API_CACHE_MAX_AGE', 300))
+ANP_NEWS_API_CACHE_PATH = env('ANP_NEWS_API_CACHE_PATH')
+
+# ANP photo search results cache, shared using redis
+ANP_PHOTO_SEARCH_CACHE_TTL = int(env('ANP_PHOTO_SEARCH_CACHE_TTL', 60))
+ANP_PHOTO_SEARCH_CACHE_SIZE = int(env('ANP_PHOTO_SEARCH_CACHE_SIZE', 500))
+
+# next pages of ANP photo search fetched in the background, 0-2
+ANP_PHOTO_SEARCH_PREFETCH_PAGES = int(env('ANP_PHOTO_SEARCH_PREFETCH_PAGES', 1))
+
+# ANP photo search keep-alive connections, timeouts in seconds
+ANP_PHOTO_SEARCH_CONNECT_TIMEOUT = float(env('ANP_PHOTO_SEARCH_CONNECT_TIMEOUT', 5))
+ANP_PHOTO_SEARCH_READ_TIMEOUT = float(env('ANP_PHOTO_SEARCH_READ_TIMEOUT', 25))
+ANP_PHOTO_SEARCH_POOL_SIZE = int(env('ANP_PHOTO_SEARCH_POOL_SIZE', 10))
+
+# fetch ANP photos with preview renditions, full renditions are generated in the background
+ANP_PHOTO_FETCH_ASYNC_RENDITIONS = env('ANP_PHOTO_FETCH_ASYNC_RENDITIONS', 'false').lower() in ('true', '1')
+# number of threads generating renditions of fetched ANP photos
+ANP_PHOTO_FETCH_WORKERS = int(env('ANP_PHOTO_FETCH_WORKERS', 4))
+
+# number of processes generating picture renditions, 0 generates them in the ingest process,
+# processes of celery's prefork pool can't start children and always generate them in-process
+ANP_RENDITIONS_PROCESSES = int(env('ANP_RENDITIONS_PROCESSES', 0))
+
 # schema for images, video, audio
 SCHEMA = {
     'picture': {
@@ -0,0 +1,58 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import unittest
+
+from anp.cache import TTLCache
+
+
+class FakeTimer:
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TTLCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.timer = FakeTimer()
+
+    def test_expiry(self):
+        cache = TTLCache(ttl=10, timer=self.timer)
+        cache.set('foo', 1)
+        cache.set('bar', 2, ttl=20)
+        self.timer.now = 15
+        self.assertIsNone(cache.get('foo'))
+        self.assertNotIn('foo', cache)
+        self.assertEqual(cache.get('bar'), 2)
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'size': 1, 'hit_rate': 0.5})
+
+    def test_lru_eviction(self):
+        cache = TTLCache(ttl=10, maxsize=2, timer=self.timer)
+        cache.set('foo', 1)
+        cache.set('bar', 2)
+        cache.get('foo')
+        cache.set('baz', 3)
+        self.assertIn('foo', cache)
+        self.assertNotIn('bar', cache)
+        self.assertIn('baz', cache)
+        self.assertEqual(len(cache), 2)
+
+    def test_pop_and_clear(self):
+        cache = TTLCache(ttl=10, timer=self.timer)
+        cache.set('foo', 1)
+        self.assertEqual(cache.pop('foo'), 1)
+        self.assertIsNone(cache.pop('foo'))
+        cache.set('foo', 1)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
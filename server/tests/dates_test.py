@@ -0,0 +1,54 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import unittest
+from datetime import datetime, timedelta
+
+import pytz
+
+from anp.dates import parse_iso, parse_compact, local_to_utc
+
+TZ = 'Europe/Amsterdam'
+
+
+def pytz_local_to_utc(tz_name, local):
+    return pytz.utc.normalize(pytz.timezone(tz_name).localize(local))
+
+
+class DatesTestCase(unittest.TestCase):
+
+    def test_parse_iso(self):
+        self.assertEqual(parse_iso('2019-05-02T12:04:56Z'), datetime(2019, 5, 2, 12, 4, 56))
+        # other layouts are parsed by strptime
+        self.assertEqual(parse_iso('2019-5-2T12:04:56Z'), datetime(2019, 5, 2, 12, 4, 56))
+        for string in ('2019-02-30T12:04:56Z', '2019-05-02 12:04:56', ''):
+            with self.assertRaises(ValueError):
+                parse_iso(string)
+
+    def test_parse_compact(self):
+        self.assertEqual(parse_compact('20190418 14:16:50'), datetime(2019, 4, 18, 14, 16, 50))
+        for string in ('20190230 14:16:50', '2019-04-18 14:16:50', ''):
+            with self.assertRaises(ValueError):
+                parse_compact(string)
+
+    def test_local_to_utc(self):
+        self.assertEqual(
+            local_to_utc(TZ, datetime(2019, 4, 18, 13, 3, 47)).isoformat(),
+            '2019-04-18T11:03:47+00:00'
+        )
+        # around daylight saving time changes
+        for start in (datetime(2019, 3, 31), datetime(2019, 10, 27), datetime(1940, 5, 16)):
+            for minutes in range(0, 5 * 60, 7):
+                local = start + timedelta(minutes=minutes)
+                self.assertEqual(local_to_utc(TZ, local), pytz_local_to_utc(TZ, local), local)
+
+    def test_local_to_utc_overflow(self):
+        with self.assertRaises(OverflowError):
+            local_to_utc(TZ, parse_compact('00010101 00:00:00'))
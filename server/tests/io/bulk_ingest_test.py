@@ -0,0 +1,147 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+from copy import deepcopy
+from unittest import mock
+
+from superdesk import get_resource_service
+from superdesk.io.commands.update_ingest import ingest_item
+from superdesk.tests import TestCase
+from superdesk.utc import utcnow
+
+from anp.io import bulk_ingest
+from anp.io.bulk_ingest import bulk_ingest_items
+
+
+class BulkWriteError(Exception):
+    """Mongo bulk write error, eve raises an HTTP error while handling it."""
+
+    def __init__(self, write_errors):
+        super().__init__('batch op errors occurred')
+        self.details = {'writeErrors': write_errors}
+
+
+class BulkIndexError(Exception):
+
+    def __init__(self, errors):
+        super().__init__('{} document(s) failed to index.'.format(len(errors)), errors)
+        self.errors = errors
+
+
+class BulkIngestTestCase(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.provider = {
+            'name': 'ANP',
+            'source': 'ANP',
+            'feeding_service': 'anp_news_api',
+            'content_types': ['text'],
+            'config': {'bulk_ingest': True},
+        }
+        self.app.data.insert('ingest_providers', [self.provider])
+        self.items = [
+            {'guid': guid, 'type': 'text', 'headline': guid, 'versioncreated': utcnow()}
+            for guid in ('first', 'second', 'third')
+        ]
+
+    def test_bulk_ingest(self):
+        saved, remaining, failed = bulk_ingest_items(self.items, self.provider)
+        self.assertEqual([item['guid'] for item in saved], ['first', 'second', 'third'])
+        self.assertEqual(remaining, [])
+        self.assertEqual(failed, [])
+
+    def test_bulk_item_matches_ingest_item(self):
+        """Bulk ingest must stay in line with superdesk's `ingest_item`, see `anp.io.bulk_ingest`."""
+        versioncreated = utcnow()
+
+        def parsed(prefix):
+            return {
+                'guid': prefix + '-text',
+                'type': 'text',
+                'headline': 'Zanger Dotan maakt comeback',
+                'versioncreated': versioncreated,
+                'subject': [{'name': 'ANP - Binnenland', 'qcode': 'XANP/BIN', 'scheme': 'anp_genres'}],
+                'associations': {
+                    'featuremedia': {
+                        'guid': prefix + '-picture',
+                        'type': 'picture',
+                        'headline': 'Zanger Dotan',
+                        'renditions': {
+                            'original': {'href': 'http://m/m1', 'media': 'm1', 'mimetype': 'image/jpeg'},
+                        },
+                    },
+                },
+            }
+
+        ingest_service = get_resource_service('ingest')
+        ingested, _ids = ingest_item(parsed('single'), self.provider, mock.Mock(spec=[]))
+        self.assertTrue(ingested)
+        saved, remaining, failed = bulk_ingest_items([parsed('bulk')], self.provider)
+        self.assertEqual(len(saved), 1)
+
+        # ids, guids and sequence numbers differ by design
+        generated = ('_id', 'family_id', 'guid', 'uri', 'ingest_provider_sequence', '_etag', '_created', '_updated')
+
+        def normalized(guid):
+            doc = deepcopy(ingest_service.find_one(req=None, guid=guid))
+            for key in generated:
+                doc.pop(key, None)
+                for assoc in (doc.get('associations') or {}).values():
+                    assoc.pop(key, None)
+            return doc
+
+        self.assertEqual(normalized('single-text'), normalized('bulk-text'))
+        self.assertEqual(normalized('single-picture'), normalized('bulk-picture'))
+
+    @mock.patch.object(bulk_ingest.ProviderError, 'ingestItemError')
+    def test_write_errors_are_reported_per_item(self, ingest_item_error):
+        ingest_service = get_resource_service('ingest')
+        post_in_mongo = ingest_service.post_in_mongo
+
+        def post_ordered(docs, **kwargs):
+            post_in_mongo(docs[:1])
+            try:
+                raise BulkWriteError([{'index': 1, 'code': 11000, 'errmsg': 'E11000 duplicate key error'}])
+            except BulkWriteError:
+                raise Exception('409 Conflict')
+
+        with mock.patch.object(ingest_service, 'post_in_mongo', side_effect=post_ordered):
+            saved, remaining, failed = bulk_ingest_items(self.items, self.provider)
+        self.assertEqual([item['guid'] for item in saved], ['first'])
+        self.assertEqual([item['guid'] for item in failed], ['second'])
+        self.assertEqual([item['guid'] for item in remaining], ['third'])
+        ingest_item_error.assert_called_once()
+        self.assertIs(ingest_item_error.call_args[1]['item'], failed[0])
+
+    @mock.patch.object(bulk_ingest.ProviderError, 'ingestItemError')
+    def test_index_errors_are_reported_per_item(self, ingest_item_error):
+        search_backend = self.app.data._search_backend('ingest')
+
+        def bulk_insert(resource, docs):
+            raise BulkIndexError([
+                {'index': {'_id': docs[2]['_id'], 'status': 400, 'error': 'mapper_parsing_exception'}}
+            ])
+
+        with mock.patch.object(search_backend, 'bulk_insert', side_effect=bulk_insert):
+            saved, remaining, failed = bulk_ingest_items(self.items, self.provider)
+        self.assertEqual([item['guid'] for item in saved], ['first', 'second'])
+        self.assertEqual([item['guid'] for item in failed], ['third'])
+        self.assertEqual(remaining, [])
+        ingest_item_error.assert_called_once()
+
+        # without details every item of the request failed
+        ingest_item_error.reset_mock()
+        items = [dict(item, guid=item['guid'] + '-2') for item in self.items]
+        with mock.patch.object(search_backend, 'bulk_insert', side_effect=Exception('Connection refused')):
+            saved, remaining, failed = bulk_ingest_items(items, self.provider)
+        self.assertEqual(saved, [])
+        self.assertEqual(len(failed), 3)
+        self.assertEqual(ingest_item_error.call_count, 3)
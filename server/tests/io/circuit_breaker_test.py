@@ -0,0 +1,78 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import unittest
+
+from anp.io.circuit_breaker import (
+    CircuitBreaker, get_circuit_breaker, reset_circuit_breakers, CLOSED, OPEN, HALF_OPEN
+)
+
+
+class CircuitBreakerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60, timer=lambda: self.now)
+
+    def test_opens_after_failures_in_row(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_single_probe_when_half_open(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.now += 60
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertFalse(self.breaker.allow())
+
+        # failed probe opens the circuit again
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow())
+
+        self.now += 60
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+    def test_state_is_restored(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        data = self.breaker.to_dict()
+        self.assertEqual(data['state'], OPEN)
+        self.assertEqual(data['failures'], 3)
+        self.assertEqual(data['opened_at'].timestamp(), 1000)
+
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60, timer=lambda: self.now)
+        breaker.restore(data)
+        self.assertFalse(breaker.allow())
+        self.now += 60
+        self.assertTrue(breaker.allow())
+
+    def test_shared_breakers(self):
+        reset_circuit_breakers()
+        breaker = get_circuit_breaker('provider', 'items', saved_state={'state': OPEN, 'failures': 5})
+        # open state without opened_at is invalid
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertIs(breaker, get_circuit_breaker('provider', 'items'))
+        self.assertIsNot(breaker, get_circuit_breaker('provider', 'sources'))
+        reset_circuit_breakers()
+        self.assertIsNot(breaker, get_circuit_breaker('provider', 'items'))
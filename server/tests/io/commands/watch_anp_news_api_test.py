@@ -0,0 +1,107 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from superdesk import get_resource_service
+from superdesk.tests import TestCase
+
+from anp.io.commands import watch_anp_news_api
+from anp.io.commands.watch_anp_news_api import AdaptiveInterval, ANPNewsApiWatcher
+from anp.io.feeding_services.anp_news_api import ANPNewsApiFeedingService
+
+
+class FakeTimer:
+
+    def __init__(self):
+        self.now = 1000
+
+    def __call__(self):
+        return self.now
+
+
+class AdaptiveIntervalTestCase(unittest.TestCase):
+
+    def test_interval_follows_publication_rate(self):
+        timer = FakeTimer()
+        interval = AdaptiveInterval(min_interval=5, max_interval=300, timer=timer)
+        self.assertTrue(interval.is_due())
+
+        interval.polled(0)
+        self.assertEqual(interval.interval, 10)
+        self.assertFalse(interval.is_due())
+
+        # busy source is polled as often as allowed
+        timer.now += 10
+        interval.polled(10)
+        self.assertEqual(interval.interval, 5)
+
+        # quiet source is polled less and less
+        intervals = []
+        for _ in range(20):
+            timer.now += interval.interval
+            self.assertTrue(interval.is_due())
+            interval.polled(0)
+            intervals.append(interval.interval)
+        self.assertEqual(intervals, sorted(intervals))
+        self.assertEqual(intervals[-1], 300)
+
+
+class ANPNewsApiWatcherTestCase(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.provider = {
+            'name': 'ANP',
+            'source': 'ANP',
+            'feeding_service': 'anp_news_api',
+            'feed_parser': 'anp_news_api',
+            'content_types': ['text'],
+            'config': {'username': 'fake@anp.nl', 'password': 'fakepswd', 'source_titles': 'AFN, ANP 101'},
+            'private': {},
+        }
+        self.app.data.insert('ingest_providers', [self.provider])
+
+    @mock.patch.object(watch_anp_news_api, 'push_notification')
+    @mock.patch.object(watch_anp_news_api, 'ingest_items', return_value=set())
+    @mock.patch.object(ANPNewsApiFeedingService, '_fetch_sources')
+    def test_poll(self, fetch_sources, ingest_items, push_notification):
+        fetch_sources.return_value = [{'id': 'afn', 'title': 'AFN'}, {'id': 'anp', 'title': 'ANP 101'}]
+        polled = []
+
+        def update_sources(service, provider, update, source_ids=None):
+            polled.extend(source_ids)
+            update['private'] = {'sources': dict(provider['private'].get('sources', {}))}
+            update['private']['sources'][source_ids[0]] = {'last_item_id': source_ids[0] + '-1'}
+            if source_ids == ['afn']:
+                service.stats.incr('parsed_items')
+                yield [{'guid': 'afn-1', 'versioncreated': datetime(2019, 5, 2, 12, 4, 56)}]
+
+        timer = FakeTimer()
+        watcher = ANPNewsApiWatcher('ANP', timer=timer)
+        with mock.patch.object(ANPNewsApiFeedingService, '_update_sources', autospec=True, side_effect=update_sources):
+            self.assertEqual(watcher.poll(), 1)
+            self.assertEqual(polled, ['afn', 'anp'])
+            ingest_items.assert_called_once()
+            push_notification.assert_called_once()
+
+            provider = get_resource_service('ingest_providers').find_one(req=None, _id=self.provider['_id'])
+            self.assertEqual(provider['private']['sources'], {
+                'afn': {'last_item_id': 'afn-1'},
+                'anp': {'last_item_id': 'anp-1'},
+            })
+            self.assertIn('last_item_update', provider)
+
+            # quiet source waits longer
+            timer.now += 5
+            self.assertEqual(watcher.poll(), 1)
+            self.assertEqual(polled, ['afn', 'anp', 'afn'])
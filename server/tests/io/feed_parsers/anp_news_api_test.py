@@ -12,10 +12,16 @@
 import os
 import json
 import datetime
+from io import BytesIO
+from unittest import mock
 from superdesk.tests import TestCase
+from superdesk.media import renditions
 from apps.prepopulate.app_populate import AppPopulateCommand
 import anp
-from anp.io.feed_parsers.anp_news_api import ANPNewsApiFeedParser
+from anp.io.feed_parsers.anp_news_api import ANPNewsApiFeedParser, media_index
+from anp.media import renditions as media_renditions
+from anp.media.resize import resize_many
+from anp.vocabularies import invalidate as invalidate_vocabularies
 
 
 class ANPNewsApiFeedParserTestCase(TestCase):
@@ -23,6 +29,8 @@ class ANPNewsApiFeedParserTestCase(TestCase):
 
     def setUp(self):
         super().setUp()
+        media_index.clear()
+        invalidate_vocabularies()
         # load vocabularies
         with self.app.app_context():
             voc_file = os.path.join(
@@ -112,3 +120,73 @@ class ANPNewsApiFeedParserTestCase(TestCase):
                 subject,
                 expected_subjects[index]
             )
+
+    @mock.patch.object(renditions, 'download_file_from_url')
+    def test_featuremedia_is_reused(self, download_file_from_url):
+        dirname = os.path.dirname(os.path.realpath(__file__))
+        with open(os.path.join(dirname, '../fixtures', 'image-38bdbbbdae1320f77049b5a32538e09c.jpeg'), 'rb') as f:
+            image = f.read()
+        download_file_from_url.side_effect = lambda *args, **kwargs: (BytesIO(image), 'image.jpeg', 'image/jpeg')
+        provider = {
+            'name': 'test',
+            'feeding_service': 'anp_news_api',
+            'config': {'username': 'fake@anp.nl', 'password': 'fakepswd'}
+        }
+        article = dict(
+            self.article,
+            media_link='https://newsapi.anp.nl/services/sources/1/items/2/media/72f40a9ba39bc2e0605abaa7db767bcd'
+        )
+        parser = ANPNewsApiFeedParser()
+
+        first = parser.parse(article, provider)['associations']['featuremedia']
+        second = parser.parse(dict(article, id='other'), provider)['associations']['featuremedia']
+        self.assertEqual(download_file_from_url.call_count, 1)
+        self.assertEqual(first['renditions'], second['renditions'])
+
+        # renditions of an ingested picture are reused by other workers
+        media_index.clear()
+        self.app.data.insert('ingest', [dict(first, _id='72f40a9ba39bc2e0605abaa7db767bcd')])
+        third = parser.parse(article, provider)['associations']['featuremedia']
+        self.assertEqual(download_file_from_url.call_count, 1)
+        self.assertEqual(first['renditions'], third['renditions'])
+
+    @mock.patch.object(renditions, 'download_file_from_url')
+    def test_featuremedia_of_batch_is_resized_together(self, download_file_from_url):
+        dirname = os.path.dirname(os.path.realpath(__file__))
+        with open(os.path.join(dirname, '../fixtures', 'image-38bdbbbdae1320f77049b5a32538e09c.jpeg'), 'rb') as f:
+            image = f.read()
+        download_file_from_url.side_effect = lambda *args, **kwargs: (BytesIO(image), 'image.jpeg', 'image/jpeg')
+        provider = {
+            'name': 'test',
+            'feeding_service': 'anp_news_api',
+            'config': {'username': 'fake@anp.nl', 'password': 'fakepswd'}
+        }
+        media_link = 'https://newsapi.anp.nl/services/sources/1/items/2/media/{}'
+        articles = [
+            dict(self.article, media_link=media_link.format('72f40a9ba39bc2e0605abaa7db767bcd')),
+            dict(self.article, id='other', media_link=media_link.format('0f4a1cd1b41f9a7e8a8d4b3f1c6e1a2b')),
+            dict(self.article, id='same', media_link=media_link.format('72f40a9ba39bc2e0605abaa7db767bcd')),
+        ]
+
+        with mock.patch.object(media_renditions, 'resize_many', wraps=resize_many) as resize:
+            items = ANPNewsApiFeedParser().parse_many(articles, provider)
+        resize.assert_called_once()
+        self.assertEqual(len(resize.call_args[0][0]), 2)
+        self.assertEqual(download_file_from_url.call_count, 2)
+        featuremedia = [item['associations']['featuremedia'] for item in items]
+        self.assertIn('baseImage', featuremedia[0]['renditions'])
+        self.assertNotEqual(featuremedia[0]['renditions'], featuremedia[1]['renditions'])
+        self.assertEqual(featuremedia[0]['renditions'], featuremedia[2]['renditions'])
+
+    def test_parse_many(self):
+        parser = ANPNewsApiFeedParser()
+        provider = {'name': 'test'}
+        other = dict(self.article, id='other', categories=['XANP/BIN', 'UNKNOWN'], keywords=[])
+        items = parser.parse_many([self.article, other], provider)
+        self.assertEqual(items, [parser.parse(self.article, provider), parser.parse(other, provider)])
+        self.assertEqual(items[1]['subject'], [
+            {'name': 'ANP - Binnenland', 'qcode': 'XANP/BIN', 'scheme': 'anp_genres'}
+        ])
+        self.assertNotIn('keywords', items[1])
+        # items don't share subjects
+        self.assertIsNot(items[0]['subject'][3], items[1]['subject'][0])
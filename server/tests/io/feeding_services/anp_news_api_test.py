@@ -13,14 +13,28 @@ import re
 from io import BytesIO
 from unittest import mock
 import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
 
+import requests
+
+from superdesk import get_resource_service
+from superdesk.errors import IngestApiError, SuperdeskIngestError
 from superdesk.tests import TestCase
-from superdesk.io.feeding_services import http_base_service
+from superdesk.utc import utcnow
 from apps.prepopulate.app_populate import AppPopulateCommand
 from superdesk.media import renditions
 import anp
-from anp.io.feed_parsers.anp_news_api import ANPNewsApiFeedParser
+from anp.io.feed_parsers.anp_news_api import ANPNewsApiFeedParser, media_index
+from anp.vocabularies import invalidate as invalidate_vocabularies
+from anp.io.feeding_services import anp_news_api
 from anp.io.feeding_services.anp_news_api import ANPNewsApiFeedingService
+from anp.io.response_cache import get_response_cache, reset_response_cache
+from anp.io.circuit_breaker import reset_circuit_breakers, OPEN, HALF_OPEN, CLOSED
+from anp.io.tasks import fetch_featuremedia
 
 PROVIDER = {
     "update_schedule": {
@@ -54,6 +68,11 @@ class ANPNewsApiFeedingServiceTestCase(TestCase):
 
     def setUp(self):
         super().setUp()
+        ANPNewsApiFeedingService.sources_cache.clear()
+        reset_response_cache()
+        reset_circuit_breakers()
+        media_index.clear()
+        invalidate_vocabularies()
         # load vocabularies
         with self.app.app_context():
             voc_file = os.path.join(
@@ -82,6 +101,7 @@ class ANPNewsApiFeedingServiceTestCase(TestCase):
         # items details
         for item_id in ('ac3dc857e87ea0a0b98635b314941d12',
                         'bd34da5aa71ea490639e5601f98b238a',
+                        '42fba1dc418300a556f3126946c68c7c',
                         'ac47563d3fe56f62972f0f7e55d323cd',
                         '7404db79e88ae6483f56941204943a4a',
                         '38bdbbbdae1320f77049b5a32538e09c',
@@ -106,32 +126,32 @@ class ANPNewsApiFeedingServiceTestCase(TestCase):
             with open(_path, 'rb') as f:
                 self.fixtures.setdefault('image', {})[item_id] = f.read()
 
-    @mock.patch.object(renditions, 'download_file_from_url')
-    @mock.patch.object(http_base_service, 'requests')
-    @mock.patch.object(ANPNewsApiFeedingService, 'get_feed_parser')
-    def test_feeding_service(self, get_feed_parser, http_base_requests, download_file_from_url):
+    def mock_get_side_effect(self, url, *args, **kwargs):
+        response = mock.MagicMock()
+        response.status_code = 200
+        response.headers = {}
+        match_items = re.match(r'https://newsapi.anp.nl/services/sources/([^/]*)/items$', url)
+        match_details = re.match(r'https://newsapi.anp.nl/services/sources/([^/]*)/items/([^/]*)$', url)
+        match_media = re.match(r'https://newsapi.anp.nl/services/sources/([^/]*)/items/([^/]*)/media$', url)
 
-        def mock_get_side_effect(url, *args, **kwargs):
-            response = mock.MagicMock()
-            response.status_code = 200
-            match_items = re.match(r'https://newsapi.anp.nl/services/sources/([^/]*)/items$', url)
-            match_details = re.match(r'https://newsapi.anp.nl/services/sources/([^/]*)/items/([^/]*)$', url)
-            match_media = re.match(r'https://newsapi.anp.nl/services/sources/([^/]*)/items/([^/]*)/media$', url)
-
-            if url == 'https://newsapi.anp.nl/services/sources':
-                response.json.return_value = self.fixtures['sources']
-            elif match_items:
-                source_id = match_items.group(1)
-                response.json.return_value = self.fixtures['items'][source_id]
-            elif match_details:
-                item_id = match_details.group(2)
-                response.json.return_value = self.fixtures['item-details'][item_id]
-            elif match_media:
-                item_id = match_media.group(2)
-                response.json.return_value = self.fixtures['item-media'][item_id]
+        if url == 'https://newsapi.anp.nl/services/sources':
+            response.json.return_value = self.fixtures['sources']
+        elif match_items:
+            source_id = match_items.group(1)
+            response.json.return_value = self.fixtures['items'][source_id]
+        elif match_details:
+            item_id = match_details.group(2)
+            response.json.return_value = self.fixtures['item-details'][item_id]
+        elif match_media:
+            item_id = match_media.group(2)
+            response.json.return_value = self.fixtures['item-media'][item_id]
 
-            return response
+        return response
 
+    @mock.patch.object(renditions, 'download_file_from_url')
+    @mock.patch.object(ANPNewsApiFeedingService, 'session', new_callable=mock.PropertyMock)
+    @mock.patch.object(ANPNewsApiFeedingService, 'get_feed_parser')
+    def test_feeding_service(self, get_feed_parser, session, download_file_from_url):
         # it makes sense to use `side_effect` here for better flexebility,
         # but we have only one item with image, so it's fine for now
         download_file_from_url.return_value = (
@@ -140,38 +160,41 @@ class ANPNewsApiFeedingServiceTestCase(TestCase):
             'image/jpeg'
         )
 
-        mock_get = http_base_requests.get
-        mock_get.side_effect = mock_get_side_effect
+        session.return_value.get.side_effect = self.mock_get_side_effect
         get_feed_parser.return_value = ANPNewsApiFeedParser()
 
         provider = PROVIDER.copy()
         service = ANPNewsApiFeedingService()
         service.provider = provider
         update = {}
-        items = service._update(provider, update)[0]
+        items = [item for batch in service._update(provider, update) for item in batch]
 
         self.assertEqual(len(items), 6)
+        stats = service.stats.to_dict()
+        self.assertEqual(stats['counters']['parsed_items'], 6)
+        self.assertEqual(stats['timings']['item_details']['count'], 6)
+        self.assertEqual(stats['timings']['renditions']['count'], 1)
         self.assertDictEqual(
-            update,
+            update['private']['sources'],
             {
-                'private': {
-                    'sources': {
-                        '5af9a2e4-3825-45d6-8445-419b1cb365dc': {
-                            'title': 'AFN',
-                            'last_item_id': 'ac3dc857e87ea0a0b98635b314941d12'
-                        },
-                        '03b7a184-f6f4-4879-85f6-b43f21acb940': {
-                            'title': 'AFP EN (Editorial)',
-                            'last_item_id': 'ac47563d3fe56f62972f0f7e55d323cd'
-                        },
-                        '4ad32715-3221-49b1-b93b-30b02c1c6eb6': {
-                            'title': 'ANP 101',
-                            'last_item_id': '7404db79e88ae6483f56941204943a4a'
-                        }
-                    }
+                '5af9a2e4-3825-45d6-8445-419b1cb365dc': {
+                    'title': 'AFN',
+                    'last_item_id': 'ac3dc857e87ea0a0b98635b314941d12'
+                },
+                '03b7a184-f6f4-4879-85f6-b43f21acb940': {
+                    'title': 'AFP EN (Editorial)',
+                    'last_item_id': 'ac47563d3fe56f62972f0f7e55d323cd'
+                },
+                '4ad32715-3221-49b1-b93b-30b02c1c6eb6': {
+                    'title': 'ANP 101',
+                    'last_item_id': '7404db79e88ae6483f56941204943a4a'
                 }
             }
         )
+        self.assertEqual(
+            {endpoint: breaker['state'] for endpoint, breaker in update['private']['circuit_breakers'].items()},
+            {'sources': CLOSED, 'items': CLOSED, 'item_details': CLOSED, 'item_media': CLOSED}
+        )
 
         item_with_picture = [item for item in items if item['guid'] == '38bdbbbdae1320f77049b5a32538e09c'][-1]
         self.assertIn(
@@ -182,3 +205,694 @@ class ANPNewsApiFeedingServiceTestCase(TestCase):
             item_with_picture['associations']['featuremedia']['headline'],
             'Zanger Dotan maakt comeback na trollenaffaire'
         )
+
+    @mock.patch.object(ANPNewsApiFeedingService, 'session', new_callable=mock.PropertyMock)
+    @mock.patch.object(ANPNewsApiFeedingService, 'get_feed_parser')
+    def test_failed_item_details_stop_source(self, get_feed_parser, session):
+        failed_url = 'https://newsapi.anp.nl/services/sources/5af9a2e4-3825-45d6-8445-419b1cb365dc/items/' \
+                     'ac3dc857e87ea0a0b98635b314941d12'
+
+        def mock_get_side_effect(url, *args, **kwargs):
+            response = self.mock_get_side_effect(url, *args, **kwargs)
+            if url == failed_url:
+                response.json.return_value = {
+                    'hasError': True,
+                    'data': {'errorCode': 400, 'description': 'Bad request'}
+                }
+            return response
+
+        session.return_value.get.side_effect = mock_get_side_effect
+        get_feed_parser.return_value = ANPNewsApiFeedParser()
+
+        provider = PROVIDER.copy()
+        provider['config'] = dict(PROVIDER['config'], source_titles='AFN', max_workers='2')
+        service = ANPNewsApiFeedingService()
+        service.provider = provider
+        update = {}
+        items = [item for batch in service._update(provider, update) for item in batch]
+
+        # only the item preceding the failed one is ingested, the cursor stays before the failed item
+        self.assertEqual([item['guid'] for item in items], ['bd34da5aa71ea490639e5601f98b238a'])
+        state = update['private']['sources']['5af9a2e4-3825-45d6-8445-419b1cb365dc']
+        self.assertEqual(state['last_item_id'], 'bd34da5aa71ea490639e5601f98b238a')
+        self.assertEqual(state['error_count'], 1)
+        self.assertGreater(state['retry_after'], utcnow())
+
+    @mock.patch.object(renditions, 'download_file_from_url')
+    @mock.patch.object(ANPNewsApiFeedingService, 'session', new_callable=mock.PropertyMock)
+    @mock.patch.object(ANPNewsApiFeedingService, 'get_feed_parser')
+    def test_sources_have_independent_state(self, get_feed_parser, session, download_file_from_url):
+        failed_url = 'https://newsapi.anp.nl/services/sources/03b7a184-f6f4-4879-85f6-b43f21acb940/items'
+
+        def mock_get_side_effect(url, *args, **kwargs):
+            if url == failed_url:
+                raise requests.exceptions.ConnectionError()
+            return self.mock_get_side_effect(url, *args, **kwargs)
+
+        download_file_from_url.return_value = (
+            BytesIO(self.fixtures['image']['38bdbbbdae1320f77049b5a32538e09c']),
+            'image-38bdbbbdae1320f77049b5a32538e09c.jpeg',
+            'image/jpeg'
+        )
+        session.return_value.get.side_effect = mock_get_side_effect
+        get_feed_parser.return_value = ANPNewsApiFeedParser()
+
+        provider = PROVIDER.copy()
+        provider['config'] = dict(PROVIDER['config'], source_titles='AFN, AFP EN (Editorial), ANP 101')
+        provider['private'] = {
+            'sources': {
+                # AFN is backing off after previous errors, its cursor must be kept
+                '5af9a2e4-3825-45d6-8445-419b1cb365dc': {
+                    'title': 'AFN',
+                    'last_item_id': 'bd34da5aa71ea490639e5601f98b238a',
+                    'error_count': 2,
+                    'retry_after': utcnow() + timedelta(minutes=5)
+                },
+                # source which isn't configured anymore
+                'removed': {'title': 'Removed', 'last_item_id': 'foo'},
+            }
+        }
+        service = ANPNewsApiFeedingService()
+        service.provider = provider
+        update = {}
+        items = [item for batch in service._update(provider, update) for item in batch]
+
+        self.assertEqual(
+            [item['guid'] for item in items],
+            ['38bdbbbdae1320f77049b5a32538e09c', '7404db79e88ae6483f56941204943a4a']
+        )
+        sources = update['private']['sources']
+        self.assertEqual(sources['5af9a2e4-3825-45d6-8445-419b1cb365dc'],
+                         provider['private']['sources']['5af9a2e4-3825-45d6-8445-419b1cb365dc'])
+        self.assertEqual(sources['removed'], {'title': 'Removed', 'last_item_id': 'foo'})
+        self.assertEqual(sources['03b7a184-f6f4-4879-85f6-b43f21acb940']['error_count'], 1)
+        self.assertNotIn('last_item_id', sources['03b7a184-f6f4-4879-85f6-b43f21acb940'])
+        self.assertEqual(sources['4ad32715-3221-49b1-b93b-30b02c1c6eb6'], {
+            'title': 'ANP 101',
+            'last_item_id': '7404db79e88ae6483f56941204943a4a'
+        })
+
+    @mock.patch.object(ANPNewsApiFeedingService, 'session', new_callable=mock.PropertyMock)
+    @mock.patch.object(ANPNewsApiFeedingService, 'get_feed_parser')
+    def test_unexpected_source_error_doesnt_stop_other_sources(self, get_feed_parser, session):
+        malformed_url = 'https://newsapi.anp.nl/services/sources/5af9a2e4-3825-45d6-8445-419b1cb365dc/items'
+
+        def mock_get_side_effect(url, *args, **kwargs):
+            response = self.mock_get_side_effect(url, *args, **kwargs)
+            if url == malformed_url:
+                # listing entry without `kind`
+                response.json.return_value = {'hasError': False, 'data': {'items': [{'id': 'foo'}]}}
+            return response
+
+        session.return_value.get.side_effect = mock_get_side_effect
+        get_feed_parser.return_value = ANPNewsApiFeedParser()
+
+        provider = PROVIDER.copy()
+        provider['config'] = dict(PROVIDER['config'], source_titles='AFN, AFP EN (Editorial)')
+        service = ANPNewsApiFeedingService()
+        service.provider = provider
+        update = {}
+        items = [item for batch in service._update(provider, update) for item in batch]
+
+        self.assertEqual(
+            [item['guid'] for item in items],
+            ['c4b893fec041a87ee340b513e8b11860', 'ac47563d3fe56f62972f0f7e55d323cd']
+        )
+        sources = update['private']['sources']
+        self.assertEqual(sources['5af9a2e4-3825-45d6-8445-419b1cb365dc']['error_count'], 1)
+        self.assertNotIn('last_item_id', sources['5af9a2e4-3825-45d6-8445-419b1cb365dc'])
+        self.assertEqual(sources['03b7a184-f6f4-4879-85f6-b43f21acb940']['last_item_id'],
+                         'ac47563d3fe56f62972f0f7e55d323cd')
+
+    @mock.patch.object(ANPNewsApiFeedingService, 'session', new_callable=mock.PropertyMock)
+    @mock.patch.object(ANPNewsApiFeedingService, 'get_feed_parser')
+    def test_slow_source_doesnt_hold_back_other_sources(self, get_feed_parser, session):
+        slow_url = 'https://newsapi.anp.nl/services/sources/5af9a2e4-3825-45d6-8445-419b1cb365dc/items'
+        released = threading.Event()
+
+        def mock_get_side_effect(url, *args, **kwargs):
+            if url == slow_url:
+                released.wait(10)
+            return self.mock_get_side_effect(url, *args, **kwargs)
+
+        session.return_value.get.side_effect = mock_get_side_effect
+        get_feed_parser.return_value = ANPNewsApiFeedParser()
+
+        provider = PROVIDER.copy()
+        provider['config'] = dict(PROVIDER['config'], source_titles='AFN, AFP EN (Editorial)', batch_size='1')
+        service = ANPNewsApiFeedingService()
+        service.provider = provider
+        batches = service._update(provider, {})
+
+        # AFN is polled first, but AFP items are ingested while it's waiting
+        self.assertEqual([item['guid'] for item in next(batches)], ['c4b893fec041a87ee340b513e8b11860'])
+        self.assertEqual([item['guid'] for item in next(batches)], ['ac47563d3fe56f62972f0f7e55d323cd'])
+        released.set()
+        self.assertEqual([item['guid'] for batch in batches for item in batch], [
+            'bd34da5aa71ea490639e5601f98b238a',
+            'ac3dc857e87ea0a0b98635b314941d12',
+        ])
+
+    def test_credentials_are_required(self):
+        provider = PROVIDER.copy()
+        provider['config'] = dict(PROVIDER['config'], password=' ')
+        service = ANPNewsApiFeedingService()
+        service.provider = provider
+        with self.assertRaises(SuperdeskIngestError):
+            service.get_url(url=service.HTTP_SOURCES_URL)
+
+    @mock.patch.object(anp_news_api, 'connection_stats')
+    @mock.patch.object(ANPNewsApiFeedingService, 'session', new_callable=mock.PropertyMock)
+    @mock.patch.object(ANPNewsApiFeedingService, 'get_feed_parser')
+    def test_connections_of_update_are_logged(self, get_feed_parser, session, connection_stats):
+        connection_stats.side_effect = [{'new': 2, 'reused': 3}, {'new': 3, 'reused': 7}]
+        session.return_value.get.side_effect = self.mock_get_side_effect
+        get_feed_parser.return_value = ANPNewsApiFeedParser()
+        provider = PROVIDER.copy()
+        provider['config'] = dict(PROVIDER['config'], source_titles='Unknown')
+        service = ANPNewsApiFeedingService()
+        service.provider = provider
+
+        with self.assertLogs(anp_news_api.logger, level='INFO') as logs:
+            self.assertEqual(list(service._update(provider, {})), [])
+        self.assertIn("ANP News API connections of provider 'ANP': 1 new, 4 reused", logs.output[-1])
+
+    @mock.patch.object(ANPNewsApiFeedingService, 'session', new_callable=mock.PropertyMock)
+    def test_sources_are_cached(self, session):
+        session.return_value.get.side_effect = self.mock_get_side_effect
+        provider = PROVIDER.copy()
+        provider['config'] = dict(PROVIDER['config'])
+        service = ANPNewsApiFeedingService()
+        service.provider = provider
+
+        sources = service._fetch_sources()
+        self.assertEqual(
+            sorted(src['title'] for src in sources),
+            ['AFN', 'AFP EN (Editorial)', 'ANP 101']
+        )
+        # sources returned from cache can be modified
+        sources[0]['items'] = []
+        self.assertNotIn('items', service._fetch_sources()[0])
+        self.assertEqual(session.return_value.get.call_count, 1)
+
+        # changed config invalidates the cache
+        provider['config']['source_titles'] = 'AFN'
+        self.assertEqual([src['title'] for src in service._fetch_sources()], ['AFN'])
+        self.assertEqual(session.return_value.get.call_count, 2)
+
+    @mock.patch.object(ANPNewsApiFeedingService, 'session', new_callable=mock.PropertyMock)
+    @mock.patch.object(ANPNewsApiFeedingService, 'get_feed_parser')
+    def test_items_pages_are_fetched_up_to_last_item(self, get_feed_parser, session):
+        items_url = 'https://newsapi.anp.nl/services/sources/5af9a2e4-3825-45d6-8445-419b1cb365dc/items'
+
+        def mock_get_side_effect(url, *args, **kwargs):
+            response = self.mock_get_side_effect(url, *args, **kwargs)
+            if url == items_url:
+                params = kwargs.get('params', {})
+                self.assertEqual(params['toItem'], 'last_ingested')
+                if params.get('fromItem') == 'bd34da5aa71ea490639e5601f98b238a':
+                    response.json.return_value = {
+                        'hasError': False,
+                        'data': {
+                            'items': [{'id': '42fba1dc418300a556f3126946c68c7c', 'kind': 'TEXTARTICLE'}],
+                            'hasMore': False
+                        }
+                    }
+            return response
+
+        session.return_value.get.side_effect = mock_get_side_effect
+        get_feed_parser.return_value = ANPNewsApiFeedParser()
+
+        provider = PROVIDER.copy()
+        provider['config'] = dict(PROVIDER['config'], source_titles='AFN')
+        provider['private'] = {
+            'sources': {
+                '5af9a2e4-3825-45d6-8445-419b1cb365dc': {'title': 'AFN', 'last_item_id': 'last_ingested'}
+            }
+        }
+        service = ANPNewsApiFeedingService()
+        service.provider = provider
+        update = {}
+        items = [item for batch in service._update(provider, update) for item in batch]
+
+        self.assertEqual([item['guid'] for item in items], [
+            '42fba1dc418300a556f3126946c68c7c',
+            'bd34da5aa71ea490639e5601f98b238a',
+            'ac3dc857e87ea0a0b98635b314941d12',
+        ])
+        self.assertEqual(
+            update['private']['sources']['5af9a2e4-3825-45d6-8445-419b1cb365dc']['last_item_id'],
+            'ac3dc857e87ea0a0b98635b314941d12'
+        )
+
+    @mock.patch.object(ANPNewsApiFeedingService, 'session', new_callable=mock.PropertyMock)
+    def test_items_paging_stops_when_from_item_is_ignored(self, session):
+        session.return_value.get.side_effect = self.mock_get_side_effect
+        service = ANPNewsApiFeedingService()
+        service.provider = PROVIDER.copy()
+
+        # listing fixture reports more items, but the API returns the same page whatever `fromItem` is
+        items = list(service._fetch_items('5af9a2e4-3825-45d6-8445-419b1cb365dc', to_item='last_ingested'))
+
+        self.assertEqual([item['id'] for item in items], [
+            'bd34da5aa71ea490639e5601f98b238a',
+            'ac3dc857e87ea0a0b98635b314941d12',
+        ])
+        self.assertEqual(session.return_value.get.call_count, 2)
+
+        # listing stops at the last ingested item
+        session.return_value.get.reset_mock()
+        items = list(service._fetch_items('5af9a2e4-3825-45d6-8445-419b1cb365dc',
+                                          to_item='bd34da5aa71ea490639e5601f98b238a'))
+        self.assertEqual([item['id'] for item in items], ['ac3dc857e87ea0a0b98635b314941d12'])
+        self.assertEqual(session.return_value.get.call_count, 1)
+
+    @mock.patch.object(ANPNewsApiFeedingService, 'session', new_callable=mock.PropertyMock)
+    def test_items_paging_isnt_limited(self, session):
+        # 60 single item pages newer than the last ingested item
+        ids = ['item-{}'.format(number) for number in range(60, 0, -1)] + ['last_ingested']
+
+        def mock_get_side_effect(url, *args, **kwargs):
+            response = self.mock_get_side_effect(url, *args, **kwargs)
+            params = kwargs.get('params', {})
+            start = ids.index(params['fromItem']) + 1 if params.get('fromItem') else 0
+            response.json.return_value = {
+                'hasError': False,
+                'data': {
+                    'items': [{'id': ids[start], 'kind': 'TEXTARTICLE'}],
+                    'hasMore': ids[start] != 'last_ingested',
+                }
+            }
+            return response
+
+        session.return_value.get.side_effect = mock_get_side_effect
+        service = ANPNewsApiFeedingService()
+        service.provider = PROVIDER.copy()
+
+        items = list(service._fetch_items('5af9a2e4-3825-45d6-8445-419b1cb365dc', to_item='last_ingested'))
+        self.assertEqual([item['id'] for item in items], list(reversed(ids[:-1])))
+        self.assertEqual(session.return_value.get.call_count, 61)
+
+    @mock.patch.object(renditions, 'download_file_from_url')
+    @mock.patch.object(ANPNewsApiFeedingService, 'session', new_callable=mock.PropertyMock)
+    @mock.patch.object(ANPNewsApiFeedingService, 'get_feed_parser')
+    def test_batches_are_checkpointed(self, get_feed_parser, session, download_file_from_url):
+        download_file_from_url.return_value = (
+            BytesIO(self.fixtures['image']['38bdbbbdae1320f77049b5a32538e09c']),
+            'image-38bdbbbdae1320f77049b5a32538e09c.jpeg',
+            'image/jpeg'
+        )
+        session.return_value.get.side_effect = self.mock_get_side_effect
+        get_feed_parser.return_value = ANPNewsApiFeedParser()
+
+        provider = PROVIDER.copy()
+        provider['config'] = dict(PROVIDER['config'], batch_size='4')
+
+        with self.app.app_context():
+            self.app.data.insert('ingest_providers', [provider])
+            service = ANPNewsApiFeedingService()
+            service.provider = provider
+            batches = service._update(provider, {})
+
+            sources = {
+                'ac3dc857e87ea0a0b98635b314941d12': '5af9a2e4-3825-45d6-8445-419b1cb365dc',
+                'bd34da5aa71ea490639e5601f98b238a': '5af9a2e4-3825-45d6-8445-419b1cb365dc',
+                'ac47563d3fe56f62972f0f7e55d323cd': '03b7a184-f6f4-4879-85f6-b43f21acb940',
+                'c4b893fec041a87ee340b513e8b11860': '03b7a184-f6f4-4879-85f6-b43f21acb940',
+                '7404db79e88ae6483f56941204943a4a': '4ad32715-3221-49b1-b93b-30b02c1c6eb6',
+                '38bdbbbdae1320f77049b5a32538e09c': '4ad32715-3221-49b1-b93b-30b02c1c6eb6',
+            }
+
+            def saved_cursors():
+                saved = get_resource_service('ingest_providers').find_one(req=None, _id=provider['_id'])
+                return {
+                    source_id: state['last_item_id']
+                    for source_id, state in ((saved.get('private') or {}).get('sources') or {}).items()
+                    if state.get('last_item_id')
+                }
+
+            # sources are consumed as their items come, cursors of a batch are saved once it's ingested
+            first = next(batches)
+            self.assertEqual(len(first), 4)
+            self.assertEqual(saved_cursors(), {})
+
+            self.assertEqual(len(next(batches)), 2)
+            expected = {}
+            for item in first:
+                expected[sources[item['guid']]] = item['guid']
+            self.assertEqual(saved_cursors(), expected)
+
+            self.assertEqual(list(batches), [])
+            self.assertEqual(saved_cursors(), {
+                '5af9a2e4-3825-45d6-8445-419b1cb365dc': 'ac3dc857e87ea0a0b98635b314941d12',
+                '03b7a184-f6f4-4879-85f6-b43f21acb940': 'ac47563d3fe56f62972f0f7e55d323cd',
+                '4ad32715-3221-49b1-b93b-30b02c1c6eb6': '7404db79e88ae6483f56941204943a4a',
+            })
+
+    @mock.patch.object(ANPNewsApiFeedingService, 'session', new_callable=mock.PropertyMock)
+    @mock.patch.object(ANPNewsApiFeedingService, 'get_feed_parser')
+    def test_failed_items_rewind_cursor(self, get_feed_parser, session):
+        session.return_value.get.side_effect = self.mock_get_side_effect
+        get_feed_parser.return_value = ANPNewsApiFeedParser()
+
+        provider = PROVIDER.copy()
+        provider['config'] = dict(PROVIDER['config'], source_titles='AFN, AFP EN (Editorial)')
+        provider['private'] = {
+            'sources': {
+                '03b7a184-f6f4-4879-85f6-b43f21acb940': {'title': 'AFP EN (Editorial)', 'last_item_id': 'foo'},
+            }
+        }
+        service = ANPNewsApiFeedingService()
+        service.provider = provider
+        update = {}
+        batches = service._update(provider, update)
+
+        self.assertEqual([item['guid'] for item in next(batches)], [
+            'bd34da5aa71ea490639e5601f98b238a',
+            'ac3dc857e87ea0a0b98635b314941d12',
+            'c4b893fec041a87ee340b513e8b11860',
+            'ac47563d3fe56f62972f0f7e55d323cd',
+        ])
+        with self.assertRaises(StopIteration):
+            batches.send({'ac3dc857e87ea0a0b98635b314941d12', 'c4b893fec041a87ee340b513e8b11860'})
+
+        # cursors stay before the first failed item of every source
+        sources = update['private']['sources']
+        self.assertEqual(sources['5af9a2e4-3825-45d6-8445-419b1cb365dc']['last_item_id'],
+                         'bd34da5aa71ea490639e5601f98b238a')
+        self.assertEqual(sources['03b7a184-f6f4-4879-85f6-b43f21acb940']['last_item_id'], 'foo')
+
+        # source stops at the failed item
+        provider['config'] = dict(provider['config'], source_titles='AFN', batch_size='1')
+        update = {}
+        batches = service._update(provider, update)
+        self.assertEqual([item['guid'] for item in next(batches)], ['bd34da5aa71ea490639e5601f98b238a'])
+        with self.assertRaises(StopIteration):
+            batches.send({'bd34da5aa71ea490639e5601f98b238a'})
+        self.assertNotIn('last_item_id', update['private']['sources']['5af9a2e4-3825-45d6-8445-419b1cb365dc'])
+
+    @mock.patch.object(ANPNewsApiFeedingService, 'session', new_callable=mock.PropertyMock)
+    @mock.patch.object(ANPNewsApiFeedingService, 'get_feed_parser')
+    def test_items_filter(self, get_feed_parser, session):
+        session.return_value.get.side_effect = self.mock_get_side_effect
+        get_feed_parser.return_value = ANPNewsApiFeedParser()
+
+        provider = PROVIDER.copy()
+        provider['config'] = dict(
+            PROVIDER['config'],
+            source_titles='AFP EN (Editorial), ANP 101',
+            categories='ALL, ANP/BIN',
+            urgency_threshold='2'
+        )
+        service = ANPNewsApiFeedingService()
+        service.provider = provider
+        update = {}
+        items = [item for batch in service._update(provider, update) for item in batch]
+
+        self.assertEqual([item['guid'] for item in items], ['c4b893fec041a87ee340b513e8b11860'])
+        # media of filtered items are not fetched
+        self.assertFalse([
+            call for call in session.return_value.get.call_args_list if call[0][0].endswith('/media')
+        ])
+        # cursors advance past filtered items
+        self.assertEqual(update['private']['sources'], {
+            '03b7a184-f6f4-4879-85f6-b43f21acb940': {
+                'title': 'AFP EN (Editorial)',
+                'last_item_id': 'ac47563d3fe56f62972f0f7e55d323cd'
+            },
+            '4ad32715-3221-49b1-b93b-30b02c1c6eb6': {
+                'title': 'ANP 101',
+                'last_item_id': '7404db79e88ae6483f56941204943a4a'
+            }
+        })
+
+    @mock.patch.object(ANPNewsApiFeedingService, 'session', new_callable=mock.PropertyMock)
+    def test_item_details_are_cached(self, session):
+        url = 'https://newsapi.anp.nl/services/sources/5af9a2e4-3825-45d6-8445-419b1cb365dc/items/' \
+              'bd34da5aa71ea490639e5601f98b238a'
+
+        def mock_get_side_effect(url, *args, **kwargs):
+            response = self.mock_get_side_effect(url, *args, **kwargs)
+            response.headers = {'ETag': '"v1"'}
+            if kwargs.get('headers', {}).get('If-None-Match') == '"v1"':
+                response.status_code = 304
+                response.json.side_effect = ValueError()
+            return response
+
+        session.return_value.get.side_effect = mock_get_side_effect
+        service = ANPNewsApiFeedingService()
+        service.provider = PROVIDER.copy()
+
+        with self.app.app_context():
+            details = service._fetch_item_details('5af9a2e4-3825-45d6-8445-419b1cb365dc',
+                                                  'bd34da5aa71ea490639e5601f98b238a')
+            self.assertEqual(details['id'], 'bd34da5aa71ea490639e5601f98b238a')
+            # fresh response is served without a request
+            self.assertEqual(service.get_cached_url(url), details)
+            self.assertEqual(session.return_value.get.call_count, 1)
+
+            # stale response is revalidated
+            cache = get_response_cache()
+            with mock.patch.object(cache, '_timer', return_value=time.time() + cache.max_age + 1):
+                self.assertEqual(service.get_cached_url(url), details)
+            self.assertEqual(session.return_value.get.call_count, 2)
+            self.assertEqual(cache.stats(), {'hits': 1, 'revalidations': 1, 'misses': 1, 'size': 1})
+
+    @mock.patch.object(ANPNewsApiFeedingService, 'session', new_callable=mock.PropertyMock)
+    def test_modified_item_details_are_fetched_again(self, session):
+        session.return_value.get.side_effect = self.mock_get_side_effect
+        service = ANPNewsApiFeedingService()
+        service.provider = PROVIDER.copy()
+
+        with self.app.app_context():
+            for version in ('2019-05-02T12:33:17Z', '2019-05-02T12:33:17Z', '2019-05-02T12:35:34Z'):
+                details = service._fetch_item_details('5af9a2e4-3825-45d6-8445-419b1cb365dc',
+                                                      'bd34da5aa71ea490639e5601f98b238a', version=version)
+                self.assertEqual(details['id'], 'bd34da5aa71ea490639e5601f98b238a')
+            self.assertEqual(session.return_value.get.call_count, 2)
+
+    @mock.patch.object(renditions, 'download_file_from_url')
+    @mock.patch.object(ANPNewsApiFeedingService, 'session', new_callable=mock.PropertyMock)
+    @mock.patch.object(ANPNewsApiFeedingService, 'get_feed_parser')
+    def test_response_cache_is_saved(self, get_feed_parser, session, download_file_from_url):
+        download_file_from_url.return_value = (
+            BytesIO(self.fixtures['image']['38bdbbbdae1320f77049b5a32538e09c']),
+            'image-38bdbbbdae1320f77049b5a32538e09c.jpeg',
+            'image/jpeg'
+        )
+        session.return_value.get.side_effect = self.mock_get_side_effect
+        get_feed_parser.return_value = ANPNewsApiFeedParser()
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.app.config['ANP_NEWS_API_CACHE_PATH'] = os.path.join(tmpdir, 'cache.json')
+        self.addCleanup(self.app.config.pop, 'ANP_NEWS_API_CACHE_PATH')
+
+        provider = PROVIDER.copy()
+        service = ANPNewsApiFeedingService()
+        service.provider = provider
+        with self.app.app_context():
+            items = [item for batch in service._update(provider, {}) for item in batch]
+            self.assertEqual(len(items), 6)
+            counters = service.stats.to_dict()['counters']
+            self.assertEqual(counters['cache_misses'], 7)
+            self.assertEqual(counters['cache_hits'], 0)
+            self.assertEqual(counters['cache_size'], 7)
+            with open(self.app.config['ANP_NEWS_API_CACHE_PATH']) as f:
+                self.assertEqual(len(json.load(f)), 7)
+
+            # next worker starts with responses of the update
+            reset_response_cache()
+            self.assertEqual(get_response_cache().stats()['size'], 7)
+        reset_response_cache()
+
+    @mock.patch.object(time, 'sleep')
+    @mock.patch.object(ANPNewsApiFeedingService, 'session', new_callable=mock.PropertyMock)
+    def test_throttled_requests_are_retried(self, session, sleep):
+        responses = []
+
+        def mock_get_side_effect(url, *args, **kwargs):
+            response = self.mock_get_side_effect(url, *args, **kwargs)
+            if len(responses) == 0:
+                response.ok = False
+                response.status_code = 429
+                response.headers = {'Retry-After': '2'}
+            elif len(responses) == 1:
+                response.json.return_value = {
+                    'hasError': True,
+                    'data': {'errorCode': 503, 'description': 'Service unavailable'}
+                }
+            responses.append(response)
+            return response
+
+        session.return_value.get.side_effect = mock_get_side_effect
+        provider = PROVIDER.copy()
+        provider['config'] = dict(PROVIDER['config'], rate_limit='8')
+        service = ANPNewsApiFeedingService()
+        service.provider = provider
+
+        sources = service.get_url(url=service.HTTP_SOURCES_URL)
+        self.assertEqual(len(sources), len(self.fixtures['sources']['data']))
+        self.assertEqual(len(responses), 3)
+        self.assertEqual(sleep.call_count, 2)
+        # Retry-After header is respected
+        self.assertGreaterEqual(sleep.call_args_list[0][0][0], 2)
+        # rate decreased after throttling and started to grow again
+        self.assertEqual(service.rate_limiter.rate, 2.4)
+
+        # retries are limited
+        provider['config']['max_retries'] = '0'
+        responses.clear()
+        with self.assertRaises(IngestApiError):
+            service.get_url(url=service.HTTP_SOURCES_URL)
+
+        # too long Retry-After isn't waited for
+        provider['config']['max_retries'] = '3'
+        responses.clear()
+        sleep.reset_mock()
+
+        def mock_get_side_effect(url, *args, **kwargs):
+            response = self.mock_get_side_effect(url, *args, **kwargs)
+            response.ok = False
+            response.status_code = 429
+            response.headers = {'Retry-After': '120'}
+            responses.append(response)
+            return response
+
+        session.return_value.get.side_effect = mock_get_side_effect
+        with self.assertRaises(IngestApiError):
+            service.get_url(url=service.HTTP_SOURCES_URL)
+        self.assertEqual(len(responses), 1)
+        sleep.assert_not_called()
+
+    @mock.patch.object(ANPNewsApiFeedingService, 'session', new_callable=mock.PropertyMock)
+    @mock.patch.object(ANPNewsApiFeedingService, 'get_feed_parser')
+    def test_circuit_breaker(self, get_feed_parser, session):
+        session.return_value.get.side_effect = requests.exceptions.ConnectionError('Connection refused')
+        provider = PROVIDER.copy()
+        provider['config'] = dict(PROVIDER['config'], max_retries='0')
+        service = ANPNewsApiFeedingService()
+        service.provider = provider
+
+        for _ in range(service.CIRCUIT_FAILURE_THRESHOLD):
+            update = {}
+            with self.assertRaises(IngestApiError):
+                list(service._update(provider, update))
+        self.assertEqual(session.return_value.get.call_count, service.CIRCUIT_FAILURE_THRESHOLD)
+        self.assertEqual(update['private']['circuit_breakers']['sources']['state'], OPEN)
+        self.assertEqual(update['private']['circuit_breakers']['items']['state'], CLOSED)
+
+        # open circuit fails fast
+        with self.assertRaises(IngestApiError):
+            list(service._update(provider, {}))
+        self.assertEqual(session.return_value.get.call_count, service.CIRCUIT_FAILURE_THRESHOLD)
+
+        # a single probe is allowed after reset timeout
+        breaker = service.get_circuit_breaker('sources')
+        breaker.opened_at -= service.CIRCUIT_RESET_TIMEOUT
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        breaker.opened_at -= service.CIRCUIT_RESET_TIMEOUT
+
+        session.return_value.get.side_effect = self.mock_get_side_effect
+        self.assertEqual(len(service._fetch_sources()), 3)
+        self.assertEqual(breaker.state, CLOSED)
+
+        # state saved in provider's private data is restored by a new worker
+        reset_circuit_breakers()
+        provider['private'] = {'circuit_breakers': {'items': update['private']['circuit_breakers']['sources']}}
+        self.assertEqual(service.get_circuit_breaker('items').state, OPEN)
+
+    @mock.patch.object(renditions, 'download_file_from_url')
+    @mock.patch.object(fetch_featuremedia, 'delay')
+    @mock.patch.object(ANPNewsApiFeedingService, 'session', new_callable=mock.PropertyMock)
+    @mock.patch.object(ANPNewsApiFeedingService, 'get_feed_parser')
+    def test_async_featuremedia(self, get_feed_parser, session, delay, download_file_from_url):
+        download_file_from_url.return_value = (
+            BytesIO(self.fixtures['image']['38bdbbbdae1320f77049b5a32538e09c']),
+            'image-38bdbbbdae1320f77049b5a32538e09c.jpeg',
+            'image/jpeg'
+        )
+        session.return_value.get.side_effect = self.mock_get_side_effect
+        get_feed_parser.return_value = ANPNewsApiFeedParser()
+
+        provider = PROVIDER.copy()
+        provider['config'] = dict(PROVIDER['config'], async_featuremedia=True)
+
+        with self.app.app_context():
+            self.app.data.insert('ingest_providers', [provider])
+            service = ANPNewsApiFeedingService()
+            service.provider = provider
+            items = [item for batch in service._update(provider, {}) for item in batch]
+
+            # text is ingested without waiting for the picture
+            download_file_from_url.assert_not_called()
+            item = [item for item in items if item['guid'] == '38bdbbbdae1320f77049b5a32538e09c'][-1]
+            self.assertEqual(item['associations']['featuremedia']['renditions'], {})
+            delay.assert_called_once_with(
+                provider['_id'],
+                '38bdbbbdae1320f77049b5a32538e09c',
+                'https://newsapi.anp.nl/services/sources/4ad32715-3221-49b1-b93b-30b02c1c6eb6/items/'
+                '38bdbbbdae1320f77049b5a32538e09c/media/72f40a9ba39bc2e0605abaa7db767bcd'
+            )
+
+            # task patches ingested item and its copy fetched meanwhile
+            self.app.data.insert('ingest', [item])
+            self.app.data.insert('archive', [{
+                'guid': 'fetched-38bdbbbdae1320f77049b5a32538e09c',
+                'ingest_id': item['guid'],
+                'associations': item['associations'],
+            }])
+            fetch_featuremedia(*delay.call_args[0])
+            ingested = get_resource_service('ingest').find_one(req=None, guid=item['guid'])
+            featuremedia = ingested['associations']['featuremedia']
+            self.assertEqual(featuremedia['headline'], 'Zanger Dotan maakt comeback na trollenaffaire')
+            self.assertIn('baseImage', featuremedia['renditions'])
+            self.assertEqual(featuremedia['mimetype'], 'image/jpeg')
+            fetched = get_resource_service('archive').find_one(
+                req=None, guid='fetched-38bdbbbdae1320f77049b5a32538e09c'
+            )
+            self.assertEqual(fetched['associations']['featuremedia']['renditions'], featuremedia['renditions'])
+
+    @mock.patch.object(renditions, 'download_file_from_url')
+    @mock.patch.object(ANPNewsApiFeedingService, 'session', new_callable=mock.PropertyMock)
+    @mock.patch.object(ANPNewsApiFeedingService, 'get_feed_parser')
+    def test_bulk_ingest(self, get_feed_parser, session, download_file_from_url):
+        download_file_from_url.return_value = (
+            BytesIO(self.fixtures['image']['38bdbbbdae1320f77049b5a32538e09c']),
+            'image-38bdbbbdae1320f77049b5a32538e09c.jpeg',
+            'image/jpeg'
+        )
+        session.return_value.get.side_effect = self.mock_get_side_effect
+        get_feed_parser.return_value = ANPNewsApiFeedParser()
+
+        provider = PROVIDER.copy()
+        provider['config'] = dict(PROVIDER['config'], bulk_ingest=True)
+        ingest_service = get_resource_service('ingest')
+
+        with self.app.app_context():
+            self.app.data.insert('ingest_providers', [provider])
+            service = ANPNewsApiFeedingService()
+            service.provider = provider
+            update = {}
+            with mock.patch.object(ingest_service, 'post_in_mongo', wraps=ingest_service.post_in_mongo) as post:
+                items = [item for batch in service._update(provider, update) for item in batch]
+            # new items are saved by a single insert
+            self.assertEqual(post.call_count, 1)
+            self.assertEqual(items, [])
+            self.assertIn('last_item_update', update)
+
+            ingested = list(ingest_service.get_from_mongo(req=None, lookup={'ingest_provider': str(provider['_id'])}))
+            self.assertEqual(len(ingested), 7)
+            self.assertEqual(len({item['ingest_provider_sequence'] for item in ingested}), 7)
+            text = [item for item in ingested if item['guid'] == '38bdbbbdae1320f77049b5a32538e09c'][0]
+            picture = [item for item in ingested if item['type'] == 'picture'][0]
+            self.assertEqual(text['associations']['featuremedia']['_id'], picture['_id'])
+            self.assertEqual(text['state'], 'ingested')
+            self.assertIn('baseImage', picture['renditions'])
+
+            # stored items are left to the regular ingest
+            provider['private'] = {}
+            items = [item for batch in service._update(provider, {}) for item in batch]
+            self.assertEqual(len(items), 6)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import unittest
+
+from anp.io.filters import ItemFilter
+
+ARTICLE = {
+    'id': '38bdbbbdae1320f77049b5a32538e09c',
+    'kind': 'TEXTARTICLE',
+    'urgency': 3,
+    'categories': ['ANP/BIN', 'ANP/ENTERTAINMENT', 'XANP/101'],
+    'keywords': ['Dotan', 'Muziek'],
+}
+
+
+class ItemFilterTestCase(unittest.TestCase):
+
+    def test_default_config(self):
+        item_filter = ItemFilter.from_config({}, ('TEXTARTICLE',))
+        self.assertTrue(item_filter.accepts_listing({'id': '1', 'kind': 'TEXTARTICLE'}))
+        self.assertFalse(item_filter.accepts_listing({'id': '1', 'kind': 'PHOTO'}))
+        self.assertTrue(item_filter.accepts(ARTICLE))
+
+    def test_filter_is_compiled_once(self):
+        config = {'categories': 'ANP/BIN', 'urgency_threshold': '3'}
+        self.assertIs(
+            ItemFilter.from_config(config, ('TEXTARTICLE',)),
+            ItemFilter.from_config(dict(config), ('TEXTARTICLE',))
+        )
+
+    def test_item_kinds(self):
+        item_filter = ItemFilter.from_config({'item_kinds': 'textarticle, photo'}, ('TEXTARTICLE',))
+        self.assertTrue(item_filter.accepts_listing({'id': '1', 'kind': 'PHOTO'}))
+
+    def test_categories(self):
+        self.assertTrue(ItemFilter.from_config({'categories': 'anp/bin'}, ('TEXTARTICLE',)).accepts(ARTICLE))
+        self.assertFalse(ItemFilter.from_config({'categories': 'FIN'}, ('TEXTARTICLE',)).accepts(ARTICLE))
+
+    def test_urgency_threshold(self):
+        self.assertTrue(ItemFilter.from_config({'urgency_threshold': '3'}, ('TEXTARTICLE',)).accepts(ARTICLE))
+        self.assertFalse(ItemFilter.from_config({'urgency_threshold': '2'}, ('TEXTARTICLE',)).accepts(ARTICLE))
+        self.assertTrue(ItemFilter.from_config({'urgency_threshold': 'foo'}, ('TEXTARTICLE',)).accepts(ARTICLE))
+        # 0 is a threshold, not an unset one
+        self.assertFalse(ItemFilter.from_config({'urgency_threshold': 0}, ('TEXTARTICLE',)).accepts(ARTICLE))
+        self.assertFalse(ItemFilter.from_config({'urgency_threshold': '0'}, ('TEXTARTICLE',)).accepts(ARTICLE))
+        self.assertTrue(ItemFilter.from_config({'urgency_threshold': None}, ('TEXTARTICLE',)).accepts(ARTICLE))
+
+    def test_denied_keywords(self):
+        self.assertFalse(ItemFilter.from_config({'denied_keywords': 'muziek'}, ('TEXTARTICLE',)).accepts(ARTICLE))
+        self.assertTrue(ItemFilter.from_config({'denied_keywords': 'sport'}, ('TEXTARTICLE',)).accepts(ARTICLE))
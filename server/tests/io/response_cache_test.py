@@ -0,0 +1,82 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from anp.io.response_cache import ResponseCache
+
+
+class FakeTimer:
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.timer = FakeTimer()
+        self.cache = ResponseCache(maxsize=2, max_age=10, timer=self.timer)
+
+    def test_fresh_response(self):
+        self.cache.set('foo', {'id': 'foo'}, {'ETag': '"1"'})
+        data = self.cache.get('foo')
+        self.assertEqual(data, {'id': 'foo'})
+        # cached data can't be modified by callers
+        data['media_link'] = 'bar'
+        self.assertEqual(self.cache.get('foo'), {'id': 'foo'})
+        self.assertEqual(self.cache.stats(), {'hits': 2, 'revalidations': 0, 'misses': 1, 'size': 1})
+
+    def test_stale_response(self):
+        self.cache.set('foo', {'id': 'foo'}, {'ETag': '"1"', 'Last-Modified': 'Thu, 02 May 2019 12:04:59 GMT'})
+        self.cache.set('bar', {'id': 'bar'})
+        self.timer.now = 10
+        self.assertIsNone(self.cache.get('foo'))
+        self.assertEqual(self.cache.conditional_headers('foo'), {
+            'If-None-Match': '"1"',
+            'If-Modified-Since': 'Thu, 02 May 2019 12:04:59 GMT',
+        })
+        self.assertEqual(self.cache.conditional_headers('bar'), {})
+        self.assertEqual(self.cache.revalidated('foo'), {'id': 'foo'})
+        self.assertEqual(self.cache.get('foo'), {'id': 'foo'})
+
+    def test_other_version(self):
+        self.cache.set('foo', {'id': 'foo'}, {'ETag': '"1"'}, version='2019-05-02T12:33:17Z')
+        self.assertEqual(self.cache.get('foo', '2019-05-02T12:33:17Z'), {'id': 'foo'})
+        self.assertIsNone(self.cache.get('foo', '2019-05-02T12:35:34Z'))
+        self.assertEqual(self.cache.conditional_headers('foo', '2019-05-02T12:35:34Z'), {})
+
+    def test_lru_eviction(self):
+        self.cache.set('foo', 1)
+        self.cache.set('bar', 2)
+        self.cache.get('foo')
+        self.cache.set('baz', 3)
+        self.assertEqual(self.cache.get('foo'), 1)
+        self.assertIsNone(self.cache.get('bar'))
+        self.assertIsNone(self.cache.revalidated('bar'))
+
+    def test_save_and_load(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'cache.json')
+
+        self.cache.path = path
+        self.cache.set('foo', {'id': 'foo'})
+        self.cache.save()
+
+        cache = ResponseCache(maxsize=2, max_age=10, path=path, timer=self.timer)
+        cache.load()
+        self.assertEqual(cache.get('foo'), {'id': 'foo'})
@@ -0,0 +1,59 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import threading
+import unittest
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from anp.io.sessions import get_session, close_sessions, connection_stats
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'{}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SessionsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.url = 'http://127.0.0.1:{}/'.format(self.server.server_port)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        close_sessions()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_session_is_shared(self):
+        session = get_session('provider', auth=('foo', 'bar'))
+        self.assertIs(session, get_session('provider', auth=('foo', 'baz')))
+        self.assertEqual(session.auth, ('foo', 'baz'))
+        self.assertIsNot(session, get_session('other provider'))
+
+    def test_session_is_recreated_on_pool_size_change(self):
+        session = get_session('provider', pool_size=2)
+        self.assertIsNot(session, get_session('provider', pool_size=4))
+
+    def test_connection_stats(self):
+        session = get_session('provider')
+        for _ in range(3):
+            session.get(self.url).raise_for_status()
+        self.assertEqual(connection_stats(session), {'new': 1, 'reused': 2})
@@ -0,0 +1,68 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import unittest
+
+from anp.io.throttling import RateLimiter, get_rate_limiter, backoff_delays
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0
+        self.slept = []
+
+    def timer(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class RateLimiterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(max_rate=2, burst=2, timer=self.clock.timer, sleep=self.clock.sleep)
+
+    def test_burst(self):
+        self.limiter.acquire()
+        self.limiter.acquire()
+        self.assertEqual(self.clock.slept, [])
+        self.limiter.acquire()
+        self.assertEqual(self.clock.slept, [0.5])
+
+    def test_adaptive_rate(self):
+        self.limiter.throttled()
+        self.assertEqual(self.limiter.rate, 1)
+        for _ in range(5):
+            self.limiter.throttled()
+        self.assertEqual(self.limiter.rate, 0.5)
+        self.limiter.succeeded()
+        self.assertEqual(self.limiter.rate, 0.6)
+        for _ in range(100):
+            self.limiter.succeeded()
+        self.assertEqual(self.limiter.rate, 2)
+
+    def test_shared_limiter(self):
+        limiter = get_rate_limiter('provider', max_rate=5, burst=5)
+        self.assertIs(limiter, get_rate_limiter('provider', max_rate=5, burst=5))
+        self.assertIsNot(limiter, get_rate_limiter('provider', max_rate=10, burst=5))
+
+
+class BackoffTestCase(unittest.TestCase):
+
+    def test_backoff_delays(self):
+        delays = list(backoff_delays(retries=5, base=1, cap=4))
+        self.assertEqual(len(delays), 5)
+        for attempt, delay in enumerate(delays):
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(4, 2 ** attempt))
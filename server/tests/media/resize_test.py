@@ -0,0 +1,105 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import os
+import unittest
+from io import BytesIO
+from unittest import mock
+
+from PIL import Image
+
+from anp.media import resize
+from anp.media.resize import target_size, resize_all, resize_many, get_executor, shutdown_executor
+
+SPECS = {
+    'thumbnail': {'width': 220, 'height': 120},
+    'viewImage': {'width': 640, 'height': 640},
+    'baseImage': {'width': 1400, 'height': 1400},
+}
+
+
+def jpeg(width, height):
+    out = BytesIO()
+    Image.new('RGB', (width, height), (200, 100, 50)).save(out, 'jpeg')
+    return out.getvalue()
+
+
+def oriented_jpeg(orientation):
+    """Red left half, blue right half as stored, with EXIF orientation."""
+    img = Image.new('RGB', (400, 200), (255, 0, 0))
+    img.paste((0, 0, 255), (200, 0, 400, 200))
+    exif = Image.Exif()
+    exif[resize.EXIF_ORIENTATION_TAG] = orientation
+    out = BytesIO()
+    img.save(out, 'jpeg', exif=exif.tobytes())
+    return out.getvalue()
+
+
+class ResizeTestCase(unittest.TestCase):
+
+    def test_target_size(self):
+        self.assertEqual(target_size(4000, 3000, SPECS['thumbnail']), (160, 120))
+        self.assertEqual(target_size(4000, 3000, SPECS['baseImage']), (1400, 1050))
+        self.assertEqual(target_size(3000, 4000, {'width': 300}), (300, 400))
+        self.assertEqual(target_size(3000, 4000, {'height': 400}), (300, 400))
+
+    def test_resize_all(self):
+        renditions = resize_all(jpeg(4000, 3000), SPECS)
+        self.assertEqual(
+            {name: (width, height) for name, (_, width, height) in renditions.items()},
+            {'thumbnail': (160, 120), 'viewImage': (640, 480), 'baseImage': (1400, 1050)}
+        )
+        for name, (content, width, height) in renditions.items():
+            img = Image.open(BytesIO(content))
+            self.assertEqual(img.format, 'JPEG')
+            self.assertEqual(img.size, (width, height))
+
+    def test_small_image_is_upscaled(self):
+        renditions = resize_all(jpeg(800, 600), SPECS)
+        self.assertEqual(renditions['baseImage'][1:], (1400, 1050))
+        self.assertEqual(renditions['viewImage'][1:], (640, 480))
+
+    def test_fixture(self):
+        dirname = os.path.dirname(os.path.realpath(__file__))
+        with open(os.path.join(dirname, '../io/fixtures', 'image-38bdbbbdae1320f77049b5a32538e09c.jpeg'), 'rb') as f:
+            content = f.read()
+        width, height = Image.open(BytesIO(content)).size
+        renditions = resize_all(content, SPECS)
+        for name, spec in SPECS.items():
+            self.assertEqual(renditions[name][1:], target_size(width, height, spec))
+
+    def test_resize_many(self):
+        images = [jpeg(1000, 500), jpeg(500, 1000)]
+        renditions = resize_many(images, {'thumbnail': SPECS['thumbnail']})
+        self.assertEqual([r['thumbnail'][1:] for r in renditions], [(220, 109), (59, 120)])
+
+        try:
+            self.assertEqual(resize_many(images, SPECS, processes=2), resize_many(images, SPECS))
+        finally:
+            shutdown_executor()
+
+    def test_exif_orientation(self):
+        spec = {'thumbnail': {'width': 100, 'height': 100}}
+        # color of top left corner as displayed
+        expected = {
+            1: ((100, 50), 'red'), 2: ((100, 50), 'blue'), 3: ((100, 50), 'blue'), 4: ((100, 50), 'red'),
+            5: ((50, 100), 'red'), 6: ((50, 100), 'red'), 7: ((50, 100), 'blue'), 8: ((50, 100), 'blue'),
+        }
+        for orientation, (size, color) in expected.items():
+            content, width, height = resize_all(oriented_jpeg(orientation), spec)['thumbnail']
+            self.assertEqual((width, height), size, orientation)
+            red, _green, blue = Image.open(BytesIO(content)).convert('RGB').getpixel((5, 5))
+            self.assertEqual('red' if red > blue else 'blue', color, orientation)
+
+    def test_no_pool_in_celery_worker(self):
+        billiard_process = mock.Mock()
+        billiard_process.current_process.return_value.daemon = True
+        with mock.patch.object(resize, 'billiard_process', billiard_process):
+            self.assertIsNone(get_executor(2))
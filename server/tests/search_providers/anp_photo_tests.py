@@ -1,7 +1,13 @@
 
 import unittest
+from unittest import mock
+from xmlrpc.client import Fault
 
 from anp.search_providers import PhotoSearchProvider
+from anp.search_providers.anp_photo import photo_index
+from anp.search_providers.tasks import fetch_photo_renditions
+from anp.search_providers.search_cache import get_search_cache, reset_search_cache
+from anp.search_providers.prefetch import reset_prefetcher
 
 
 RESPONSE = {
@@ -29,13 +35,26 @@ class TestProxy():
 
     def __init__(self, response):
         self.response = response
+        self.calls = []
 
     def search(self, params):
+        self.calls.append(params)
         return self.response
 
+    def getmedialocation(self, params):
+        self.calls.append(params)
+        if params['id'] == 404:
+            raise Fault(404, 'Not found')
+        return {'url': 'https://www.anpfoto.nl/download/{}.jpg'.format(params['id'])}
+
 
 class ANPPhotoTestCase(unittest.TestCase):
 
+    def setUp(self):
+        reset_search_cache()
+        reset_prefetcher()
+        photo_index.clear()
+
     def test_instance(self):
         provider = PhotoSearchProvider({})
         self.assertEqual('ANP', provider.label)
@@ -78,3 +97,80 @@ class ANPPhotoTestCase(unittest.TestCase):
         cursor = provider.find(query, {})
         item = cursor[0]
         self.assertEqual('2019-04-18T12:16:50+00:00', item['firstcreated'].isoformat())
+
+    def test_find_is_cached(self):
+        provider = PhotoSearchProvider({'config': {'password': 'foo'}})
+        setattr(provider, '_proxy', TestProxy(RESPONSE))
+        query = {'query': {'filtered': {'query': {'query_string': {'query': 'Easter '}}}}}
+        self.assertEqual(123, provider.find(query, {}).count())
+
+        # same search of another user
+        other = PhotoSearchProvider({'config': {'password': 'bar'}})
+        setattr(other, '_proxy', TestProxy(RESPONSE))
+        query = {'query': {'filtered': {'query': {'query_string': {'query': 'easter'}}}}}
+        cursor = other.find(query, {})
+        self.assertEqual('urn:anp:71948104', cursor[0]['guid'])
+        self.assertEqual(0, len(other.proxy.calls))
+
+        # next page
+        other.find(dict(query, **{'from': 25}), {})
+        self.assertEqual(1, len(other.proxy.calls))
+
+        stats = get_search_cache().stats()
+        self.assertEqual(1, stats['local_hits'])
+        self.assertEqual(2, stats['misses'])
+
+    def test_find_prefetches_next_pages(self):
+        provider = PhotoSearchProvider({'_id': 'anp', 'config': {'password': 'foo'}})
+        proxy = TestProxy(RESPONSE)
+        setattr(provider, '_proxy', proxy)
+        with mock.patch.object(provider, '_prefetch_pages', return_value=5):
+            provider.find({'size': 50}, {})
+            # bounded depth and total results
+            for page in (2, 3):
+                provider.find({'size': 50, 'from': (page - 1) * 50}, {})
+
+        self.assertEqual([1, 2, 3], sorted(params['page'] for params in proxy.calls))
+
+    @mock.patch('anp.search_providers.anp_photo.update_renditions')
+    def test_fetch(self, update_renditions):
+        provider = PhotoSearchProvider({'config': {'password': 'foo'}})
+        setattr(provider, '_proxy', TestProxy(RESPONSE))
+        item = provider.fetch('urn:anp:71948104')
+
+        self.assertEqual('urn:anp:71948104', item['guid'])
+        self.assertIn({'api_key': 'foo', 'id': 71948104}, provider.proxy.calls)
+        update_renditions.assert_called_once_with(item, 'https://www.anpfoto.nl/download/71948104.jpg', None)
+
+    @mock.patch.object(fetch_photo_renditions, 'delay')
+    @mock.patch('anp.search_providers.anp_photo.update_renditions')
+    def test_fetch_async_renditions(self, update_renditions, delay):
+        provider = PhotoSearchProvider({'config': {'password': 'foo'}})
+        setattr(provider, '_proxy', TestProxy(RESPONSE))
+        with mock.patch.object(provider, '_async_renditions', return_value=True):
+            item = provider.fetch('urn:anp:71948104')
+
+        self.assertEqual(RESPONSE['1']['preview_url'], item['renditions']['original']['href'])
+        update_renditions.assert_not_called()
+        delay.assert_called_once_with('urn:anp:71948104', 'https://www.anpfoto.nl/download/71948104.jpg')
+
+    @mock.patch('anp.search_providers.anp_photo.update_renditions')
+    def test_fetch_many(self, update_renditions):
+        provider = PhotoSearchProvider({'config': {'password': 'foo'}})
+        proxy = TestProxy(RESPONSE)
+        setattr(provider, '_proxy', proxy)
+        provider.find({}, {})
+        proxy.calls.clear()
+
+        guids = ['urn:anp:71948104', 'urn:anp:1', 'urn:anp:2', 'urn:anp:404', 'urn:anp:1']
+        results = {guid: (item, error) for guid, item, error in provider.fetch_many(guids)}
+
+        self.assertEqual(['urn:anp:1', 'urn:anp:2', 'urn:anp:404', 'urn:anp:71948104'], sorted(results))
+        self.assertIsInstance(results['urn:anp:404'][1], Fault)
+        self.assertIsNone(results['urn:anp:71948104'][1])
+        self.assertEqual('urn:anp:71948104', results['urn:anp:71948104'][0]['guid'])
+        self.assertEqual(3, update_renditions.call_count)
+
+        # photo found by the search is not searched again
+        searched = sorted(params['reference'] for params in proxy.calls if 'reference' in params)
+        self.assertEqual(['1', '2', '404'], searched)
@@ -0,0 +1,60 @@
+import time
+import threading
+import unittest
+
+from anp.search_providers.prefetch import Prefetcher
+
+
+class PrefetcherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.prefetcher = Prefetcher(max_workers=1)
+        self.addCleanup(self.prefetcher.shutdown)
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.fetched = []
+
+    def blocked(self, value):
+        def fetch():
+            self.started.set()
+            self.release.wait(5)
+            self.fetched.append(value)
+            return value
+        return fetch
+
+    def test_wait(self):
+        self.prefetcher.prefetch('foo', 'query', [('page-2', self.blocked('data'))])
+        self.assertTrue(self.started.wait(5))
+        self.release.set()
+        self.assertEqual('data', self.prefetcher.wait('page-2', timeout=5))
+        self.assertIsNone(self.prefetcher.wait('page-3', timeout=5))
+
+    def test_query_change_cancels_pending(self):
+        self.prefetcher.prefetch('foo', 'query', [('page-2', self.blocked(2)), ('page-3', self.blocked(3))])
+        self.prefetcher.prefetch('foo', 'other', [('other-2', self.blocked('other'))])
+        self.release.set()
+
+        # page 2 was running already, page 3 is cancelled
+        self.assertEqual(2, self.prefetcher.wait('page-2', timeout=5))
+        self.assertIsNone(self.prefetcher.wait('page-3', timeout=5))
+        self.prefetcher.shutdown(wait=True)
+        self.assertEqual([2, 'other'], self.fetched)
+
+    def test_failed_prefetch(self):
+        def fail():
+            raise ValueError('foo')
+        self.prefetcher.prefetch('foo', 'query', [('page-2', fail)])
+        self.assertIsNone(self.prefetcher.wait('page-2', timeout=5))
+
+    def test_queued_prefetch_isnt_waited_for(self):
+        self.prefetcher.prefetch('foo', 'query', [('page-2', self.blocked(2)), ('page-3', self.blocked(3))])
+        self.assertTrue(self.started.wait(5))
+
+        started = time.time()
+        self.assertIsNone(self.prefetcher.wait('page-3', timeout=5))
+        self.assertLess(time.time() - started, 1)
+
+        # caller fetches the page itself, the prefetch is cancelled
+        self.release.set()
+        self.prefetcher.shutdown(wait=True)
+        self.assertEqual([2], self.fetched)
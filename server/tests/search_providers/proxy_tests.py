@@ -0,0 +1,96 @@
+import unittest
+from unittest import mock
+from xmlrpc.client import Fault
+
+from flask import Flask
+from apps.search_providers.proxy import SearchProviderProxyService
+
+from anp.search_providers import PhotoSearchProvider
+from anp.search_providers.proxy import FetchManySearchProviderProxyService
+
+
+def archive(service, docs, **kwargs):
+    """Archive items one by one like superdesk does."""
+    return [service.fetch(doc['guid'])['guid'] for doc in docs]
+
+
+class FetchManySearchProviderProxyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        context = Flask(__name__).app_context()
+        context.push()
+        self.addCleanup(context.pop)
+
+        self.provider = PhotoSearchProvider({'config': {'password': 'foo'}})
+        self.service = FetchManySearchProviderProxyService()
+        for name, value in (('get_provider', {'_id': 'anp'}), ('_get_service', self.provider)):
+            patcher = mock.patch.object(self.service, name, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @mock.patch.object(SearchProviderProxyService, 'create', autospec=True, side_effect=archive)
+    def test_create(self, create):
+        def fetch_many(guids):
+            for guid in reversed(guids):
+                yield guid, {'guid': guid}, None
+
+        with mock.patch.object(self.provider, 'fetch_many', side_effect=fetch_many) as fetch_many_mock, \
+                mock.patch.object(self.provider, 'fetch') as fetch:
+            guids = self.service.create([
+                {'guid': 'urn:anp:1', 'desk': 'sports'},
+                {'guid': 'urn:anp:2', 'desk': 'sports'},
+            ])
+
+        self.assertEqual(['urn:anp:1', 'urn:anp:2'], guids)
+        fetch_many_mock.assert_called_once_with(['urn:anp:1', 'urn:anp:2'])
+        fetch.assert_not_called()
+
+    @mock.patch('apps.io.search_ingest.get_resource_service')
+    @mock.patch('apps.io.search_ingest.fetch_item', side_effect=lambda doc, desk, stage, **kwargs: dict(doc, desk=desk))
+    @mock.patch('apps.io.search_ingest.insert_into_versions')
+    def test_create_with_superdesk_create(self, insert_into_versions, fetch_item, get_resource_service):
+        """Run superdesk's create, only storage is mocked."""
+        def fetch_many(guids):
+            for guid in reversed(guids):
+                yield guid, {'guid': guid}, None
+
+        archive_service = mock.Mock()
+        with mock.patch('superdesk.get_resource_service', return_value=archive_service), \
+                mock.patch.object(self.provider, 'fetch_many', side_effect=fetch_many) as fetch_many_mock, \
+                mock.patch.object(self.provider, 'fetch') as fetch:
+            guids = self.service.create([
+                {'guid': 'urn:anp:1', 'desk': 'sports'},
+                {'guid': 'urn:anp:2', 'desk': 'sports'},
+                {'guid': 'urn:anp:3', 'desk': 'sports'},
+            ])
+
+        self.assertEqual(['urn:anp:1', 'urn:anp:2', 'urn:anp:3'], guids)
+        fetch_many_mock.assert_called_once_with(['urn:anp:1', 'urn:anp:2', 'urn:anp:3'])
+        fetch.assert_not_called()
+
+        posted = [call[0][0][0] for call in archive_service.post.call_args_list]
+        self.assertEqual(guids, [doc['guid'] for doc in posted])
+        self.assertEqual(['externalsource'] * 3, [doc['_type'] for doc in posted])
+        self.assertEqual(['anp'] * 3, [doc['ingest_provider'] for doc in posted])
+        self.assertEqual(3, insert_into_versions.call_count)
+
+    @mock.patch.object(SearchProviderProxyService, 'create', autospec=True, side_effect=archive)
+    def test_create_fails_with_fetch_error(self, create):
+        def fetch_many(guids):
+            yield 'urn:anp:1', {'guid': 'urn:anp:1'}, None
+            yield 'urn:anp:404', None, Fault(404, 'Not found')
+
+        with mock.patch.object(self.provider, 'fetch_many', side_effect=fetch_many):
+            with self.assertRaises(Fault):
+                self.service.create([
+                    {'guid': 'urn:anp:1', 'desk': 'sports'},
+                    {'guid': 'urn:anp:404', 'desk': 'sports'},
+                ])
+
+    @mock.patch.object(SearchProviderProxyService, 'fetch', return_value={'guid': 'urn:anp:1'})
+    @mock.patch.object(SearchProviderProxyService, 'create', autospec=True, side_effect=archive)
+    def test_create_single_item(self, create, fetch):
+        with mock.patch.object(self.provider, 'fetch_many') as fetch_many:
+            self.service.create([{'guid': 'urn:anp:1', 'desk': 'sports'}])
+        fetch_many.assert_not_called()
+        fetch.assert_called_once_with('urn:anp:1')
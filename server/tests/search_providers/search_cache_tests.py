@@ -0,0 +1,59 @@
+import unittest
+
+from anp.search_providers.search_cache import SearchCache
+
+
+class FakeRedis():
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value.encode('utf-8')
+
+
+class BrokenRedis():
+
+    def get(self, key):
+        raise ConnectionError('redis is down')
+
+    def setex(self, key, ttl, value):
+        raise ConnectionError('redis is down')
+
+
+class SearchCacheTestCase(unittest.TestCase):
+
+    def test_key(self):
+        cache = SearchCache('test')
+        url = 'https://search.anpfoto.nl/'
+        self.assertEqual(
+            cache.key(url, {'api_key': 'foo', 'keywords': ' Easter  eggs', 'page': 1}),
+            cache.key(url, {'page': 1, 'keywords': 'easter eggs', 'api_key': 'bar'}),
+        )
+        self.assertNotEqual(
+            cache.key(url, {'keywords': 'easter', 'page': 1}),
+            cache.key(url, {'keywords': 'easter', 'page': 2}),
+        )
+
+    def test_shared_by_processes(self):
+        redis = FakeRedis()
+        cache = SearchCache('test', redis=redis)
+        cache.set('foo', {'totalresults': 1})
+
+        # another process
+        other = SearchCache('test', redis=redis)
+        self.assertEqual(other.get('foo'), {'totalresults': 1})
+        self.assertEqual(other.get('foo'), {'totalresults': 1})
+        self.assertIsNone(other.get('bar'))
+        self.assertEqual(other.stats(), {
+            'local_hits': 1, 'redis_hits': 1, 'misses': 1, 'size': 1, 'hit_rate': 2 / 3
+        })
+
+    def test_redis_errors(self):
+        cache = SearchCache('test', redis=BrokenRedis())
+        cache.set('foo', {'totalresults': 1})
+        self.assertEqual(cache.get('foo'), {'totalresults': 1})
+        self.assertIsNone(cache.get('bar'))
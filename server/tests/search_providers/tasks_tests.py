@@ -0,0 +1,48 @@
+import unittest
+from unittest import mock
+
+from anp.search_providers.tasks import fetch_photo_renditions
+
+
+class Retry(Exception):
+    pass
+
+
+class FetchPhotoRenditionsTestCase(unittest.TestCase):
+
+    def run_task(self, retries):
+        fetch_photo_renditions.push_request(retries=retries)
+        try:
+            return fetch_photo_renditions.run('urn:anp:1', 'https://www.anpfoto.nl/download/1.jpg')
+        finally:
+            fetch_photo_renditions.pop_request()
+
+    @mock.patch('anp.search_providers.tasks.update_renditions')
+    @mock.patch('anp.search_providers.tasks.get_resource_service')
+    def test_retry_until_saved(self, get_resource_service, update_renditions):
+        get_resource_service.return_value.get_from_mongo.return_value = []
+        with mock.patch.object(fetch_photo_renditions, 'retry', return_value=Retry()) as retry:
+            for retries in range(fetch_photo_renditions.max_retries):
+                with self.assertRaises(Retry):
+                    self.run_task(retries)
+                retry.assert_called_with(countdown=2 ** retries)
+
+            with self.assertLogs('anp.search_providers.tasks', level='ERROR') as logs:
+                self.assertIsNone(self.run_task(fetch_photo_renditions.max_retries))
+            self.assertIn('urn:anp:1', logs.output[0])
+            self.assertEqual(fetch_photo_renditions.max_retries, retry.call_count)
+        update_renditions.assert_not_called()
+
+    @mock.patch('anp.search_providers.tasks.update_renditions')
+    @mock.patch('anp.search_providers.tasks.get_resource_service')
+    def test_renditions_added(self, get_resource_service, update_renditions):
+        def renditions(picture, href):
+            picture['renditions'] = {'original': {'media': 'm1'}}
+
+        update_renditions.side_effect = renditions
+        archive_service = get_resource_service.return_value
+        item = {'_id': 'a1', 'guid': 'urn:anp:1', 'renditions': {'original': {'href': 'preview'}}}
+        archive_service.get_from_mongo.return_value = [item]
+        self.run_task(0)
+        archive_service.system_update.assert_called_once_with(
+            'a1', {'renditions': {'original': {'media': 'm1'}}}, item)
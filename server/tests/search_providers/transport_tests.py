@@ -0,0 +1,57 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+
+import requests
+
+from anp.io.sessions import close_sessions
+from anp.search_providers.transport import get_proxy, transport_stats, reset_proxies
+
+
+class KeepAliveRequestHandler(SimpleXMLRPCRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadedXMLRPCServer(ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+
+
+class TransportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadedXMLRPCServer(('127.0.0.1', 0), requestHandler=KeepAliveRequestHandler, logRequests=False)
+        self.server.register_function(lambda params: {'page': params['page']}, 'search')
+        self.server.register_function(lambda seconds: threading.Event().wait(seconds), 'sleep')
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:{}/'.format(self.server.server_address[1])
+        reset_proxies()
+        self.addCleanup(reset_proxies)
+        self.addCleanup(close_sessions)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_connection_is_reused(self):
+        self.assertIs(get_proxy(self.url), get_proxy(self.url))
+        for page in range(1, 4):
+            self.assertEqual({'page': page}, get_proxy(self.url).search({'page': page}))
+        self.assertEqual({'new': 1, 'reused': 2}, transport_stats()[self.url])
+
+    def test_shared_by_threads(self):
+        proxy = get_proxy(self.url)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            pages = list(executor.map(lambda page: proxy.search({'page': page})['page'], range(20)))
+        self.assertEqual(list(range(20)), pages)
+        stats = transport_stats()[self.url]
+        self.assertEqual(20, stats['new'] + stats['reused'])
+        self.assertLessEqual(stats['new'], 4)
+
+    def test_read_timeout(self):
+        proxy = get_proxy(self.url)
+        proxy('transport').timeout = (1, 0.1)
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            proxy.sleep(1)
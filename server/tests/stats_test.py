@@ -0,0 +1,65 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import unittest
+from unittest import mock
+
+from anp import stats
+from anp.stats import Histogram, IngestStats, current_stats, NULL_STATS
+
+
+class StatsTestCase(unittest.TestCase):
+
+    def test_histogram(self):
+        histogram = Histogram()
+        self.assertEqual(histogram.percentile(50), 0)
+        for value in range(1, 101):
+            histogram.observe(value)
+        self.assertEqual(histogram.to_dict(), {'count': 100, 'total': 5050, 'p50': 50, 'p99': 99, 'max': 100})
+
+    def test_ingest_stats(self):
+        ingest_stats = IngestStats('ANP')
+        with ingest_stats.timer('parse'):
+            pass
+        ingest_stats.incr('bytes', 10)
+        ingest_stats.incr('bytes', 5)
+        ingest_stats.error('500')
+        ingest_stats.error('500')
+
+        data = ingest_stats.to_dict()
+        self.assertEqual(data['timings']['parse']['count'], 1)
+        self.assertEqual(data['counters'], {'bytes': 15, 'errors.500': 2})
+
+        with self.assertLogs('anp.stats', level='INFO') as logs:
+            ingest_stats.log()
+        self.assertIn('bytes=15 errors.500=2', logs.output[0])
+
+    def test_current_stats(self):
+        ingest_stats = IngestStats('ANP')
+        self.assertIs(current_stats(), NULL_STATS)
+        with ingest_stats.activate():
+            current_stats().incr('bytes')
+        self.assertIs(current_stats(), NULL_STATS)
+        NULL_STATS.incr('bytes')
+        self.assertEqual(ingest_stats.to_dict()['counters'], {'bytes': 1})
+        self.assertEqual(NULL_STATS.to_dict()['counters'], {})
+
+    def test_report(self):
+        ingest_stats = IngestStats('ANP')
+        ingest_stats.observe('parse', 2)
+        ingest_stats.incr('bytes', 10)
+        newrelic = mock.MagicMock()
+        with mock.patch.object(stats, 'newrelic', newrelic):
+            ingest_stats.report()
+        metrics = dict(newrelic.agent.record_custom_metrics.call_args[0][0])
+        self.assertEqual(metrics['Custom/ANP/bytes'], 10)
+        self.assertEqual(metrics['Custom/ANP/time/parse'], {
+            'count': 1, 'total': 2, 'min': 2, 'max': 2, 'sum_of_squares': 4
+        })
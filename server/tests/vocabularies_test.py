@@ -0,0 +1,65 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/superdesk/license
+
+import time
+from unittest import mock
+
+from superdesk import get_resource_service
+from superdesk.tests import TestCase
+
+from anp import vocabularies
+from anp.vocabularies import get_vocabulary, get_subjects_map, invalidate
+
+
+class VocabulariesTestCase(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        invalidate()
+        self.app.data.insert('vocabularies', [{
+            '_id': 'anp_genres',
+            'items': [
+                {'qcode': 'ANP/BIN', 'name': 'ANP - Binnenland', 'is_active': True},
+                {'qcode': 'ANP/BUI', 'name': 'ANP - Buitenland', 'is_active': True},
+            ]
+        }])
+
+    def test_get_subjects_map(self):
+        self.assertEqual(get_subjects_map('anp_genres', ['ANP/BUI', 'FOO', 'ANP/BIN']), {
+            'ANP/BUI': {'name': 'ANP - Buitenland', 'qcode': 'ANP/BUI', 'scheme': 'anp_genres'},
+            'ANP/BIN': {'name': 'ANP - Binnenland', 'qcode': 'ANP/BIN', 'scheme': 'anp_genres'},
+        })
+        self.assertEqual(get_subjects_map('missing', ['ANP/BIN']), {})
+
+    def test_vocabulary_is_refreshed(self):
+        service = get_resource_service('vocabularies')
+        with mock.patch.object(service, 'find_one', wraps=service.find_one) as find_one:
+            self.assertIn('ANP/BIN', get_vocabulary('anp_genres'))
+            self.assertIn('ANP/BIN', get_vocabulary('anp_genres'))
+            self.assertEqual(find_one.call_count, 1)
+
+            # edited in another process
+            self.app.data.update('vocabularies', 'anp_genres', {
+                'items': [{'qcode': 'ANP/FIN', 'name': 'ANP - Financieel', 'is_active': True}]
+            }, {})
+            self.assertIn('ANP/BIN', get_vocabulary('anp_genres'))
+
+            with mock.patch.object(vocabularies._vocabularies, '_timer',
+                                   return_value=time.monotonic() + vocabularies.VOCABULARIES_TTL + 1):
+                self.assertEqual(list(get_vocabulary('anp_genres')), ['ANP/FIN'])
+            self.assertEqual(find_one.call_count, 2)
+
+    def test_vocabulary_edit_invalidates_cache(self):
+        self.assertIn('ANP/BIN', get_vocabulary('anp_genres'))
+        updates = {'items': [{'qcode': 'ANP/FIN', 'name': 'ANP - Financieel', 'is_active': True}]}
+        original = get_resource_service('vocabularies').find_one(req=None, _id='anp_genres')
+        self.app.data.update('vocabularies', 'anp_genres', updates, original)
+        vocabularies._on_vocabulary_updated(updates, original)
+        self.assertEqual(list(get_vocabulary('anp_genres')), ['ANP/FIN'])